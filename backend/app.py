@@ -1,219 +1,265 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, g, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
-from datetime import datetime, timedelta
-from model_lstm import train_and_forecast_lstm
-from model_xgboost import train_and_forecast_xgboost
-from utils import delete_existing_file
-import yfinance as yf
-from preprocess import download_stock_data
+from jobs import job_queue, QueueFullError
+from charts import render_graph_file, split_graph_name
+from metrics import metrics, record_cache, REQUEST_SECONDS
+from timing import record_timings
+from precomputed import precomputed_results
+from response_formats import JSON, COLUMNAR_JSON, ARROW_STREAM, ArrowStream, columnar_json, encode, negotiate
+from config import (
+    LOG_LEVEL, FORECAST_MODE, JOB_RETRY_AFTER_SECONDS, MAX_BATCH_SYMBOLS, GRAPHS_DIR, GRAPH_CACHE_SECONDS,
+    PRELOAD_ON_START, PRELOAD_MODELS, SUBSCRIBE_POLL_SECONDS, MAX_SUBSCRIPTIONS, SUBSCRIBE_MAX_SECONDS,
+)
+import json
+import logging
 import os
-import matplotlib.pyplot as plt
-import numpy as np
-import pandas as pd
+import sys
+import threading
+import time
+
+# The prediction stack (pandas, scikit-learn, XGBoost, TensorFlow, matplotlib) is imported
+# inside the endpoints that use it, so the app starts quickly and endpoints such as
+# /graph, /jobs and /metrics never load it.
+
+logging.basicConfig(level=LOG_LEVEL)
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 CORS(app)  # Allow all origins by default
-from utils import delete_existing_file, ensure_directory_exists
 
-def generate_weighted_test_graphs(y_test_dates, y_test, predictions_lstm, predictions_xgboost, weighted_forecast, forecast_lstm, forecast_xgboost, weights, scaler, graphs_dir):
-    """Generate graphs for weighted predictions using test data."""
-    # Calculate weighted predictions for test data
-    weighted_predictions = (
-        weights['lstm'] * predictions_lstm + weights['xgboost'] * predictions_xgboost
-    )
 
-    # Inverse transform the predictions and actual values
-    y_test_flat = scaler.inverse_transform(y_test.reshape(-1, 1)).flatten()
-    lstm_predictions_flat = scaler.inverse_transform(predictions_lstm.reshape(-1, 1)).flatten()
-    xgboost_predictions_flat = scaler.inverse_transform(predictions_xgboost.reshape(-1, 1)).flatten()
-    weighted_predictions_flat = scaler.inverse_transform(weighted_predictions.reshape(-1, 1)).flatten()
-
-    print("Y_test_shape:", y_test.shape)
-    print("Weighted_predictions_shape:", weighted_predictions.shape)
-    print("Y_test_flat_shape:", y_test_flat.shape)
-    print("y_test_dates_shape:", len(y_test_dates))
-
-    # Generate Actual vs Predicted graph for Weighted Test Data
-    actual_vs_predicted_path = os.path.join(graphs_dir, "actual_vs_predicted_weighted.png")
-    delete_existing_file(actual_vs_predicted_path)
-    plt.figure(figsize=(10, 6))
-    plt.plot(y_test_dates, y_test_flat, label="Actual", color="blue")
-    plt.plot(y_test_dates, weighted_predictions_flat, label="Weighted Predicted", color="red")
-    plt.title("Actual vs Predicted Stock Prices (Weighted Test Data)")
-    plt.xlabel("Date")
-    plt.ylabel("Stock Price")
-    plt.legend()
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    plt.savefig(actual_vs_predicted_path)
-    plt.close()
-
-    # Forecasted Prices
-    forecasted_prices_path = os.path.join(graphs_dir, "forecasted_prices_weighted.png")
-    delete_existing_file(forecasted_prices_path)
-    plt.figure(figsize=(10, 6))
-
-    # Extract dates and values for each forecast
-    dates = [pd.to_datetime(item['date']).date() for item in weighted_forecast]  # Convert to date objects
-    weighted_values = [item['value'] for item in weighted_forecast]
-    lstm_values = [item['value'] for item in forecast_lstm]
-    xgboost_values = [item['value'] for item in forecast_xgboost]
-
-    plt.plot(dates, weighted_values, label="Weighted Forecast", color="green")
-    plt.plot(dates, lstm_values, label="LSTM Forecast", color="blue", linestyle="--")
-    plt.plot(dates, xgboost_values, label="XGBoost Forecast", color="red", linestyle="--")
-    plt.title("Forecasted Stock Prices (Weighted, LSTM, XGBoost)")
-    plt.xlabel("Date")
-    plt.ylabel("Stock Price")
-    plt.legend()
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    plt.savefig(forecasted_prices_path)
-    plt.close()
-
-    # Generate Residuals Histogram for Weighted Test Data
-    residuals_histogram_path = os.path.join(graphs_dir, "residuals_histogram_weighted.png")
-    delete_existing_file(residuals_histogram_path)
-    plt.figure(figsize=(10, 6))
-    residuals = y_test_flat - weighted_predictions_flat
-    plt.hist(residuals, bins=20, color="darkorchid", edgecolor="black")
-    plt.title("Residuals Histogram (Weighted Test Data)")
-    plt.xlabel("Residual Value")
-    plt.ylabel("Frequency")
-    plt.tight_layout()
-    plt.savefig(residuals_histogram_path)
-    plt.close()
-
-    # Generate Comparison Graph for Actual, LSTM, XGBoost, and Hybrid Predictions
-    comparison_graph_path = os.path.join(graphs_dir, "comparison_predictions.png")
-    delete_existing_file(comparison_graph_path)
-    plt.figure(figsize=(12, 8))
-    plt.plot(y_test_dates, y_test_flat, label="Actual", color="blue", linewidth=2)
-    plt.plot(y_test_dates, lstm_predictions_flat, label="LSTM Predicted", color="orange", linestyle="--")
-    plt.plot(y_test_dates, xgboost_predictions_flat, label="XGBoost Predicted", color="green", linestyle=":")
-    plt.plot(y_test_dates, weighted_predictions_flat, label="Hybrid Predicted", color="red", linestyle="-")
-    plt.title("Comparison of Predictions (Actual, LSTM, XGBoost, Hybrid)")
-    plt.xlabel("Date")
-    plt.ylabel("Stock Price")
-    plt.legend()
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    plt.savefig(comparison_graph_path)
-    plt.close()
-
-    return {
-        "actual_vs_predicted_weighted": "actual_vs_predicted_weighted.png",
-        "forecasted_prices_weighted": "forecasted_prices_weighted.png",
-        "residuals_histogram_weighted": "residuals_histogram_weighted.png",
-        "comparison_predictions": "comparison_predictions.png"  # New graph path
-    }
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
 
 
+@app.after_request
+def record_request_duration(response):
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    REQUEST_SECONDS.observe(
+        time.perf_counter() - g.request_start, endpoint=endpoint, method=request.method, status=response.status_code
+    )
+    return response
 
 
-@app.route('/predict', methods=['POST'])
-def predict():
-    data = request.get_json()
-    symbol = data.get('symbol')
+def parse_forecast_options(data):
+    """Validate forecast_days and forecast_mode; return (forecast_days, forecast_mode, error)."""
     forecast_days = data.get('forecast_days', 7)  # Default to 7 days if not provided
+    forecast_mode = data.get('forecast_mode', FORECAST_MODE)  # "direct" or "recursive"
+
+    if forecast_mode not in ("direct", "recursive"):
+        return None, None, 'forecast_mode must be "direct" or "recursive"'
+    try:
+        forecast_days = int(forecast_days)
+    except (TypeError, ValueError):
+        return None, None, 'forecast_days must be a whole number'
+    if forecast_days < 1:
+        return None, None, 'forecast_days must be at least 1'
+    return forecast_days, forecast_mode, None
+
 
+def parse_prediction_request(data):
+    """Validate a prediction request body; return (symbol, forecast_days, forecast_mode, error)."""
+    symbol = data.get('symbol')
     if not symbol:
-        return jsonify({'error': 'Stock symbol is required'}), 400
+        return None, None, None, 'Stock symbol is required'
 
-    try:
-        end_date = datetime.today().date()
-        start_date = end_date - timedelta(days=365 * 2)  # 2 years data
-
-        df = download_stock_data(symbol.upper(), start_date, end_date)
-
-        if df.empty:
-            return jsonify({'error': 'No data found for this symbol'}), 404
-
-        # Call the LSTM model function
-        current_price, forecast_lstm, predictions_lstm, y_test_dates, scaler, graph_paths_lstm = train_and_forecast_lstm(df, forecast_days)
-
-        # Call the XGBoost model function
-        _, forecast_xgboost, predictions_xgboost, y_test, graph_paths_xgboost = train_and_forecast_xgboost(df, forecast_days)
-
-        lstm_weight = 0.5
-        xgboost_weight = 0.5
-        weights = {"lstm": lstm_weight, "xgboost": xgboost_weight}
-
-
-        # Combine forecast values using a weighted average
-        weighted_forecast = []
-        for i in range(len(forecast_lstm)):
-            date = forecast_lstm[i]['date']
-            lstm_value = float(forecast_lstm[i]['value'])
-            xgboost_value = float(forecast_xgboost[i]['value'])
-
-            # Calculate the weighted average
-            combined_value = (lstm_weight * lstm_value) + (xgboost_weight * xgboost_value)
-            weighted_forecast.append({"date": date, "value": round(combined_value, 2)})
-
-        # Debugging output
-        print("Final Weighted Forecast:", weighted_forecast)
-
-
-
-        # Debugging shapes
-        print("predictions_lstm shape:", predictions_lstm.shape)
-        print("predictions_xgboost shape:", predictions_xgboost.shape)
-        print("y_test shape:", y_test.shape)
-
-        # Use only the first step of predictions_lstm to match the shape of predictions_xgboost and y_test
-        predictions_lstm = predictions_lstm[:, 0]  # Take the first step of multi-step predictions
-        print("Adjusted predictions_lstm shape:", predictions_lstm.shape)
-
-        # Align shapes if necessary
-        min_length = min(len(predictions_lstm), len(predictions_xgboost), len(y_test))
-        predictions_lstm = predictions_lstm[:min_length]
-        predictions_xgboost = predictions_xgboost[:min_length]
-        y_test = y_test[:min_length]
-        y_test_dates = y_test_dates[:min_length]
-
-        # Debugging aligned shapes
-        print("Aligned predictions_lstm shape:", predictions_lstm.shape)
-        print("Aligned predictions_xgboost shape:", predictions_xgboost.shape)
-        print("Aligned y_test shape:", y_test.shape)
-        print("Aligned y_test_dates length:", len(y_test_dates))
-
-        # Generate graphs for the weighted test data
-        graphs_dir = "graphs"
-        combined_weighted_graphs = generate_weighted_test_graphs(
-            y_test_dates, y_test, predictions_lstm, predictions_xgboost, weighted_forecast, forecast_lstm, forecast_xgboost, weights, scaler=scaler, graphs_dir=graphs_dir
-        )
-
-        # Ensure all values in forecasts are JSON serializable
-        forecast_lstm = [{"date": item["date"], "value": round(float(item["value"]), 2)} for item in forecast_lstm]
-        forecast_xgboost = [{"date": item["date"], "value": round(float(item["value"]), 2)} for item in forecast_xgboost]
-
-
-
-        result = {
-            'symbol': symbol,
-            'current_price': round(float(current_price), 2),  # Return current price only once
-            'lstm': {
-                "forecast": forecast_lstm,
-                'graphs': graph_paths_lstm  # Include LSTM graph paths
-            },
-            'xgboost': {
-                "forecast": forecast_xgboost,
-                'graphs': graph_paths_xgboost  # Include XGBoost graph paths
-            },
-            'hybrid': {
-                "forecast": weighted_forecast,  # Include weighted forecast
-                "graphs": combined_weighted_graphs,  # Include weighted test graph paths
-            }
-        }
+    forecast_days, forecast_mode, error = parse_forecast_options(data)
+    return symbol.upper(), forecast_days, forecast_mode, error
+
+
+def prediction_response(result, media_type):
+    """A /predict response in the negotiated media_type; the default JSON is the layout App.jsx reads."""
+    if media_type == JSON:
+        response = jsonify(result)
+    else:
+        response = Response(encode(result, media_type), mimetype=media_type)
+    response.vary.add('Accept')
+    return response
 
-        return jsonify(result)
 
+@app.route('/predict', methods=['POST'])
+def predict():
+    data = request.get_json()
+    symbol, forecast_days, forecast_mode, error = parse_prediction_request(data)
+    if error:
+        return jsonify({'error': error}), 400
+    media_type = negotiate(request.accept_mimetypes)
+
+    # Answer from the nightly precomputed results while they are fresh
+    result = precomputed_results.get(symbol, forecast_days, forecast_mode)
+    record_cache("precomputed", hit=result is not None)
+    if result is not None:
+        response = prediction_response(result, media_type)
+        response.headers['X-Result-Source'] = 'precomputed'
+        return response
+
+    from pipeline import run_cached_prediction, NoDataError
+    from registry import ModelNotAvailableError
+
+    try:
+        with record_timings() as timings:
+            result = run_cached_prediction(symbol, forecast_days, forecast_mode)
+        if data.get('timings'):
+            result = dict(result)  # Don't add the timings to the cached response
+            # Optional breakdown of where the time went (stages of both models overlap when run in parallel)
+            result['timings_ms'] = {name: round(seconds * 1000, 1) for name, seconds in timings.items()}
+        return prediction_response(result, media_type)
+    except NoDataError as e:
+        return jsonify({'error': str(e)}), 404
+    except ModelNotAvailableError as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         print("Error:", e)
         return jsonify({'error': str(e)}), 500
 
 
+def server_sent_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+# Open subscribe=1 streams of this worker; each holds a request thread until it is closed
+_subscriptions = threading.BoundedSemaphore(MAX_SUBSCRIPTIONS)
+
+
+@app.route('/predict/stream', methods=['GET'])
+def predict_stream():
+    """
+    Run a prediction and stream its parts as server-sent events while they become ready:
+    "data", one "model" per model (the fastest first), "hybrid", then "result" (the
+    /predict response). With subscribe=1 the stream stays open and a fresh "result" (with
+    its parts) is pushed whenever the symbol gets a new bar, for up to SUBSCRIBE_MAX_SECONDS;
+    beyond MAX_SUBSCRIPTIONS open subscriptions, new ones get a 503.
+    """
+    symbol, forecast_days, forecast_mode, error = parse_prediction_request(request.args)
+    if error:
+        return jsonify({'error': error}), 400
+    subscribe = request.args.get('subscribe') == '1'
+    if subscribe and not _subscriptions.acquire(blocking=False):
+        response = jsonify({'error': 'Too many open subscriptions, try again later'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(SUBSCRIBE_POLL_SECONDS)
+        return response
+
+    from pipeline import iter_cached_prediction, history_range, NoDataError
+    from preprocess import download_stock_data
+
+    def generate():
+        if not subscribe:
+            result = precomputed_results.get(symbol, forecast_days, forecast_mode)
+            record_cache("precomputed", hit=result is not None)
+            if result is not None:
+                yield server_sent_event("result", result)
+                return
+
+        last_bar = None
+        deadline = time.monotonic() + SUBSCRIBE_MAX_SECONDS
+        while True:
+            try:
+                start_date, end_date = history_range()
+                df = download_stock_data(symbol, start_date, end_date)
+                if df.empty:
+                    raise NoDataError('No data found for this symbol')
+                if df.index[-1] != last_bar:
+                    last_bar = df.index[-1]
+                    for event, data in iter_cached_prediction(symbol, forecast_days, forecast_mode, df=df):
+                        yield server_sent_event(event, data)
+                else:
+                    yield ": no new bar\n\n"  # Comment line; also keeps proxies from closing the connection
+            except Exception as e:
+                print("Error:", e)
+                yield server_sent_event("error", {'error': str(e)})
+                return
+            if not subscribe or time.monotonic() + SUBSCRIBE_POLL_SECONDS > deadline:
+                return
+            time.sleep(SUBSCRIBE_POLL_SECONDS)
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    if subscribe:
+        # Also runs when the client disconnects or the stream fails
+        response.call_on_close(_subscriptions.release)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Ask nginx not to buffer the events
+    return response
+
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    """Predict a list of symbols, streaming one NDJSON line per symbol as each finishes.
+
+    With Accept: application/vnd.forecast.columnar+json the lines are in the columnar
+    layout; with Accept: application/vnd.apache.arrow.stream the response is an Arrow IPC
+    stream with one record batch per symbol.
+    """
+    data = request.get_json()
+    symbols = data.get('symbols')
+    if not isinstance(symbols, list) or not symbols or not all(isinstance(s, str) and s for s in symbols):
+        return jsonify({'error': 'symbols must be a non-empty list of stock symbols'}), 400
+    if len(symbols) > MAX_BATCH_SYMBOLS:
+        return jsonify({'error': f'At most {MAX_BATCH_SYMBOLS} symbols can be predicted at once'}), 400
+
+    forecast_days, forecast_mode, error = parse_forecast_options(data)
+    if error:
+        return jsonify({'error': error}), 400
+
+    media_type = negotiate(request.accept_mimetypes)
+
+    def generate():
+        from pipeline import run_batch_prediction
+
+        try:
+            for result in run_batch_prediction(symbols, forecast_days, forecast_mode):
+                yield json.dumps(columnar_json(result) if media_type == COLUMNAR_JSON else result) + "\n"
+        except Exception as e:
+            print("Error:", e)
+            yield json.dumps({'error': str(e)}) + "\n"
+
+    def generate_arrow():
+        from pipeline import run_batch_prediction
+
+        stream = ArrowStream()
+        try:
+            for result in run_batch_prediction(symbols, forecast_days, forecast_mode):
+                yield stream.write(result)
+        except Exception as e:
+            print("Error:", e)
+            yield stream.write({'error': str(e)})
+        yield stream.close()
+
+    if media_type == ARROW_STREAM:
+        response = Response(stream_with_context(generate_arrow()), mimetype=ARROW_STREAM)
+    else:
+        response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    response.vary.add('Accept')
+    return response
+
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """Queue a prediction and return its job id right away."""
+    symbol, forecast_days, forecast_mode, error = parse_prediction_request(request.get_json())
+    if error:
+        return jsonify({'error': error}), 400
+
+    try:
+        job = job_queue.submit(symbol, forecast_days, forecast_mode)
+    except QueueFullError as e:
+        response = jsonify({'error': str(e)})
+        response.headers['Retry-After'] = str(JOB_RETRY_AFTER_SECONDS)
+        return response, 429
+
+    return jsonify(job), 202
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Return the status of a job, and its result once it is done."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+
 
 
 @app.route('/stock-info', methods=['POST'])
@@ -224,10 +270,11 @@ def stock_info():
     if not symbol:
         return jsonify({'error': 'Stock symbol is required'}), 400
 
+    from data_store import ohlcv_store
+
     try:
-        # Fetch stock information using yfinance
-        ticker = yf.Ticker(symbol)
-        info = ticker.info
+        # Fetch stock information (served from the local cache while it is fresh)
+        info = ohlcv_store.get_info(symbol)
 
         # Extract relevant fields
         stock_info = {
@@ -248,19 +295,70 @@ def stock_info():
 
 
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Stage durations, request durations, cache hit/miss counts and model sizes in the Prometheus text format."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
 @app.route('/graph/<graph_name>', methods=['GET'])
 def get_graph(graph_name):
     """
-    Endpoint to serve graph images to the client.
+    Endpoint to serve graph images to the client. The PNG is rendered from the stored
+    graph data the first time it is requested. Graph names contain a hash of their data,
+    so the image behind a name never changes and can be cached indefinitely.
     """
-    graphs_dir = "graphs"
-    graph_path = os.path.join(os.getcwd(), graphs_dir, graph_name)
-    print("Graph path:", graph_path)  # Debugging line
-    if os.path.exists(graph_path):
-        return send_file(graph_path, mimetype='image/png')
+    _, digest = split_graph_name(graph_name)
+    if digest is None:
+        return jsonify({'error': 'Graph not found'}), 404
+
+    # The client already holds this exact image; no need to look at (or render) the file
+    etag = digest
+    if etag in request.if_none_match:
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = GRAPH_CACHE_SECONDS
+        response.cache_control.immutable = True
+        return response
+
+    graph_path = render_graph_file(graph_name, os.path.join(os.getcwd(), GRAPHS_DIR))
+    logger.debug("Graph path: %s", graph_path)
+    if graph_path:
+        response = send_file(graph_path, mimetype='image/png', etag=etag, max_age=GRAPH_CACHE_SECONDS)
+        response.cache_control.immutable = True
+        return response
     else:
         return jsonify({'error': 'Graph not found'}), 404
 
 
+def preload(models=PRELOAD_MODELS):
+    """Import the prediction stack ahead of the first /predict request, and load the newest models."""
+    start = time.perf_counter()
+    import pipeline
+    print(f"Prediction stack loaded in {time.perf_counter() - start:.1f} s")
+    if models:
+        start = time.perf_counter()
+        keys = pipeline.preload_models(models)
+        print(f"{len(keys)} models loaded in {time.perf_counter() - start:.1f} s")
+
+
+def shutdown():
+    """Let running jobs and watchlist predictions finish, then stop their worker processes.
+
+    Queued jobs that have not started are marked failed. Called when a server worker exits.
+    """
+    job_queue.shutdown(wait=True)
+    if 'pipeline' in sys.modules:
+        sys.modules['pipeline'].shutdown_batch_executor()
+
+
+if PRELOAD_ON_START:
+    # Load it in the background: the app answers requests right away, and a /predict
+    # arriving meanwhile waits for the imports instead of running them a second time
+    threading.Thread(target=preload, name="preload", daemon=True).start()
+
+
 if __name__ == '__main__':
+    # Development server with the reloader; run gunicorn -c gunicorn.conf.py app:app in production
     app.run(debug=True, host='0.0.0.0')  # Allow external access
\ No newline at end of file
@@ -0,0 +1,220 @@
+"""Walk-forward backtest of the LSTM, XGBoost and hybrid models.
+
+Each symbol's windows are split into consecutive test blocks that end with the last bar.
+Every fold trains fresh models on the windows before its test block (all of them with
+--scheme expanding, the last --train-size with --scheme rolling) and scores the
+forecast_days-ahead prediction on the block:
+
+    python backtest.py AAPL MSFT --forecast-days 7 --folds 5 --output backtest.csv
+    python backtest.py --universe universe.txt --models xgboost --workers 8
+
+The models are fitted on the first 80% of a fold's training windows; the hybrid's
+weights are fitted (with the server's ENSEMBLE_WEIGHTING, or --weighting) on their
+predictions of the remaining 20%. Each fold scales the close with the bars its training
+windows cover only, so nothing of the test period leaks into the training.
+
+Folds of all symbols run in a process pool. Workers are sent the close series (a few KB)
+and rebuild the windows as views over it, so the windowed arrays are never copied or
+pickled. Per-fold MAE, RMSE, R² and directional accuracy, and the fitted weights, are
+printed as a table (prices in the symbol's currency) and can be written to CSV with --output.
+"""
+import argparse
+import math
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from config import WINDOW_SIZE, UNIVERSE_FILE, PRETRAIN_WORKERS, ENSEMBLE_WEIGHTING
+from ensemble import combine, fit_weights
+from preprocess import download_stock_data_many, window_series
+from scheduler import read_universe
+from windowing import validation_split
+
+MODELS = ["lstm", "xgboost"]
+METRICS = ["mae", "rmse", "r2", "directional_accuracy"]
+
+
+def walk_forward_folds(n_samples, n_folds, test_size=None, scheme="expanding", train_size=None, gap=0):
+    """Return [(train, test)] slices over n_samples windows for a walk-forward backtest.
+
+    The n_folds test blocks of test_size windows are consecutive and end with the last
+    window. gap windows are left out between the training and test windows, so that no
+    training target falls inside the test period (use forecast_days - 1).
+    """
+    test_size = test_size or n_samples // (n_folds + 1)
+    first_test = n_samples - n_folds * test_size
+    train_size = train_size or first_test - gap
+    if test_size < 1 or first_test - gap < 1:
+        raise ValueError(f"{n_samples} windows are too few for {n_folds} folds of {test_size}")
+
+    folds = []
+    for k in range(n_folds):
+        test_start = first_test + k * test_size
+        train_end = test_start - gap
+        train_start = 0 if scheme == "expanding" else max(0, train_end - train_size)
+        folds.append((slice(train_start, train_end), slice(test_start, test_start + test_size)))
+    return folds
+
+
+def fold_metrics(y_true, y_pred, last_close):
+    """MAE, RMSE, R² and the share of windows where the predicted move from last_close has the right sign."""
+    from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+    return {
+        "mae": mean_absolute_error(y_true, y_pred),
+        "rmse": math.sqrt(mean_squared_error(y_true, y_pred)),
+        "r2": r2_score(y_true, y_pred),
+        "directional_accuracy": float(np.mean(np.sign(y_pred - last_close) == np.sign(y_true - last_close))),
+    }
+
+
+def _run_fold(close, index, forecast_days, train, test, models, epochs, weighting):
+    """Train the models of one fold in a worker process; returns {model: metrics and hybrid weight}."""
+    from sklearn.preprocessing import MinMaxScaler
+
+    # Scale with the bars the training windows cover (inputs and targets) only; window i's
+    # last target is bar i + WINDOW_SIZE + forecast_days - 1
+    train_bars = slice(train.start, train.stop + WINDOW_SIZE + forecast_days - 1)
+    scaler = MinMaxScaler().fit(close[train_bars, np.newaxis])
+    series = scaler.transform(close[:, np.newaxis])[:, 0].astype(np.float32)
+
+    # Rebuild the windows as views over the series (direct mode: every horizon per window)
+    X, y, _, _ = window_series(series, index, forecast_days, WINDOW_SIZE, multi_step=True)
+    X_train, y_train, X_test, y_test = X[train], y[train], X[test], y[test]
+    fit_end = validation_split(len(X_train))
+    X_fit, y_fit, X_val, y_val = X_train[:fit_end], y_train[:fit_end], X_train[fit_end:], y_train[fit_end:]
+
+    def prices(values):
+        return scaler.inverse_transform(np.asarray(values, dtype=np.float64).reshape(-1, 1)).flatten()
+
+    validation, predictions = {}, {}
+    if "lstm" in models:
+        from model_lstm import build_lstm_model
+
+        model = build_lstm_model((X_fit.shape[1], 1), forecast_days)
+        model.fit(X_fit, y_fit, epochs=epochs, batch_size=32, verbose=0)
+        validation["lstm"] = prices(model.predict_on_batch(X_val)[:, -1])
+        predictions["lstm"] = prices(model.predict_on_batch(X_test)[:, -1])
+    if "xgboost" in models:
+        from model_xgboost import build_xgboost_model
+
+        model = build_xgboost_model()
+        model.fit(X_fit.reshape(len(X_fit), -1), y_fit)
+        validation["xgboost"] = prices(model.predict(X_val.reshape(len(X_val), -1))[:, -1])
+        predictions["xgboost"] = prices(model.predict(X_test.reshape(len(X_test), -1))[:, -1])
+    weights = {}
+    if len(predictions) == 2:
+        weights = fit_weights(validation, prices(y_val[:, -1]), weighting)
+        predictions["hybrid"] = combine(predictions, weights)
+
+    actual = prices(y_test[:, -1])
+    last_close = prices(X_test[:, -1, 0])
+    return {
+        name: dict(fold_metrics(actual, predicted, last_close), weight=weights.get(name, np.nan))
+        for name, predicted in predictions.items()
+    }
+
+
+def run(frames, forecast_days, n_folds, scheme="expanding", test_size=None, train_size=None,
+        models=MODELS, epochs=20, weighting=ENSEMBLE_WEIGHTING, workers=PRETRAIN_WORKERS):
+    """Backtest every symbol in frames ({symbol: DataFrame}); returns one row per fold and model."""
+    rows = []
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        futures = {}
+        for symbol, df in frames.items():
+            close = df["Close"].to_numpy(np.float64)
+            try:
+                _, _, _, y_dates = window_series(close, df.index, forecast_days, WINDOW_SIZE, multi_step=True)
+                folds = walk_forward_folds(len(y_dates), n_folds, test_size, scheme, train_size, gap=forecast_days - 1)
+            except ValueError as e:
+                print(f"{symbol} skipped: {e}")
+                continue
+
+            for fold, (train, test) in enumerate(folds):
+                future = executor.submit(
+                    _run_fold, close, df.index, forecast_days, train, test, models, epochs, weighting
+                )
+                futures[future] = {
+                    "symbol": symbol, "fold": fold,
+                    "train_start": y_dates[train][0].date(), "train_end": y_dates[train][-1].date(),
+                    "test_start": y_dates[test][0].date(), "test_end": y_dates[test][-1].date(),
+                    "n_train": len(y_dates[train]), "n_test": len(y_dates[test]),
+                }
+
+        for future in as_completed(futures):
+            fold = futures[future]
+            try:
+                results = future.result()
+            except Exception as e:
+                print(f"{fold['symbol']} fold {fold['fold']} failed: {e}")
+                continue
+            for model, metrics in results.items():
+                rows.append({**fold, "model": model, **metrics})
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    columns = ["symbol", "fold", "model", "train_start", "train_end", "test_start", "test_end", "n_train", "n_test", *METRICS, "weight"]
+    return pd.DataFrame(rows, columns=columns).sort_values(["symbol", "fold", "model"], ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("symbols", nargs="*", help="symbols to backtest (default: the universe file)")
+    parser.add_argument("--universe", default=UNIVERSE_FILE, help="file with one symbol per line")
+    parser.add_argument("--forecast-days", type=int, default=7)
+    parser.add_argument("--years", type=float, default=2, help="years of history to backtest on")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--scheme", default="expanding", choices=["expanding", "rolling"])
+    parser.add_argument("--test-size", type=int, help="windows per test block (default: an equal share)")
+    parser.add_argument("--train-size", type=int, help="windows per training set with --scheme rolling")
+    parser.add_argument("--models", nargs="+", default=MODELS, choices=MODELS)
+    parser.add_argument("--epochs", type=int, default=20, help="LSTM training epochs per fold")
+    parser.add_argument("--weighting", default=ENSEMBLE_WEIGHTING, choices=["inverse_error", "stacked", "equal"],
+                        help="how the hybrid's weights are fitted on each fold's validation windows")
+    parser.add_argument("--workers", type=int, default=PRETRAIN_WORKERS)
+    parser.add_argument("--output", help="write the per-fold table to this CSV file")
+    args = parser.parse_args()
+
+    # Split the cores between the workers; set before the pool is created so the spawned
+    # workers pick it up, unless configured explicitly
+    threads = str(max(1, (os.cpu_count() or 1) // args.workers))
+    for name in ("TF_INTRA_OP_THREADS", "XGB_N_JOBS"):
+        os.environ.setdefault(name, threads)
+    os.environ.setdefault("TF_INTER_OP_THREADS", "1")
+
+    symbols = [symbol.upper() for symbol in args.symbols] or read_universe(args.universe)
+    end_date = datetime.today().date()
+    start_date = end_date - timedelta(days=int(365 * args.years))
+    frames = {symbol: df for symbol, df in download_stock_data_many(symbols, start_date, end_date).items() if not df.empty}
+    for symbol in sorted(set(symbols) - set(frames)):
+        print(f"{symbol} skipped: no data found")
+
+    print(f"Backtesting {len(frames)} symbols x {args.folds} {args.scheme} folds with {args.workers} workers")
+    table = run(
+        frames, args.forecast_days, args.folds, args.scheme, args.test_size, args.train_size,
+        args.models, args.epochs, args.weighting, args.workers,
+    )
+    if table.empty:
+        sys.exit(1)
+
+    with pd.option_context("display.width", 200, "display.max_rows", None, "display.float_format", "{:.4f}".format):
+        print(table.to_string(index=False))
+        print("\nMean over folds:")
+        print(table.groupby(["symbol", "model"])[[*METRICS, "weight"]].mean().to_string())
+        if len(frames) > 1:
+            print("\nMean over all symbols and folds:")
+            print(table.groupby("model")[[*METRICS, "weight"]].mean().to_string())
+
+    if args.output:
+        table.to_csv(args.output, index=False)
+        print("Per-fold table written to", args.output)
+
+
+if __name__ == "__main__":
+    main()
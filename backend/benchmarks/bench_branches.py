@@ -0,0 +1,57 @@
+"""Time one prediction with the LSTM and XGBoost branches run one after the other vs concurrently.
+
+Models are always trained from scratch (no registry) on synthetic data.
+
+Usage: python benchmarks/bench_branches.py [--days N] [--forecast-days N] [--repeat N]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import synthetic_ohlcv  # noqa: E402
+from config import WINDOW_SIZE, TF_INTRA_OP_THREADS, XGB_N_JOBS  # noqa: E402
+from preprocess import prepare_data  # noqa: E402
+from model_lstm import train_and_forecast_lstm  # noqa: E402
+from model_xgboost import train_and_forecast_xgboost  # noqa: E402
+from pipeline import run_model_branches  # noqa: E402
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=504)
+    parser.add_argument("--forecast-days", type=int, default=7)
+    parser.add_argument("--mode", default="direct", choices=["direct", "recursive"])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    df = synthetic_ohlcv(args.days)
+    prepared = prepare_data(
+        df, args.forecast_days, window_size=WINDOW_SIZE, dtype=np.float32, multi_step=args.mode == "direct"
+    )
+
+    timings = {"lstm": [], "xgboost": [], "sequential": [], "parallel": []}
+    for _ in range(args.repeat):
+        timings["lstm"].append(timed(train_and_forecast_lstm, df, args.forecast_days, None, args.mode, prepared))
+        timings["xgboost"].append(timed(train_and_forecast_xgboost, df, args.forecast_days, None, args.mode, prepared))
+        timings["sequential"].append(timed(run_model_branches, df, args.forecast_days, None, args.mode, prepared, False))
+        timings["parallel"].append(timed(run_model_branches, df, args.forecast_days, None, args.mode, prepared, True))
+
+    print(f"cpus={os.cpu_count()} tf_intra_op_threads={TF_INTRA_OP_THREADS} xgb_n_jobs={XGB_N_JOBS}")
+    for name, values in timings.items():
+        print(f"{name:>10}: median {statistics.median(values):7.2f} s")
+
+
+if __name__ == "__main__":
+    main()
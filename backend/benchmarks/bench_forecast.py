@@ -0,0 +1,74 @@
+"""Compare forecast latency of the recursive per-day loop with direct multi-horizon prediction.
+
+Models are trained briefly on synthetic data: only the forecasting step is timed.
+
+Usage: python benchmarks/bench_forecast.py [--forecast-days 7 30] [--repeat N]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import synthetic_ohlcv  # noqa: E402
+from preprocess import prepare_data  # noqa: E402
+from windowing import multi_step_targets  # noqa: E402
+from model_lstm import build_lstm_model, forecast_lstm_direct, forecast_lstm_recursive  # noqa: E402
+from model_xgboost import build_xgboost_model, forecast_xgboost_direct, forecast_xgboost_recursive  # noqa: E402
+
+
+def median_ms(func, repeat):
+    func()  # warm-up (graph tracing, thread pools)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--forecast-days", type=int, nargs="+", default=[7, 30])
+    parser.add_argument("--days", type=int, default=504, help="number of synthetic bars")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--epochs", type=int, default=1)
+    parser.add_argument("--trees", type=int, default=500)
+    args = parser.parse_args()
+
+    df = synthetic_ohlcv(args.days)
+    print(f"{'model':>8} {'days':>5} {'recursive ms':>13} {'direct ms':>10} {'speedup':>8}")
+    for forecast_days in args.forecast_days:
+        X, Y, X_forecast, scaler, _ = prepare_data(df, forecast_days, dtype=np.float32, multi_step=True)
+        y = Y[:, -1]
+
+        # LSTM: the recursive mode trains on shifted multi-step targets, the direct mode on Y
+        lstm_recursive = build_lstm_model((X.shape[1], 1), forecast_days)
+        y_recursive = multi_step_targets(y, forecast_days)
+        lstm_recursive.fit(X[:len(y_recursive)], y_recursive, epochs=args.epochs, verbose=0)
+        lstm_direct = build_lstm_model((X.shape[1], 1), forecast_days)
+        lstm_direct.fit(X, Y, epochs=args.epochs, verbose=0)
+
+        recursive = median_ms(lambda: forecast_lstm_recursive(lstm_recursive, X_forecast, scaler, forecast_days), args.repeat)
+        direct = median_ms(lambda: forecast_lstm_direct(lstm_direct, X_forecast, scaler), args.repeat)
+        print(f"{'lstm':>8} {forecast_days:>5} {recursive:>13.2f} {direct:>10.2f} {recursive / direct:>7.1f}x")
+
+        # XGBoost: single-output model for the recursive loop, multi-output model for direct
+        X_flat = X.reshape(len(X), -1)
+        X_forecast_flat = X_forecast.reshape(1, -1)
+        xgb_recursive = build_xgboost_model().set_params(n_estimators=args.trees)
+        xgb_recursive.fit(X_flat, y)
+        xgb_direct = build_xgboost_model().set_params(n_estimators=args.trees)
+        xgb_direct.fit(X_flat, Y)
+
+        recursive = median_ms(lambda: forecast_xgboost_recursive(xgb_recursive, X_forecast_flat, scaler, forecast_days), args.repeat)
+        direct = median_ms(lambda: forecast_xgboost_direct(xgb_direct, X_forecast_flat, scaler), args.repeat)
+        print(f"{'xgboost':>8} {forecast_days:>5} {recursive:>13.2f} {direct:>10.2f} {recursive / direct:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""End-to-end benchmark of the prediction pipeline on synthetic data, stage by stage.
+
+Every run loads synthetic bars through the OHLCV store (from local files, no network),
+runs the full /predict pipeline, renders every graph and serializes the response.
+Models, graphs and data live in a scratch directory; each run uses a new symbol so
+models are trained from scratch unless --warm is given.
+
+Reports p50/p95 latency per stage, throughput and peak RSS, and can write them as JSON
+(--output) to compare against an earlier run (--compare).
+
+Usage: python benchmarks/bench_pipeline.py [--sizes 252 504 1260] [--repeat N] [--output FILE] [--compare FILE]
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Keep every artifact out of the working tree; must be set before config is imported
+SCRATCH_DIR = tempfile.mkdtemp(prefix="bench-pipeline-")
+for name in ("MODEL_DIR", "GRAPHS_DIR", "DATA_DIR", "DATA_SOURCE_DIR"):
+    os.environ[name] = os.path.join(SCRATCH_DIR, name.lower())
+os.makedirs(os.environ["DATA_SOURCE_DIR"])
+
+from synthetic import synthetic_ohlcv  # noqa: E402
+from config import FORECAST_MODE, PARALLEL_BRANCHES, GRAPHS_DIR  # noqa: E402
+from timing import record_timings, stage  # noqa: E402
+from preprocess import download_stock_data  # noqa: E402
+from pipeline import run_prediction  # noqa: E402
+from charts import render_graph_file  # noqa: E402
+
+STAGES = [
+    "load", "prepare_data", "lstm_fit", "lstm_predict", "lstm_forecast",
+    "xgboost_fit", "xgboost_predict", "xgboost_forecast", "graph_series", "graph_render", "serialize",
+]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far (ru_maxrss is KiB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def summarize(values):
+    values = np.asarray(values) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "mean_ms": round(float(values.mean()), 3),
+    }
+
+
+def run_once(symbol, df, forecast_days, forecast_mode, render):
+    """Run one prediction for symbol; returns ({stage: seconds}, total seconds)."""
+    start = time.perf_counter()
+    with record_timings() as timings:
+        df = download_stock_data(symbol, df.index[0], df.index[-1] + np.timedelta64(1, "D"))
+        result = run_prediction(symbol, forecast_days, forecast_mode, df=df)
+        if render:
+            for section in ("lstm", "xgboost", "hybrid"):
+                for graph_name in result[section]["graphs"].values():
+                    render_graph_file(graph_name, GRAPHS_DIR)
+        with stage("serialize"):
+            json.dumps(result)
+    return dict(timings), time.perf_counter() - start
+
+
+def bench_size(n_days, args):
+    """Benchmark one history length; the first (warm-up) run is not counted."""
+    symbols = [f"SYN{n_days}X{i}" for i in range(args.repeat + 1)]
+    df = synthetic_ohlcv(n_days, seed=n_days)
+    for symbol in symbols:
+        df.to_parquet(os.path.join(os.environ["DATA_SOURCE_DIR"], f"{symbol}.parquet"))
+
+    stage_timings = {name: [] for name in STAGES}
+    totals = []
+    for i, symbol in enumerate(symbols):
+        if args.warm:
+            symbol = symbols[0]  # Same symbol and data: models come from the registry
+        timings, total = run_once(symbol, df, args.forecast_days, args.mode, not args.no_render)
+        if i == 0:
+            continue
+        for name in STAGES:
+            stage_timings[name].append(timings.get(name, 0.0))
+        totals.append(total)
+
+    return {
+        "days": n_days,
+        "runs": len(totals),
+        "stages": {name: summarize(values) for name, values in stage_timings.items()},
+        "total": summarize(totals),
+        "throughput_per_s": round(len(totals) / sum(totals), 4),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def print_report(report, baseline=None):
+    baseline_sizes = {entry["days"]: entry for entry in baseline["results"]} if baseline else {}
+    for entry in report["results"]:
+        print(f"\n{entry['days']} days, {entry['runs']} runs: "
+              f"{entry['throughput_per_s']:.3f} predictions/s, peak RSS {entry['peak_rss_mb']:.0f} MB")
+        header = f"{'stage':>18} {'p50 ms':>10} {'p95 ms':>10}"
+        print(header + (f" {'base p50':>10} {'change':>8}" if entry["days"] in baseline_sizes else ""))
+        base = baseline_sizes.get(entry["days"])
+        for name, stats in [*entry["stages"].items(), ("total", entry["total"])]:
+            row = f"{name:>18} {stats['p50_ms']:>10.1f} {stats['p95_ms']:>10.1f}"
+            base_stats = None
+            if base:
+                base_stats = base["total"] if name == "total" else base["stages"].get(name)
+            if base_stats:
+                change = (stats["p50_ms"] / base_stats["p50_ms"] - 1) * 100 if base_stats["p50_ms"] else 0.0
+                row += f" {base_stats['p50_ms']:>10.1f} {change:>+7.1f}%"
+            print(row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[252, 504, 1260], help="synthetic bars per run")
+    parser.add_argument("--repeat", type=int, default=3, help="counted runs per size")
+    parser.add_argument("--forecast-days", type=int, default=7)
+    parser.add_argument("--mode", default=FORECAST_MODE, choices=["direct", "recursive"])
+    parser.add_argument("--warm", action="store_true", help="reuse trained models instead of training each run")
+    parser.add_argument("--no-render", action="store_true", help="skip rendering the graph PNGs")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="JSON file of an earlier run to compare p50 latencies with")
+    args = parser.parse_args()
+
+    report = {
+        "config": {
+            "sizes": args.sizes, "repeat": args.repeat, "forecast_days": args.forecast_days,
+            "mode": args.mode, "warm": args.warm, "render": not args.no_render,
+            "parallel_branches": PARALLEL_BRANCHES,
+        },
+        "environment": {
+            "python": platform.python_version(), "platform": platform.platform(),
+            "cpu_count": os.cpu_count(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": [bench_size(n_days, args) for n_days in sorted(args.sizes)],
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Load test of the production server (gunicorn.conf.py): throughput for 1, 2, 4... workers.
+
+Models for a few synthetic symbols are first trained in full mode (in a scratch
+directory). Then, for every worker count, gunicorn serves them in lite mode with the
+result cache disabled, so each /predict runs the whole inference path (price store,
+windowing, both models, weights, intervals, graph data). Concurrent clients post
+/predict for --duration seconds; requests per second and latency percentiles are
+reported. Each server is then stopped with SIGTERM while requests are in flight,
+checking that they still complete (graceful shutdown).
+
+Usage: python benchmarks/bench_server.py [--workers 1 2 4] [--clients 8] [--duration 30] [--output FILE]
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SYMBOLS = ["LOAD1", "LOAD2", "LOAD3", "LOAD4"]
+FORECAST_DAYS = 7
+
+
+def train(env):
+    """Train and store the models of every symbol once, in full mode."""
+    code = (
+        "from pipeline import run_prediction\n"
+        f"for symbol in {SYMBOLS!r}:\n"
+        f"    run_prediction(symbol, {FORECAST_DAYS})\n"
+    )
+    subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=dict(env, SERVING_MODE="full"),
+                   check=True, capture_output=True)
+
+
+def post_predict(url, symbol):
+    """POST /predict; returns (seconds, HTTP status)."""
+    body = json.dumps({"symbol": symbol, "forecast_days": FORECAST_DAYS}).encode()
+    request = urllib.request.Request(f"{url}/predict", data=body, headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=300) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except OSError:
+        status = 0  # Connection refused or reset
+    return time.perf_counter() - start, status
+
+
+def wait_until_ready(url, process, timeout=300):
+    """Wait until the server answers (each worker preloads the prediction stack before it does)."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit("gunicorn exited during startup")
+        try:
+            urllib.request.urlopen(f"{url}/metrics", timeout=5).read()
+            return
+        except OSError:
+            time.sleep(0.5)
+    raise SystemExit("gunicorn did not start")
+
+
+def load(url, clients, duration):
+    """Post /predict from clients threads for duration seconds; returns the (seconds, status) of every request."""
+    deadline = time.perf_counter() + duration
+    results = []
+    lock = threading.Lock()
+
+    def client(index):
+        i = index
+        while time.perf_counter() < deadline:
+            result = post_predict(url, SYMBOLS[i % len(SYMBOLS)])
+            with lock:
+                results.append(result)
+            i += 1
+
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(client, range(clients)))
+    return results
+
+
+def run_server(env, workers, clients, duration, port):
+    url = f"http://127.0.0.1:{port}"
+    server_env = dict(env, WEB_WORKERS=str(workers), BIND=f"127.0.0.1:{port}")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+        cwd=BACKEND_DIR, env=server_env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_ready(url, process)
+        # Warm every worker (models are loaded by PRELOAD_MODELS, this runs the code paths once)
+        load(url, workers * 2, 2)
+
+        start = time.perf_counter()
+        results = load(url, clients, duration)
+        elapsed = time.perf_counter() - start
+
+        # Graceful shutdown: SIGTERM with requests in flight; they should still get their response
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            in_flight = [pool.submit(post_predict, url, SYMBOLS[i % len(SYMBOLS)]) for i in range(clients)]
+            time.sleep(0.5)
+            stop_start = time.perf_counter()
+            process.send_signal(signal.SIGTERM)
+            shutdown_statuses = [future.result()[1] for future in in_flight]
+        process.wait(timeout=300)
+        stop_seconds = time.perf_counter() - stop_start
+    finally:
+        if process.poll() is None:
+            process.kill()
+
+    seconds = sorted(s for s, status in results if status == 200)
+    return {
+        "workers": workers,
+        "requests": len(results),
+        "errors": sum(status != 200 for _, status in results),
+        "requests_per_second": round(len(seconds) / elapsed, 2),
+        "p50_ms": round(seconds[len(seconds) // 2] * 1000, 1) if seconds else None,
+        "p95_ms": round(seconds[int(len(seconds) * 0.95)] * 1000, 1) if seconds else None,
+        "shutdown_completed": sum(status == 200 for status in shutdown_statuses),
+        "shutdown_requests": len(shutdown_statuses),
+        "stop_seconds": round(stop_seconds, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=8, help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load per worker count")
+    parser.add_argument("--port", type=int, default=5099)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    sys.path.insert(0, BACKEND_DIR)
+    import pandas as pd
+    from synthetic import synthetic_ohlcv
+
+    scratch = tempfile.mkdtemp(prefix="bench-server-")
+    env = dict(os.environ)
+    for name in ("MODEL_DIR", "GRAPHS_DIR", "DATA_DIR", "DATA_SOURCE_DIR", "PRECOMPUTED_DIR"):
+        env[name] = os.path.join(scratch, name.lower())
+    os.makedirs(env["DATA_SOURCE_DIR"])
+    env.pop("RESULT_CACHE_DIR", None)
+    # Every request runs inference on the stored models; nothing is trained or served from a cache
+    env.update(SERVING_MODE="lite", RESULT_CACHE_SIZE="0", PRELOAD_MODELS=str(2 * len(SYMBOLS)))
+
+    # Synthetic bars ending yesterday, so /predict (which reads the last two years) finds them
+    start = pd.bdate_range(end=pd.Timestamp.today().normalize() - pd.Timedelta(days=1), periods=600)[0]
+    for seed, symbol in enumerate(SYMBOLS):
+        synthetic_ohlcv(600, seed=seed, start=start).to_parquet(os.path.join(env["DATA_SOURCE_DIR"], f"{symbol}.parquet"))
+
+    print(f"Training the models of {len(SYMBOLS)} symbols once in full mode...")
+    train(env)
+
+    results = []
+    print(f"cpus={os.cpu_count()} clients={args.clients} duration={args.duration:g}s")
+    print(f"{'workers':>7} {'requests':>8} {'errors':>6} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'shutdown':>9} {'stop s':>7}")
+    for workers in args.workers:
+        result = run_server(env, workers, args.clients, args.duration, args.port)
+        results.append(result)
+        print(f"{result['workers']:>7} {result['requests']:>8} {result['errors']:>6} {result['requests_per_second']:>7.2f} "
+              f"{result['p50_ms']:>8} {result['p95_ms']:>8} "
+              f"{result['shutdown_completed']:>4}/{result['shutdown_requests']:<4} {result['stop_seconds']:>7.2f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Compare serving in full mode (Keras, TensorFlow) with lite mode (exported models, no TensorFlow).
+
+A model is first trained in full mode on synthetic data (in a scratch directory). Then a
+fresh process per mode measures:
+  - cold start: time to import the Flask app
+  - first /predict: the stored models are loaded and run
+  - peak RSS after that request
+  - median latency of one direct LSTM forecast call on the loaded model
+
+Usage: python benchmarks/bench_serving.py [--repeat N] [--output FILE]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SYMBOL = "SERVE"
+FORECAST_DAYS = 7
+
+
+def child(repeat):
+    """Measure one serving process (SERVING_MODE is set by the parent)."""
+    start = time.perf_counter()
+    from app import app
+    import_seconds = time.perf_counter() - start
+
+    client = app.test_client()
+    start = time.perf_counter()
+    response = client.post("/predict", json={"symbol": SYMBOL, "forecast_days": FORECAST_DAYS, "forecast_mode": "direct"})
+    first_predict_seconds = time.perf_counter() - start
+    if response.status_code != 200:
+        raise SystemExit(f"/predict failed: {response.get_json()}")
+
+    from config import SERVING_MODE, WINDOW_SIZE
+    from registry import model_registry
+    from model_lstm import forecast_lstm_direct
+
+    # The model the request just loaded is in the registry's memory cache
+    entry = next(entry for key, entry in model_registry._memory.items() if "_lstm-direct_" in key)
+    X_forecast = entry["scaler"].transform([[100.0]] * WINDOW_SIZE).reshape(1, WINDOW_SIZE, 1).astype("float32")
+    forecast_lstm_direct(entry["model"], X_forecast, entry["scaler"])
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        forecast_lstm_direct(entry["model"], X_forecast, entry["scaler"])
+        timings.append(time.perf_counter() - start)
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        "mode": SERVING_MODE,
+        "import_seconds": round(import_seconds, 3),
+        "first_predict_seconds": round(first_predict_seconds, 3),
+        "peak_rss_mb": round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1),
+        "forecast_ms_p50": round(sorted(timings)[len(timings) // 2] * 1000, 3),
+        "tensorflow_imported": "tensorflow" in sys.modules,
+    }))
+
+
+def run_child(mode, env, repeat):
+    env = dict(env, SERVING_MODE=mode)
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", "--repeat", str(repeat)],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    sys.path.insert(0, BACKEND_DIR)
+    if args.child:
+        child(args.repeat)
+        return
+
+    import pandas as pd
+    from synthetic import synthetic_ohlcv
+
+    scratch = tempfile.mkdtemp(prefix="bench-serving-")
+    env = dict(os.environ)
+    for name in ("MODEL_DIR", "GRAPHS_DIR", "DATA_DIR", "DATA_SOURCE_DIR", "PRECOMPUTED_DIR"):
+        env[name] = os.path.join(scratch, name.lower())
+    os.makedirs(env["DATA_SOURCE_DIR"])
+    env.pop("RESULT_CACHE_DIR", None)
+
+    # Synthetic bars ending yesterday, so /predict (which reads the last two years) finds them
+    start = pd.bdate_range(end=pd.Timestamp.today().normalize() - pd.Timedelta(days=1), periods=600)[0]
+    synthetic_ohlcv(600, start=start).to_parquet(os.path.join(env["DATA_SOURCE_DIR"], f"{SYMBOL}.parquet"))
+
+    print("Training the models once in full mode...")
+    run_child("full", env, 1)
+
+    results = [run_child(mode, env, args.repeat) for mode in ("full", "lite")]
+    print(f"{'mode':>6} {'import s':>9} {'1st predict s':>14} {'peak RSS MB':>12} {'forecast ms':>12} {'tensorflow':>11}")
+    for result in results:
+        print(f"{result['mode']:>6} {result['import_seconds']:>9.2f} {result['first_predict_seconds']:>14.2f} "
+              f"{result['peak_rss_mb']:>12.0f} {result['forecast_ms_p50']:>12.2f} {str(result['tensorflow_imported']):>11}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
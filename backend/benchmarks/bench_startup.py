@@ -0,0 +1,100 @@
+"""Measure how quickly the Flask app starts, and fail when startup regresses.
+
+Every run imports the app in a fresh process and records the import time, the peak RSS,
+the time of a first cheap request (/metrics) and which heavy libraries got loaded. The
+script exits with status 1 when the median import time is above --max-seconds or when a
+library listed in --forbid was imported at startup, so it can guard startup in CI.
+
+Usage: python benchmarks/bench_startup.py [--runs N] [--max-seconds S] [--output FILE]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["tensorflow", "keras", "sklearn", "xgboost", "matplotlib", "yfinance", "pandas", "scipy", "joblib"]
+
+
+def child():
+    """Import the app and time a first request in this (fresh) process."""
+    start = time.perf_counter()
+    from app import app
+    import_seconds = time.perf_counter() - start
+
+    client = app.test_client()
+    start = time.perf_counter()
+    client.get("/metrics")
+    first_request_seconds = time.perf_counter() - start
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        "import_seconds": import_seconds,
+        "first_request_seconds": first_request_seconds,
+        "peak_rss_mb": peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024,
+        "loaded": [name for name in HEAVY_MODULES if name in sys.modules],
+    }))
+
+
+def run_child():
+    env = dict(os.environ, PRELOAD_ON_START="0")
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def median(values):
+    return sorted(values)[len(values) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=1.0, help="fail above this median import time")
+    parser.add_argument("--forbid", nargs="*", default=HEAVY_MODULES, help="fail when one of these is imported at startup")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.path.insert(0, BACKEND_DIR)
+        child()
+        return
+
+    runs = [run_child() for _ in range(args.runs)]
+    results = {
+        "runs": args.runs,
+        "import_seconds_p50": round(median([run["import_seconds"] for run in runs]), 3),
+        "import_seconds_max": round(max(run["import_seconds"] for run in runs), 3),
+        "first_request_ms_p50": round(median([run["first_request_seconds"] for run in runs]) * 1000, 1),
+        "peak_rss_mb_p50": round(median([run["peak_rss_mb"] for run in runs]), 1),
+        "loaded": sorted({name for run in runs for name in run["loaded"]}),
+    }
+
+    print(f"import p50 {results['import_seconds_p50']:.3f} s (max {results['import_seconds_max']:.3f} s), "
+          f"first request {results['first_request_ms_p50']:.1f} ms, peak RSS {results['peak_rss_mb_p50']:.0f} MB")
+    print("heavy libraries loaded at startup:", ", ".join(results["loaded"]) or "none")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    failures = []
+    if results["import_seconds_p50"] > args.max_seconds:
+        failures.append(f"import takes {results['import_seconds_p50']:.3f} s, above {args.max_seconds} s")
+    forbidden = [name for name in results["loaded"] if name in args.forbid]
+    if forbidden:
+        failures.append(f"imported at startup: {', '.join(forbidden)}")
+    for failure in failures:
+        print("FAIL:", failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
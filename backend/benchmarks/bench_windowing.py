@@ -0,0 +1,72 @@
+"""Compare the original Python-loop windowing with the sliding_window_view version.
+
+Usage: python benchmarks/bench_windowing.py [--repeat N]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import synthetic_ohlcv  # noqa: E402
+from windowing import sliding_windows, multi_step_targets  # noqa: E402
+
+SIZES = {"2y": 252 * 2, "10y": 252 * 10, "30y": 252 * 30}
+
+
+def loop_windows(scaled_data, forecast_days, window_size):
+    """The windowing loop prepare_data and train_and_forecast_lstm used before."""
+    X, y = [], []
+    for i in range(window_size, len(scaled_data) - forecast_days):
+        X.append(scaled_data[i - window_size:i, 0])
+        y.append(scaled_data[i + forecast_days - 1, 0])
+    X, y = np.array(X), np.array(y)
+    X = X.reshape((X.shape[0], X.shape[1], 1))
+    y = np.array([y[i:i + forecast_days] for i in range(len(y) - forecast_days + 1)])
+    return X, y
+
+
+def view_windows(scaled_data, forecast_days, window_size, dtype):
+    series = scaled_data[:, 0].astype(dtype, copy=False)
+    X, Y = sliding_windows(series, window_size, horizon=forecast_days)
+    n_samples = len(X) - 1
+    X = X[:n_samples, :, np.newaxis]
+    y = multi_step_targets(Y[:n_samples, -1], forecast_days)
+    return X, y
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--forecast-days", type=int, default=7)
+    parser.add_argument("--window-size", type=int, default=60)
+    args = parser.parse_args()
+
+    print(f"{'size':>5} {'bars':>6} {'loop ms':>10} {'view f64 ms':>12} {'view f32 ms':>12} {'speedup':>8}")
+    for name, n_days in SIZES.items():
+        close = synthetic_ohlcv(n_days)[["Close"]].to_numpy()
+        scaled = (close - close.min()) / (close.max() - close.min())
+
+        X_loop, y_loop = loop_windows(scaled, args.forecast_days, args.window_size)
+        X_view, y_view = view_windows(scaled, args.forecast_days, args.window_size, np.float64)
+        assert np.array_equal(X_loop, X_view) and np.array_equal(y_loop, y_view)
+
+        timings = {}
+        for label, func in [
+            ("loop", lambda: loop_windows(scaled, args.forecast_days, args.window_size)),
+            ("f64", lambda: view_windows(scaled, args.forecast_days, args.window_size, np.float64)),
+            ("f32", lambda: view_windows(scaled, args.forecast_days, args.window_size, np.float32)),
+        ]:
+            timings[label] = min(timeit.repeat(func, number=1, repeat=args.repeat)) * 1000
+
+        print(
+            f"{name:>5} {n_days:>6} {timings['loop']:>10.3f} {timings['f64']:>12.3f} "
+            f"{timings['f32']:>12.3f} {timings['loop'] / timings['f64']:>7.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+import numpy as np
+import pandas as pd
+
+
+def synthetic_ohlcv(n_days, seed=0, start="2000-01-03"):
+    """Deterministic random-walk OHLCV frame with n_days business-day bars."""
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range(start, periods=n_days, name="Date")
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.015, n_days)))
+    open_ = close * (1 + rng.normal(0, 0.005, n_days))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.005, n_days)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.005, n_days)))
+    volume = rng.integers(1_000_000, 5_000_000, n_days).astype(float)
+    return pd.DataFrame(
+        {"Open": open_, "High": high, "Low": low, "Close": close, "Volume": volume},
+        index=index,
+    )
@@ -0,0 +1,183 @@
+import hashlib
+import io
+import json
+import os
+
+import numpy as np
+
+from metrics import record_cache
+from timing import stage
+from utils import ensure_directory_exists, write_atomic
+
+
+def to_list(values, decimals=4):
+    """Round an array-like and return it as a plain list (for compact JSON)."""
+    return np.round(np.asarray(values, dtype=np.float64).ravel(), decimals).tolist()
+
+
+def date_list(dates):
+    """Format a sequence of dates as YYYY-MM-DD strings."""
+    return [str(date)[:10] for date in dates]
+
+
+def line(label, values, color, linestyle="-", linewidth=None, decimals=4):
+    """One plotted line of a line chart."""
+    spec = {"label": label, "values": to_list(values, decimals), "color": color, "linestyle": linestyle}
+    if linewidth is not None:
+        spec["linewidth"] = linewidth
+    return spec
+
+
+def line_chart(title, x, lines, xlabel="Date", ylabel="Stock Price", figsize=(10, 6), dates=True):
+    """Chart spec for one or more lines sharing the same x values."""
+    return {
+        "type": "line",
+        "title": title,
+        "xlabel": xlabel,
+        "ylabel": ylabel,
+        "x": date_list(x) if dates else list(x),
+        "lines": lines,
+        "figsize": list(figsize),
+    }
+
+
+def histogram_chart(title, values, bins=20, color="darkorchid", xlabel="Residual Value", ylabel="Frequency"):
+    """Chart spec for a histogram, with the bins already counted."""
+    counts, edges = np.histogram(np.asarray(values, dtype=np.float64).ravel(), bins=bins)
+    return {
+        "type": "histogram",
+        "title": title,
+        "xlabel": xlabel,
+        "ylabel": ylabel,
+        "edges": to_list(edges),
+        "counts": counts.tolist(),
+        "color": color,
+        "figsize": [10, 6],
+    }
+
+
+def render_chart(spec):
+    """Render a chart spec to PNG bytes with matplotlib.
+
+    Each call draws on its own Figure (no pyplot state), so threads render concurrently.
+    """
+    from matplotlib.figure import Figure
+    import pandas as pd
+
+    with stage("graph_render"):
+        fig = Figure(figsize=tuple(spec["figsize"]))
+        ax = fig.add_subplot()
+        if spec["type"] == "histogram":
+            edges = np.asarray(spec["edges"])
+            ax.hist(edges[:-1], bins=edges, weights=spec["counts"], color=spec["color"], edgecolor="black")
+        else:
+            x = pd.to_datetime(spec["x"]) if spec["xlabel"] == "Date" else spec["x"]
+            for series in spec["lines"]:
+                ax.plot(
+                    x, series["values"], label=series["label"], color=series["color"],
+                    linestyle=series["linestyle"], linewidth=series.get("linewidth"),
+                )
+            ax.legend()
+            if spec["xlabel"] == "Date":
+                ax.tick_params(axis="x", labelrotation=45)
+        ax.set_title(spec["title"])
+        ax.set_xlabel(spec["xlabel"])
+        ax.set_ylabel(spec["ylabel"])
+        fig.tight_layout()
+
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format="png")
+    return buffer.getvalue()
+
+
+def spec_digest(spec):
+    """Short content hash of a chart spec; identical data always gets the same digest."""
+    payload = json.dumps(spec, sort_keys=True, separators=(",", ":")).encode()
+    return hashlib.sha256(payload).hexdigest()[:16]
+
+
+def split_graph_name(graph_name):
+    """Split "<name>-<digest>.png" into (name, digest); digest is None for other names."""
+    stem, _ = os.path.splitext(os.path.basename(graph_name))
+    name, _, digest = stem.rpartition("-")
+    if not name or len(digest) != 16 or any(c not in "0123456789abcdef" for c in digest):
+        return stem, None
+    return name, digest
+
+
+def save_series(series, graphs_dir, max_bytes=None):
+    """Store each chart spec as <name>-<digest>.json so its PNG can be rendered on request.
+
+    Files are never overwritten: a spec with different data gets a different name, so
+    concurrent requests (and workers) cannot clobber each other's graphs. Returns
+    {name: "<name>-<digest>.png"}, the file names the graphs are served under.
+    """
+    ensure_directory_exists(graphs_dir)
+    names = {}
+    for name, spec in series.items():
+        stem = f"{name}-{spec_digest(spec)}"
+        path = os.path.join(graphs_dir, f"{stem}.json")
+        if os.path.exists(path):
+            os.utime(path)  # Mark as recently used for prune_graphs
+        else:
+            def write(tmp_path):
+                with open(tmp_path, "w") as f:
+                    json.dump(spec, f)
+
+            write_atomic(path, write)
+        names[name] = f"{stem}.png"
+
+    if max_bytes is not None:
+        prune_graphs(graphs_dir, max_bytes)
+    return names
+
+
+def render_graph_file(graph_name, graphs_dir):
+    """Return the path of <name>-<digest>.png, rendering it from its .json the first time.
+
+    Returns None when there is no chart of that name.
+    """
+    name, digest = split_graph_name(graph_name)
+    if digest is None:
+        return None
+    stem = f"{name}-{digest}"
+    spec_path = os.path.join(graphs_dir, f"{stem}.json")
+    png_path = os.path.join(graphs_dir, f"{stem}.png")
+
+    if os.path.exists(png_path):
+        os.utime(png_path)  # Mark as recently used for prune_graphs
+        record_cache("graph_png", hit=True)
+        return png_path
+    if not os.path.exists(spec_path):
+        return None
+    record_cache("graph_png", hit=False)
+
+    with open(spec_path) as f:
+        spec = json.load(f)
+    png = render_chart(spec)
+
+    def write(tmp_path):
+        with open(tmp_path, "wb") as f:
+            f.write(png)
+
+    write_atomic(png_path, write)
+    return png_path
+
+
+def prune_graphs(graphs_dir, max_bytes):
+    """Delete the least recently used graph files until graphs_dir holds at most max_bytes."""
+    entries = []
+    for entry in os.scandir(graphs_dir):
+        if entry.is_file() and entry.name.endswith((".json", ".png")):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass  # Already removed by another worker
+        total -= size
@@ -0,0 +1,173 @@
+import os
+
+# Directory where trained models, scalers and metadata are persisted
+MODEL_DIR = os.environ.get("MODEL_DIR", "models")
+
+# How long (in seconds) a stored model is considered fresh before it is retrained
+MODEL_TTL_SECONDS = int(os.environ.get("MODEL_TTL_SECONDS", 24 * 60 * 60))
+
+# Maximum number of loaded models kept in memory (least recently used are evicted)
+MODEL_CACHE_SIZE = int(os.environ.get("MODEL_CACHE_SIZE", 32))
+
+# Stored models kept per symbol, model kind and horizon (one per last-bar date, newest first);
+# older ones are deleted when a model is stored. 0 keeps every one
+MODEL_KEEP_VERSIONS = int(os.environ.get("MODEL_KEEP_VERSIONS", 2))
+
+# How the hybrid weights its models: "inverse_error" (1 / validation MSE), "stacked"
+# (non-negative least squares on the validation predictions) or "equal"
+ENSEMBLE_WEIGHTING = os.environ.get("ENSEMBLE_WEIGHTING", "inverse_error")
+
+# Models whose stored weight for a symbol is below this are not trained or run for it (0 keeps all)
+ENSEMBLE_DROP_WEIGHT = float(os.environ.get("ENSEMBLE_DROP_WEIGHT", 0))
+
+# How long (in seconds) stored weights are used to drop models; afterwards every model runs again
+ENSEMBLE_WEIGHTS_TTL_SECONDS = int(os.environ.get("ENSEMBLE_WEIGHTS_TTL_SECONDS", 7 * 24 * 60 * 60))
+
+# Directory holding graph data (<name>.json) and PNGs rendered from it on request
+GRAPHS_DIR = os.environ.get("GRAPHS_DIR", "graphs")
+
+# Size limit (in bytes) of GRAPHS_DIR; the least recently used graphs are deleted beyond it
+GRAPHS_MAX_BYTES = int(os.environ.get("GRAPHS_MAX_BYTES", 200 * 1024 * 1024))
+
+# How long (in seconds) browsers and CDNs may cache a graph image
+GRAPH_CACHE_SECONDS = int(os.environ.get("GRAPH_CACHE_SECONDS", 365 * 24 * 60 * 60))
+
+# Level of the backend's log messages (DEBUG also logs the prepared data on every prediction)
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+
+# "full" trains models as needed; "lite" only serves models already in MODEL_DIR, running the
+# LSTM from its exported weights in NumPy so TensorFlow is never imported
+SERVING_MODE = os.environ.get("SERVING_MODE", "full")
+
+# Import the prediction stack in the background as soon as the app starts, instead of on the
+# first /predict request
+PRELOAD_ON_START = os.environ.get("PRELOAD_ON_START", "0") == "1"
+
+# "symbol" trains a model per symbol; "global" serves direct forecasts from the models that
+# global_model.py trains on the pooled windows of a universe (requests only run inference)
+MODEL_SCOPE = os.environ.get("MODEL_SCOPE", "symbol")
+
+# How long (in seconds) a global model is served after it was trained
+GLOBAL_MODEL_TTL_SECONDS = int(os.environ.get("GLOBAL_MODEL_TTL_SECONDS", 7 * 24 * 60 * 60))
+
+# Inputs of the models in direct mode: "close" (the scaled close only) or "technical" (the
+# scaled close plus returns, moving averages, volatility, RSI, MACD and volume indicators)
+FEATURE_SET = os.environ.get("FEATURE_SET", "close")
+
+# How the p10/p50/p90 bands of the hybrid forecast are computed: "bootstrap" (paths simulated
+# from the hybrid's test residuals) or "quantile" (a quantile-loss XGBoost model per symbol,
+# direct mode only; bootstrap otherwise)
+INTERVAL_METHOD = os.environ.get("INTERVAL_METHOD", "bootstrap")
+
+# Number of paths simulated for the bootstrap bands
+INTERVAL_PATHS = int(os.environ.get("INTERVAL_PATHS", 5000))
+
+# Length of the input window fed to both models
+WINDOW_SIZE = int(os.environ.get("WINDOW_SIZE", 60))
+
+# Directory of the local OHLCV store (one Parquet file per symbol)
+DATA_DIR = os.environ.get("DATA_DIR", "data")
+
+# Optional directory of <SYMBOL>.csv / <SYMBOL>.parquet files used instead of Yahoo Finance
+DATA_SOURCE_DIR = os.environ.get("DATA_SOURCE_DIR")
+
+# Minimum time (in seconds) between two refreshes of the same symbol from the data source
+DATA_REFRESH_SECONDS = int(os.environ.get("DATA_REFRESH_SECONDS", 15 * 60))
+
+# How long (in seconds) company information from the data source is reused
+INFO_TTL_SECONDS = int(os.environ.get("INFO_TTL_SECONDS", 6 * 60 * 60))
+
+# "direct" predicts every horizon in one batched call; "recursive" feeds each
+# prediction back in as the next input, one model call per day
+FORECAST_MODE = os.environ.get("FORECAST_MODE", "direct")
+
+# Number of worker processes running queued /jobs predictions
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+
+# Maximum number of queued or running jobs before POST /jobs is rejected with 429
+JOB_QUEUE_SIZE = int(os.environ.get("JOB_QUEUE_SIZE", 16))
+
+# Retry-After value (in seconds) sent back when the job queue is full
+JOB_RETRY_AFTER_SECONDS = int(os.environ.get("JOB_RETRY_AFTER_SECONDS", 30))
+
+# Optional SQLite file for job records (kept in memory when unset)
+JOB_DB_PATH = os.environ.get("JOB_DB_PATH")
+
+# How long (in seconds) finished jobs are kept before they are removed
+JOB_RESULT_TTL_SECONDS = int(os.environ.get("JOB_RESULT_TTL_SECONDS", 60 * 60))
+
+# When a symbol gets new bars, update its previous model instead of training from scratch
+INCREMENTAL_UPDATES = os.environ.get("INCREMENTAL_UPDATES", "1") == "1"
+
+# Full retrain after this many incremental updates in a row
+MAX_INCREMENTS = int(os.environ.get("MAX_INCREMENTS", 5))
+
+# Full retrain when an update's validation loss is this much (0.25 = 25%) above the last full retrain's
+RETRAIN_DRIFT_TOLERANCE = float(os.environ.get("RETRAIN_DRIFT_TOLERANCE", 0.25))
+
+# Only models at most this old (in seconds) are updated; older ones are retrained
+INCREMENTAL_MAX_AGE_SECONDS = int(os.environ.get("INCREMENTAL_MAX_AGE_SECONDS", 7 * 24 * 60 * 60))
+
+# LSTM epochs and extra XGBoost trees per update, and how many already seen windows are
+# replayed along with the new ones
+INCREMENTAL_EPOCHS = int(os.environ.get("INCREMENTAL_EPOCHS", 3))
+INCREMENTAL_XGB_TREES = int(os.environ.get("INCREMENTAL_XGB_TREES", 25))
+INCREMENTAL_REPLAY_SAMPLES = int(os.environ.get("INCREMENTAL_REPLAY_SAMPLES", 32))
+
+# Training stops once the validation loss has not improved for this many LSTM epochs or
+# XGBoost trees (0 always trains the full 20 epochs / all trees)
+EARLY_STOPPING_PATIENCE = int(os.environ.get("EARLY_STOPPING_PATIENCE", 5))
+XGB_EARLY_STOPPING_ROUNDS = int(os.environ.get("XGB_EARLY_STOPPING_ROUNDS", 25))
+
+# How long (in seconds) the hyperparameters tuning.py found for a symbol are used for training
+TUNED_PARAMS_TTL_SECONDS = int(os.environ.get("TUNED_PARAMS_TTL_SECONDS", 30 * 24 * 60 * 60))
+
+# Run the LSTM and XGBoost branches of a prediction concurrently
+PARALLEL_BRANCHES = os.environ.get("PARALLEL_BRANCHES", "1") == "1"
+
+# Worker processes and request threads per worker of the production server (gunicorn.conf.py)
+WEB_WORKERS = int(os.environ.get("WEB_WORKERS", 1))
+WEB_THREADS = int(os.environ.get("WEB_THREADS", 4))
+
+# Seconds a request may take before its worker is restarted (a first prediction trains both
+# models), and seconds in-flight requests get to finish on shutdown
+WEB_TIMEOUT_SECONDS = int(os.environ.get("WEB_TIMEOUT_SECONDS", 300))
+WEB_GRACEFUL_TIMEOUT_SECONDS = int(os.environ.get("WEB_GRACEFUL_TIMEOUT_SECONDS", 60))
+
+# Number of most recently trained models each server worker loads into memory on start
+PRELOAD_MODELS = int(os.environ.get("PRELOAD_MODELS", 0))
+
+# Threads used by TensorFlow and XGBoost (0 lets the library decide). The cores are split
+# between the server workers, and when the branches run concurrently each library gets
+# half of a worker's cores so they don't oversubscribe them.
+_WORKER_CORES = max(1, (os.cpu_count() or 1) // WEB_WORKERS)
+_BRANCH_THREADS = max(1, _WORKER_CORES // 2) if PARALLEL_BRANCHES else (_WORKER_CORES if WEB_WORKERS > 1 else 0)
+TF_INTRA_OP_THREADS = int(os.environ.get("TF_INTRA_OP_THREADS", _BRANCH_THREADS))
+TF_INTER_OP_THREADS = int(os.environ.get("TF_INTER_OP_THREADS", 1 if PARALLEL_BRANCHES else 0))
+XGB_N_JOBS = int(os.environ.get("XGB_N_JOBS", _BRANCH_THREADS))
+
+# Number of /predict responses kept in memory, and an optional directory to also keep them on disk
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", 128))
+RESULT_CACHE_DIR = os.environ.get("RESULT_CACHE_DIR")
+
+# How often (in seconds) /predict/stream?subscribe=1 checks a symbol for a new bar; the price
+# store still contacts the data source at most once per DATA_REFRESH_SECONDS
+SUBSCRIBE_POLL_SECONDS = int(os.environ.get("SUBSCRIBE_POLL_SECONDS", 60))
+# Each subscription holds one of a worker's WEB_THREADS request threads: at most MAX_SUBSCRIPTIONS
+# are open per worker (more get 503), and each is closed after SUBSCRIBE_MAX_SECONDS (clients reconnect)
+MAX_SUBSCRIPTIONS = int(os.environ.get("MAX_SUBSCRIPTIONS", max(1, WEB_THREADS // 2)))
+SUBSCRIBE_MAX_SECONDS = int(os.environ.get("SUBSCRIBE_MAX_SECONDS", 60 * 60))
+
+# Where precomputed /predict responses are stored and how long (in seconds) /predict serves them
+PRECOMPUTED_DIR = os.environ.get("PRECOMPUTED_DIR", "precomputed")
+PRECOMPUTED_TTL_SECONDS = int(os.environ.get("PRECOMPUTED_TTL_SECONDS", 24 * 60 * 60))
+
+# Defaults of the pre-training scheduler (scheduler.py): symbol universe file, forecast
+# lengths to precompute and worker processes
+UNIVERSE_FILE = os.environ.get("UNIVERSE_FILE", "universe.txt")
+PRETRAIN_FORECAST_DAYS = [int(days) for days in os.environ.get("PRETRAIN_FORECAST_DAYS", "7,14,30").split(",")]
+PRETRAIN_WORKERS = int(os.environ.get("PRETRAIN_WORKERS", os.cpu_count() or 1))
+
+# Worker processes used by /predict/batch and the largest watchlist it accepts
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", 2))
+MAX_BATCH_SYMBOLS = int(os.environ.get("MAX_BATCH_SYMBOLS", 50))
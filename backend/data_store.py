@@ -0,0 +1,257 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+import pandas as pd
+
+from config import DATA_DIR, DATA_SOURCE_DIR, DATA_REFRESH_SECONDS, INFO_TTL_SECONDS
+from metrics import record_cache
+from utils import ensure_directory_exists, write_atomic
+
+OHLCV_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+
+def empty_ohlcv():
+    """Return an empty OHLCV frame with a DatetimeIndex."""
+    return pd.DataFrame(columns=OHLCV_COLUMNS, index=pd.DatetimeIndex([], name="Date"), dtype=float)
+
+
+def normalize_ohlcv(df):
+    """Flatten yfinance's (field, ticker) columns and keep only the OHLCV fields."""
+    df = df.copy()
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = df.columns.get_level_values(0)
+    df = df[[col for col in OHLCV_COLUMNS if col in df.columns]]
+    df.index = pd.to_datetime(df.index).tz_localize(None)
+    df.index.name = "Date"
+    return df.sort_index()
+
+
+class YahooFinanceSource:
+    """Fetch bars and company information from Yahoo Finance."""
+
+    def fetch(self, symbol, start_date, end_date):
+        import yfinance as yf
+
+        df = yf.download(symbol, start=start_date, end=end_date, progress=False)
+        return normalize_ohlcv(df)
+
+    def fetch_many(self, symbols, start_date, end_date):
+        """Download several symbols in one request; returns {symbol: DataFrame}."""
+        import yfinance as yf
+
+        df = yf.download(symbols, start=start_date, end=end_date, progress=False, group_by="ticker")
+        frames = {}
+        for symbol in symbols:
+            if isinstance(df.columns, pd.MultiIndex) and symbol in df.columns.get_level_values(0):
+                frames[symbol] = normalize_ohlcv(df[symbol]).dropna(how="all")
+            else:
+                frames[symbol] = empty_ohlcv()
+        return frames
+
+    def info(self, symbol):
+        import yfinance as yf
+
+        return yf.Ticker(symbol).info
+
+
+class LocalFileSource:
+    """Read bars from <SYMBOL>.parquet or <SYMBOL>.csv files in a directory (no network).
+
+    Company information is read from an optional <SYMBOL>.info.json file.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def fetch(self, symbol, start_date, end_date):
+        parquet_path = os.path.join(self.directory, f"{symbol}.parquet")
+        csv_path = os.path.join(self.directory, f"{symbol}.csv")
+        if os.path.exists(parquet_path):
+            df = pd.read_parquet(parquet_path)
+        elif os.path.exists(csv_path):
+            df = pd.read_csv(csv_path, index_col=0, parse_dates=True)
+        else:
+            return empty_ohlcv()
+
+        df = normalize_ohlcv(df)
+        return df[(df.index >= pd.Timestamp(start_date)) & (df.index < pd.Timestamp(end_date))]
+
+    def fetch_many(self, symbols, start_date, end_date):
+        return {symbol: self.fetch(symbol, start_date, end_date) for symbol in symbols}
+
+    def info(self, symbol):
+        info_path = os.path.join(self.directory, f"{symbol}.info.json")
+        if not os.path.exists(info_path):
+            return {"symbol": symbol}
+        with open(info_path) as f:
+            return json.load(f)
+
+
+class OHLCVStore:
+    """Local per-symbol Parquet store in front of a data source.
+
+    Bars already on disk are served without touching the source; only the days after
+    the last stored bar (or before the first one) are fetched and appended.
+    """
+
+    def __init__(self, root=DATA_DIR, source=None, refresh_seconds=DATA_REFRESH_SECONDS, info_ttl_seconds=INFO_TTL_SECONDS):
+        self.root = root
+        self.source = source or (LocalFileSource(DATA_SOURCE_DIR) if DATA_SOURCE_DIR else YahooFinanceSource())
+        self.refresh_seconds = refresh_seconds
+        self.info_ttl_seconds = info_ttl_seconds
+        self._info_cache = {}
+        self._locks = defaultdict(threading.Lock)
+        self._info_locks = defaultdict(threading.Lock)
+
+    def _path(self, symbol, suffix):
+        return os.path.join(self.root, f"{symbol}{suffix}")
+
+    def _read_json(self, path):
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def _write_json(self, path, data):
+        def write(tmp_path):
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+
+        ensure_directory_exists(self.root)
+        write_atomic(path, write)
+
+    def read_cached(self, symbol):
+        """Return every stored bar for symbol without contacting the source."""
+        path = self._path(symbol.upper(), ".parquet")
+        if not os.path.exists(path):
+            return empty_ohlcv()
+        return pd.read_parquet(path)
+
+    def _plan(self, symbol, start, end):
+        """Work out which date ranges are missing locally for symbol.
+
+        Returns (state, ranges) where ranges is a list of (fetch_start, fetch_end) and
+        state carries what _merge needs to store the fetched bars afterwards.
+        """
+        meta = self._read_json(self._path(symbol, ".meta.json")) or {}
+        cached = self.read_cached(symbol)
+
+        covered_from = pd.Timestamp(meta["covered_from"]) if meta.get("covered_from") else None
+        covered_to = pd.Timestamp(meta["covered_to"]) if meta.get("covered_to") else None
+        recently_checked = time.time() - meta.get("checked_at", 0) < self.refresh_seconds
+
+        ranges = []
+        if covered_from is None or start < covered_from:
+            # Missing history at the start: fetch everything up to the first stored bar
+            fetch_end = covered_from if covered_from is not None else end
+            ranges.append((start, fetch_end))
+            covered_from = start
+            covered_to = max(covered_to or fetch_end, fetch_end)
+        if covered_to < end and not recently_checked:
+            # Only request the days after the last stored bar
+            fetch_start = cached.index[-1] + pd.Timedelta(days=1) if not cached.empty else covered_to
+            ranges.append((fetch_start, end))
+            covered_to = end
+            meta["checked_at"] = time.time()
+
+        state = {"meta": meta, "cached": cached, "covered_from": covered_from, "covered_to": covered_to}
+        return state, ranges
+
+    def _merge(self, symbol, state, fetched):
+        """Append the fetched frames to the stored bars and return the merged frame."""
+        cached, meta = state["cached"], state["meta"]
+        fetched = [piece for piece in fetched if not piece.empty]
+        if fetched:
+            df = pd.concat([piece for piece in [cached, *fetched] if not piece.empty])
+            df = df[~df.index.duplicated(keep="last")].sort_index()
+            ensure_directory_exists(self.root)
+            write_atomic(self._path(symbol, ".parquet"), df.to_parquet)
+            cached = df
+
+        # Never record coverage for a symbol we hold no bars for, so a failed or
+        # empty first download is retried in full on the next request
+        if not cached.empty:
+            meta["covered_from"] = str(state["covered_from"])
+            meta["covered_to"] = str(state["covered_to"])
+            meta.setdefault("checked_at", time.time())
+            self._write_json(self._path(symbol, ".meta.json"), meta)
+        return cached
+
+    def load(self, symbol, start_date, end_date):
+        """Return bars in [start_date, end_date), fetching only what is missing locally."""
+        symbol = symbol.upper()
+        start = pd.Timestamp(start_date)
+        end = pd.Timestamp(end_date)
+
+        with self._locks[symbol]:
+            state, ranges = self._plan(symbol, start, end)
+            record_cache("ohlcv", hit=not ranges)
+            fetched = [self.source.fetch(symbol, fetch_start, fetch_end) for fetch_start, fetch_end in ranges]
+            cached = self._merge(symbol, state, fetched)
+
+        return cached[(cached.index >= start) & (cached.index < end)]
+
+    def load_many(self, symbols, start_date, end_date):
+        """Like load for several symbols, with all missing bars fetched in a single source call.
+
+        Returns {symbol: DataFrame}.
+        """
+        symbols = sorted({symbol.upper() for symbol in symbols})
+        start = pd.Timestamp(start_date)
+        end = pd.Timestamp(end_date)
+
+        # Lock in sorted order so concurrent batches cannot deadlock
+        locks = [self._locks[symbol] for symbol in symbols]
+        for lock in locks:
+            lock.acquire()
+        try:
+            plans = {symbol: self._plan(symbol, start, end) for symbol in symbols}
+            missing = {symbol: ranges for symbol, (_, ranges) in plans.items() if ranges}
+            for symbol in symbols:
+                record_cache("ohlcv", hit=symbol not in missing)
+
+            fetched = {}
+            if missing:
+                # One request spanning every missing range; overlapping bars are de-duplicated on merge
+                fetch_start = min(range_start for ranges in missing.values() for range_start, _ in ranges)
+                fetch_end = max(range_end for ranges in missing.values() for _, range_end in ranges)
+                fetched = self.source.fetch_many(list(missing), fetch_start, fetch_end)
+
+            frames = {}
+            for symbol, (state, _) in plans.items():
+                cached = self._merge(symbol, state, [fetched[symbol]] if symbol in fetched else [])
+                frames[symbol] = cached[(cached.index >= start) & (cached.index < end)]
+        finally:
+            for lock in locks:
+                lock.release()
+        return frames
+
+    def get_info(self, symbol):
+        """Return company information for symbol, reusing it for info_ttl_seconds.
+
+        Concurrent requests for the same symbol wait for a single fetch from the source.
+        """
+        symbol = symbol.upper()
+        with self._info_locks[symbol]:
+            return self._get_info(symbol)
+
+    def _get_info(self, symbol):
+        cached = self._info_cache.get(symbol)
+        if cached is None:
+            cached = self._read_json(self._path(symbol, ".info.json"))
+        if cached is not None and time.time() - cached["fetched_at"] < self.info_ttl_seconds:
+            self._info_cache[symbol] = cached
+            record_cache("company_info", hit=True)
+            return cached["info"]
+
+        record_cache("company_info", hit=False)
+        cached = {"fetched_at": time.time(), "info": self.source.info(symbol)}
+        self._info_cache[symbol] = cached
+        self._write_json(self._path(symbol, ".info.json"), cached)
+        return cached["info"]
+
+
+ohlcv_store = OHLCVStore()
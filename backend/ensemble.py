@@ -0,0 +1,83 @@
+import os
+
+import numpy as np
+
+from config import MODEL_DIR, ENSEMBLE_WEIGHTING, ENSEMBLE_DROP_WEIGHT, ENSEMBLE_WEIGHTS_TTL_SECONDS
+from json_store import JsonStore
+
+
+def mean_squared_errors(predictions, actual):
+    """{model: MSE of its predictions of actual}."""
+    return {name: float(np.mean((np.asarray(values) - actual) ** 2)) for name, values in predictions.items()}
+
+
+def inverse_error_weights(predictions, actual):
+    """Weights proportional to 1 / MSE of each model's predictions of actual."""
+    errors = mean_squared_errors(predictions, actual)
+    inverse = {name: 1.0 / max(error, 1e-12) for name, error in errors.items()}
+    total = sum(inverse.values())
+    return {name: value / total for name, value in inverse.items()}
+
+
+def stacked_weights(predictions, actual):
+    """Non-negative least-squares fit of actual on the models' predictions, scaled to sum to 1."""
+    from scipy.optimize import nnls
+
+    names = list(predictions)
+    coefficients, _ = nnls(np.column_stack([predictions[name] for name in names]), np.asarray(actual, dtype=np.float64))
+    if coefficients.sum() <= 0:
+        return inverse_error_weights(predictions, actual)
+    return dict(zip(names, (coefficients / coefficients.sum()).tolist()))
+
+
+def fit_weights(predictions, actual, method=ENSEMBLE_WEIGHTING):
+    """Ensemble weights (summing to 1) from each model's predictions of actual on held-out data.
+
+    method is "inverse_error", "stacked" or "equal".
+    """
+    if method == "equal" or len(predictions) == 1:
+        return {name: 1.0 / len(predictions) for name in predictions}
+    if method == "stacked":
+        return stacked_weights(predictions, actual)
+    return inverse_error_weights(predictions, actual)
+
+
+def combine(values, weights):
+    """Weighted sum of the models' values ({model: array}, all of the same shape) in one NumPy call."""
+    names = list(weights)
+    return np.tensordot(
+        np.array([weights[name] for name in names]),
+        np.stack([np.asarray(values[name], dtype=np.float64) for name in names]),
+        axes=1,
+    )
+
+
+class EnsembleWeights(JsonStore):
+    """Fitted ensemble weights per (symbol, forecast_days, forecast_mode), one JSON file each next to the models.
+
+    get returns the stored {"weights", "errors", "fitted_at"} while they are fresh.
+    """
+
+    stamp_field = "fitted_at"
+
+    def __init__(self, root=os.path.join(MODEL_DIR, "ensemble"), ttl_seconds=ENSEMBLE_WEIGHTS_TTL_SECONDS):
+        super().__init__(root, ttl_seconds)
+
+    def save(self, symbol, forecast_days, forecast_mode, weights, errors):
+        """Store the weights and validation errors of symbol's models, written atomically."""
+        super().save(symbol, forecast_days, forecast_mode, {"weights": weights, "errors": errors})
+
+    def active_models(self, symbol, forecast_days, forecast_mode, models, drop_below=ENSEMBLE_DROP_WEIGHT):
+        """The models worth running for symbol: those whose fresh stored weight is at least drop_below.
+
+        Every model runs when there are no fresh weights, so dropped models are
+        re-evaluated once the stored weights expire.
+        """
+        stored = self.get(symbol, forecast_days, forecast_mode) if symbol and drop_below > 0 else None
+        if stored is None:
+            return list(models)
+        kept = [name for name in models if stored["weights"].get(name, 1.0) >= drop_below]
+        return kept or list(models)
+
+
+ensemble_weights = EnsembleWeights()
@@ -0,0 +1,174 @@
+import os
+import threading
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+import pandas as pd
+
+from config import DATA_DIR, FEATURE_SET
+from metrics import record_cache
+from timing import stage
+from utils import ensure_directory_exists, write_atomic
+
+# Indicators fed to the models next to the scaled close (FEATURE_SET=technical)
+FEATURE_COLUMNS = [
+    "return_1d", "return_5d", "sma_ratio_10", "sma_ratio_20", "volatility_10", "volatility_20",
+    "rsi_14", "macd", "macd_signal", "macd_hist", "range", "volume_z_20",
+]
+# Recursive state of the exponential averages, kept to continue them on new bars
+STATE_COLUMNS = ["Close", "ema_12", "ema_26", "macd_line_signal", "avg_gain_14", "avg_loss_14"]
+# Bars before the first new one needed to compute its rolling indicators
+LOOKBACK = 21
+
+
+def feature_set(forecast_mode):
+    """The feature set used for forecast_mode; recursive forecasts can only feed back the close."""
+    return FEATURE_SET if forecast_mode == "direct" else "close"
+
+
+def model_kind(model, forecast_mode):
+    """Registry kind of a model, e.g. "lstm-direct" or "lstm-direct-technical" (inputs differ per feature set)."""
+    features = feature_set(forecast_mode)
+    return f"{model}-{forecast_mode}" if features == "close" else f"{model}-{forecast_mode}-{features}"
+
+
+def _ewm(values, seed=None, **kwargs):
+    """Exponential moving average (adjust=False), continued from seed when one is given."""
+    if seed is None:
+        return values.ewm(adjust=False, **kwargs).mean()
+    seeded = pd.concat([pd.Series([seed]), values.reset_index(drop=True)], ignore_index=True)
+    return pd.Series(seeded.ewm(adjust=False, **kwargs).mean().to_numpy()[1:], index=values.index)
+
+
+def compute_features(bars, previous=None):
+    """Technical indicators of OHLCV bars, using only vectorized rolling/EWM operations.
+
+    With previous (the last row of an earlier result), bars must hold at least LOOKBACK
+    bars before the new ones; only the rows after previous.name are computed, with the
+    exponential averages continued from previous, so the rows match a full recompute.
+    """
+    close = bars["Close"].astype(np.float64)
+    returns = close.pct_change()
+    new = slice(None) if previous is None else bars.index > previous.name
+
+    delta = close.diff()[new]
+    ema_12 = _ewm(close[new], None if previous is None else previous["ema_12"], span=12)
+    ema_26 = _ewm(close[new], None if previous is None else previous["ema_26"], span=26)
+    macd_line = ema_12 - ema_26
+    macd_line_signal = _ewm(macd_line, None if previous is None else previous["macd_line_signal"], span=9)
+    avg_gain = _ewm(delta.clip(lower=0), None if previous is None else previous["avg_gain_14"], alpha=1 / 14)
+    avg_loss = _ewm(-delta.clip(upper=0), None if previous is None else previous["avg_loss_14"], alpha=1 / 14)
+
+    volume = bars["Volume"].astype(np.float64) if "Volume" in bars else pd.Series(np.nan, index=bars.index)
+    volume_std = volume.rolling(20).std().replace(0, np.nan)
+    high = bars["High"] if "High" in bars else close
+    low = bars["Low"] if "Low" in bars else close
+    close_new = close[new]
+
+    features = pd.DataFrame({
+        "return_1d": returns[new],
+        "return_5d": close.pct_change(5)[new],
+        "sma_ratio_10": (close / close.rolling(10).mean() - 1)[new],
+        "sma_ratio_20": (close / close.rolling(20).mean() - 1)[new],
+        "volatility_10": returns.rolling(10).std()[new],
+        "volatility_20": returns.rolling(20).std()[new],
+        # Only gains give avg_loss == 0 and an RSI of 100
+        "rsi_14": 100 - 100 / (1 + avg_gain / avg_loss),
+        # MACD relative to the price, so it is comparable across price levels
+        "macd": macd_line / close_new,
+        "macd_signal": macd_line_signal / close_new,
+        "macd_hist": (macd_line - macd_line_signal) / close_new,
+        "range": ((high - low) / close)[new],
+        "volume_z_20": ((volume - volume.rolling(20).mean()) / volume_std)[new],
+        "Close": close_new,
+        "ema_12": ema_12,
+        "ema_26": ema_26,
+        "macd_line_signal": macd_line_signal,
+        "avg_gain_14": avg_gain,
+        "avg_loss_14": avg_loss,
+    }, index=close_new.index)
+    return features
+
+
+class FeatureStore:
+    """Indicator frames per symbol, kept in memory and as Parquet next to the price history.
+
+    When a symbol gets new bars, only their rows are computed and appended. The frame
+    is recomputed from scratch when the bars no longer extend the stored ones (earlier
+    history requested, or revised prices).
+    """
+
+    def __init__(self, root=os.path.join(DATA_DIR, "features"), max_in_memory=256):
+        self.root = root
+        self.max_in_memory = max_in_memory
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._locks = defaultdict(threading.Lock)
+
+    def _path(self, symbol):
+        return os.path.join(self.root, f"{symbol}.parquet")
+
+    def _read(self, symbol):
+        with self._lock:
+            frame = self._memory.get(symbol)
+            if frame is not None:
+                self._memory.move_to_end(symbol)
+                return frame
+        path = self._path(symbol)
+        return pd.read_parquet(path) if os.path.exists(path) else None
+
+    def _write(self, symbol, frame):
+        ensure_directory_exists(self.root)
+        path = self._path(symbol)
+        write_atomic(path, frame.to_parquet)
+        with self._lock:
+            self._memory[symbol] = frame
+            self._memory.move_to_end(symbol)
+            while len(self._memory) > self.max_in_memory:
+                self._memory.popitem(last=False)
+
+    @staticmethod
+    def _extends(frame, bars):
+        """Whether bars start within frame and agree with it on the last stored bar."""
+        if frame is None or frame.empty or bars.index[0] < frame.index[0]:
+            return False
+        last = frame.index[-1]
+        return last in bars.index and np.isclose(bars.at[last, "Close"], frame.at[last, "Close"])
+
+    def get(self, symbol, bars):
+        """Return the indicator rows of bars' dates for symbol, computing only what is missing."""
+        symbol = symbol.upper()
+        with self._locks[symbol]:
+            frame = self._read(symbol)
+            hit = self._extends(frame, bars)
+            record_cache("features", hit)
+            if not hit:
+                frame = compute_features(bars)
+                self._write(symbol, frame)
+            elif bars.index[-1] > frame.index[-1]:
+                first_new = bars.index.searchsorted(frame.index[-1], side="right")
+                tail = bars.iloc[max(0, first_new - LOOKBACK):]
+                frame = pd.concat([frame, compute_features(tail, previous=frame.iloc[-1])])
+                self._write(symbol, frame)
+        return frame.reindex(bars.index)
+
+
+feature_store = FeatureStore()
+
+
+def feature_matrix(df, symbol=None, dtype=np.float32, train_rows=None):
+    """(len(df), len(FEATURE_COLUMNS)) array of standardized indicators; undefined values are 0.
+
+    The standardization is fitted on the first train_rows bars (default: all of them), so
+    that the statistics of the test bars do not leak into the training inputs. The
+    indicators are cached per symbol when one is given.
+    """
+    from sklearn.preprocessing import StandardScaler
+
+    with stage("features"):
+        features = feature_store.get(symbol, df) if symbol else compute_features(df)
+        values = features[FEATURE_COLUMNS].to_numpy(dtype=np.float64, copy=True)
+        values[~np.isfinite(values)] = np.nan
+        # StandardScaler ignores NaNs when fitting; the warm-up rows become 0 (the mean)
+        values = np.nan_to_num(StandardScaler().fit(values[:train_rows]).transform(values))
+        return values.astype(dtype, copy=False)
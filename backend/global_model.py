@@ -0,0 +1,246 @@
+"""Train one LSTM and one XGBoost model on the pooled windows of a whole universe.
+
+Instead of a model per symbol, a global model learns from the windows of every symbol,
+each scaled with its own symbol's scaler. It is trained offline (e.g. nightly, from the
+backend directory so it shares the server's models and data):
+
+    python global_model.py --universe universe.txt --forecast-days 7 14 30
+
+With MODEL_SCOPE=global the server then serves direct forecasts from these models: a
+request only scales the symbol's history and runs inference, nothing is trained.
+
+The pooled windows are written to memory-mapped .npy files under DATA_DIR/windows
+(one symbol at a time) and streamed from there in batches, through tf.data for the
+LSTM and an XGBoost external-memory DMatrix for the booster, so the universe never has
+to fit in RAM. Each symbol's last 20% of windows are held out for validation, as in
+per-symbol training.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from config import DATA_DIR, WINDOW_SIZE, UNIVERSE_FILE, GLOBAL_MODEL_TTL_SECONDS
+from features import FEATURE_COLUMNS, feature_set, model_kind
+from preprocess import download_stock_data_many, prepare_data
+from registry import ModelRegistry, ModelNotAvailableError, model_registry
+from utils import write_atomic
+
+# Registry "symbol" of the global models; their kinds end in -global, so no ticker collides
+GLOBAL_SYMBOL = "UNIVERSE"
+MODELS = ["lstm", "xgboost"]
+
+
+def global_kind(model):
+    """Registry kind of a global model, e.g. "lstm-direct-global" (only direct forecasts are pooled)."""
+    return f"{model_kind(model, 'direct')}-global"
+
+
+def stored_global_model(model, forecast_days, load_model):
+    """Return the registry entry of the newest global model for forecast_days.
+
+    Raises ModelNotAvailableError when none was trained in the last GLOBAL_MODEL_TTL_SECONDS.
+    """
+    kind = global_kind(model)
+    tomorrow = datetime.today().date() + timedelta(days=1)
+    key, entry = model_registry.latest(
+        kind, GLOBAL_SYMBOL, forecast_days, WINDOW_SIZE, tomorrow, load_model, GLOBAL_MODEL_TTL_SECONDS
+    )
+    if entry is None:
+        raise ModelNotAvailableError(f"No global {kind} model for {forecast_days} days; train it with global_model.py")
+    return entry
+
+
+def build_dataset(frames, forecast_days, directory, features="close"):
+    """Write the direct-mode windows of every symbol in frames ({symbol: DataFrame}) under directory.
+
+    X.npy holds the (windows, WINDOW_SIZE, columns) inputs and y.npy the (windows,
+    forecast_days) targets, both float32; index.json records each symbol's rows and
+    train/validation split. Only one symbol's windows are in memory at a time.
+    """
+    counts = {symbol: len(df) - WINDOW_SIZE - forecast_days for symbol, df in frames.items()}
+    symbols = [symbol for symbol, count in counts.items() if count > 1]
+    total = sum(counts[symbol] for symbol in symbols)
+    columns = 1 if features == "close" else 1 + len(FEATURE_COLUMNS)
+
+    def write(tmp_dir):
+        X = np.lib.format.open_memmap(os.path.join(tmp_dir, "X.npy"), mode="w+", dtype=np.float32, shape=(total, WINDOW_SIZE, columns))
+        y = np.lib.format.open_memmap(os.path.join(tmp_dir, "y.npy"), mode="w+", dtype=np.float32, shape=(total, forecast_days))
+
+        index = []
+        offset = 0
+        for symbol in symbols:
+            # The same windows and per-symbol scaling as a direct-mode request for this symbol
+            X_symbol, y_symbol, *_ = prepare_data(
+                frames[symbol], forecast_days, window_size=WINDOW_SIZE, dtype=np.float32, multi_step=True,
+                features=features, symbol=symbol,
+            )
+            count = len(X_symbol)
+            X[offset:offset + count] = X_symbol
+            y[offset:offset + count] = y_symbol
+            index.append({"symbol": symbol, "offset": offset, "n_train": int(0.8 * count), "n_test": count - int(0.8 * count)})
+            offset += count
+        X.flush()
+        y.flush()
+        del X, y
+
+        with open(os.path.join(tmp_dir, "index.json"), "w") as f:
+            json.dump({"forecast_days": forecast_days, "window_size": WINDOW_SIZE, "features": features, "symbols": index}, f)
+
+    write_atomic(directory, write, directory=True)
+
+
+def load_dataset(directory):
+    """Open a dataset written by build_dataset: {"X", "y" (read-only memory maps), "train", "test" (row indices)}."""
+    with open(os.path.join(directory, "index.json")) as f:
+        index = json.load(f)
+    symbols = index["symbols"]
+    return {
+        "X": np.load(os.path.join(directory, "X.npy"), mmap_mode="r"),
+        "y": np.load(os.path.join(directory, "y.npy"), mmap_mode="r"),
+        "train": np.concatenate([np.arange(s["offset"], s["offset"] + s["n_train"]) for s in symbols]),
+        "test": np.concatenate([np.arange(s["offset"] + s["n_train"], s["offset"] + s["n_train"] + s["n_test"]) for s in symbols]),
+        "symbols": len(symbols),
+    }
+
+
+def batches(X, y, rows, batch_size, rng=None):
+    """Yield (X, y) batches of the given rows, read from the memory maps (in random order when rng is given)."""
+    if rng is not None:
+        rows = rng.permutation(rows)
+    for start in range(0, len(rows), batch_size):
+        batch = np.sort(rows[start:start + batch_size])  # Sorted rows are read front to back
+        yield X[batch], y[batch]
+
+
+def train_lstm(dataset, epochs, batch_size):
+    """Fit the LSTM on the dataset's training windows, streamed through tf.data; returns (model, history)."""
+    from model_lstm import build_lstm_model, tensorflow
+
+    tf = tensorflow()
+    X, y = dataset["X"], dataset["y"]
+    signature = (
+        tf.TensorSpec((None, *X.shape[1:]), tf.float32),
+        tf.TensorSpec((None, y.shape[1]), tf.float32),
+    )
+    def stream(rows, rng=None):
+        # The batch count tells Keras where an epoch ends
+        n_batches = -(-len(rows) // batch_size)
+        return tf.data.Dataset.from_generator(
+            lambda: batches(X, y, rows, batch_size, rng), output_signature=signature
+        ).apply(tf.data.experimental.assert_cardinality(n_batches)).prefetch(tf.data.AUTOTUNE)
+
+    # Reshuffled every epoch, when tf.data restarts the generator
+    train = stream(dataset["train"], np.random.default_rng(42))
+    model = build_lstm_model(X.shape[1:], y.shape[1])
+    history = model.fit(train, validation_data=stream(dataset["test"]), epochs=epochs, shuffle=False, verbose=2)
+    return model, {name: [float(v) for v in values] for name, values in history.history.items()}
+
+
+def train_xgboost(dataset, batch_size, cache_dir):
+    """Fit the booster on the dataset's training windows from external memory; returns (booster, validation MSE)."""
+    import xgboost
+    from model_xgboost import build_xgboost_model
+
+    X, y = dataset["X"], dataset["y"]
+
+    class Windows(xgboost.DataIter):
+        """Feeds the flattened windows of rows to XGBoost one batch at a time."""
+
+        def __init__(self, rows, name):
+            self.rows = rows
+            self._batches = None
+            super().__init__(cache_prefix=os.path.join(cache_dir, name))
+
+        def next(self, input_data):
+            if self._batches is None:
+                self._batches = batches(X, y, self.rows, batch_size)
+            batch = next(self._batches, None)
+            if batch is None:
+                return False
+            input_data(data=batch[0].reshape(len(batch[0]), -1), label=batch[1])
+            return True
+
+        def reset(self):
+            self._batches = None
+
+    # The per-symbol model's hyperparameters; the quantized pages are cached on disk
+    params = build_xgboost_model().get_xgb_params()
+    rounds = build_xgboost_model().n_estimators
+    train = xgboost.ExtMemQuantileDMatrix(Windows(dataset["train"], "train"))
+    test = xgboost.ExtMemQuantileDMatrix(Windows(dataset["test"], "test"), ref=train)
+    evals_result = {}
+    booster = xgboost.train(
+        params, train, num_boost_round=rounds, evals=[(test, "validation")], evals_result=evals_result, verbose_eval=50
+    )
+    return booster, evals_result["validation"]["rmse"][-1] ** 2
+
+
+def save_booster(booster, directory):
+    """Write a trained booster into a registry directory, where load_xgboost_model reads it back."""
+    booster.save_model(os.path.join(directory, "model.ubj"))
+
+
+def train(frames, forecast_days, models=MODELS, epochs=5, batch_size=256, dataset_root=os.path.join(DATA_DIR, "windows")):
+    """Build the pooled dataset for forecast_days and train the global models into the registry."""
+    from model_lstm import save_lstm_model
+
+    features = feature_set("direct")
+    end_date = max(df.index[-1] for df in frames.values())
+    directory = os.path.join(dataset_root, f"{features}_{forecast_days}d_w{WINDOW_SIZE}")
+    build_dataset(frames, forecast_days, directory, features)
+    dataset = load_dataset(directory)
+    print(f"{forecast_days}d: {len(dataset['train'])} training and {len(dataset['test'])} validation windows "
+          f"from {dataset['symbols']} symbols ({dataset['X'].nbytes / 2 ** 20:.0f} MB on disk)")
+
+    meta = {"symbols": dataset["symbols"], "n_train": len(dataset["train"]), "n_test": len(dataset["test"])}
+    # Global models have no scaler of their own: each symbol is scaled at serving time
+    if "lstm" in models:
+        model, history = train_lstm(dataset, epochs, batch_size)
+        key = ModelRegistry.make_key(global_kind("lstm"), GLOBAL_SYMBOL, forecast_days, WINDOW_SIZE, end_date)
+        model_registry.put(key, model, None, save_lstm_model, dict(meta, history=history, val_loss=history["val_loss"][-1]))
+        print("Stored", key)
+    if "xgboost" in models:
+        cache_dir = tempfile.mkdtemp(prefix="xgboost-pages-", dir=dataset_root)
+        try:
+            booster, val_loss = train_xgboost(dataset, batch_size * 16, cache_dir)
+        finally:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+        key = ModelRegistry.make_key(global_kind("xgboost"), GLOBAL_SYMBOL, forecast_days, WINDOW_SIZE, end_date)
+        model_registry.put(key, booster, None, save_booster, dict(meta, val_loss=val_loss))
+        print("Stored", key)
+
+
+def main():
+    from pipeline import history_range
+    from scheduler import read_universe
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("symbols", nargs="*", help="symbols to pool (default: the universe file)")
+    parser.add_argument("--universe", default=UNIVERSE_FILE, help="file with one symbol per line")
+    parser.add_argument("--forecast-days", type=int, nargs="+", default=[7])
+    parser.add_argument("--models", nargs="+", default=MODELS, choices=MODELS)
+    parser.add_argument("--epochs", type=int, default=5, help="LSTM training epochs over the pooled windows")
+    parser.add_argument("--batch-size", type=int, default=256, help="LSTM batch size (XGBoost reads 16 times larger batches)")
+    parser.add_argument("--dataset-dir", default=os.path.join(DATA_DIR, "windows"), help="where the pooled windows are written")
+    args = parser.parse_args()
+
+    symbols = [symbol.upper() for symbol in args.symbols] or read_universe(args.universe)
+    start_date, end_date = history_range()
+    frames = {symbol: df for symbol, df in download_stock_data_many(symbols, start_date, end_date).items() if not df.empty}
+    for symbol in sorted(set(symbols) - set(frames)):
+        print(f"{symbol} skipped: no data found")
+    if not frames:
+        sys.exit(1)
+
+    for forecast_days in args.forecast_days:
+        train(frames, forecast_days, args.models, args.epochs, args.batch_size, args.dataset_dir)
+
+
+if __name__ == "__main__":
+    main()
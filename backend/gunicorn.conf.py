@@ -0,0 +1,39 @@
+"""Production server settings: gunicorn with WEB_WORKERS prefork workers, from the backend directory:
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Each worker imports the app (and TensorFlow) after it is forked, loads the prediction
+stack and the PRELOAD_MODELS newest models before it takes requests, and runs its
+TensorFlow and XGBoost with its share of the cores (see config.py). On SIGTERM the
+workers stop accepting connections, finish their requests within
+WEB_GRACEFUL_TIMEOUT_SECONDS and then stop their job and batch worker processes.
+"""
+import os
+
+from config import WEB_WORKERS, WEB_THREADS, WEB_TIMEOUT_SECONDS, WEB_GRACEFUL_TIMEOUT_SECONDS
+
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+workers = WEB_WORKERS
+# Threads serve the requests that wait (on a model, the data source or a stream) while others compute.
+# A /predict/stream?subscribe=1 holds its thread while it is open, so at most MAX_SUBSCRIPTIONS
+# (half of WEB_THREADS by default) of them run at once per worker and the rest of the threads
+# stay free for other requests; raise WEB_THREADS along with MAX_SUBSCRIPTIONS for more subscribers
+worker_class = "gthread"
+threads = WEB_THREADS
+timeout = WEB_TIMEOUT_SECONDS
+graceful_timeout = WEB_GRACEFUL_TIMEOUT_SECONDS
+# Don't import the app before forking: TensorFlow's thread pools do not survive a fork
+preload_app = False
+accesslog = "-"
+
+
+def post_worker_init(worker):
+    from app import preload
+
+    preload()
+
+
+def worker_exit(server, worker):
+    from app import shutdown
+
+    shutdown()
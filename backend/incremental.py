@@ -0,0 +1,57 @@
+import logging
+
+import pandas as pd
+
+from config import (
+    WINDOW_SIZE, INCREMENTAL_UPDATES, MAX_INCREMENTS, RETRAIN_DRIFT_TOLERANCE,
+    INCREMENTAL_MAX_AGE_SECONDS, INCREMENTAL_REPLAY_SAMPLES,
+)
+from registry import model_registry
+
+logger = logging.getLogger(__name__)
+
+
+def previous_model(kind, symbol, forecast_days, end_date, load_model):
+    """Return the registry entry to update for data ending at end_date, or None when a full retrain is due.
+
+    That is the newest model of the same kind and setup trained on older data, unless it
+    was already updated MAX_INCREMENTS times or is older than INCREMENTAL_MAX_AGE_SECONDS.
+    """
+    if not INCREMENTAL_UPDATES:
+        return None
+    key, entry = model_registry.latest(
+        kind, symbol, forecast_days, WINDOW_SIZE, end_date, load_model, INCREMENTAL_MAX_AGE_SECONDS
+    )
+    if entry is None or "base_val_loss" not in entry["meta"]:
+        return None
+    if entry["meta"]["increments"] >= MAX_INCREMENTS:
+        logger.info("Full retrain after %d incremental updates of %s", MAX_INCREMENTS, key)
+        return None
+    return entry
+
+
+def first_new_sample(y_train_dates, meta):
+    """Index of the first training window to fine-tune on, or None if no window is new.
+
+    Covers the windows whose target is after the previous model's training data, plus
+    INCREMENTAL_REPLAY_SAMPLES of the most recent windows it has already seen.
+    """
+    n_new = int((pd.DatetimeIndex(y_train_dates) > pd.Timestamp(meta["train_end"])).sum())
+    if n_new == 0:
+        return None
+    return max(0, len(y_train_dates) - n_new - INCREMENTAL_REPLAY_SAMPLES)
+
+
+def has_drifted(meta, val_loss):
+    """True when val_loss is more than RETRAIN_DRIFT_TOLERANCE above the last full retrain's."""
+    return val_loss > meta["base_val_loss"] * (1 + RETRAIN_DRIFT_TOLERANCE)
+
+
+def full_train_meta(y_train_dates, val_loss):
+    """Registry metadata for a model trained from scratch."""
+    return {"increments": 0, "train_end": str(y_train_dates[-1]), "base_val_loss": val_loss, "val_loss": val_loss}
+
+
+def updated_meta(meta, y_train_dates, val_loss):
+    """Registry metadata for a model updated from one with metadata meta."""
+    return dict(meta, increments=meta["increments"] + 1, train_end=str(y_train_dates[-1]), val_loss=val_loss)
@@ -0,0 +1,135 @@
+import logging
+
+import numpy as np
+
+from config import INTERVAL_METHOD, INTERVAL_PATHS, MODEL_SCOPE, SERVING_MODE, WINDOW_SIZE, XGB_N_JOBS
+from features import model_kind
+from registry import ModelRegistry, ModelNotAvailableError, model_registry
+from timing import stage
+from windowing import validation_split
+
+# Quantiles of the prediction bands, returned as p10/p50/p90
+QUANTILES = (0.1, 0.5, 0.9)
+
+logger = logging.getLogger(__name__)
+
+
+def bands(dates, values):
+    """[{"date", "p10", "p50", "p90"}] from a (len(QUANTILES), len(dates)) array of prices."""
+    names = [f"p{round(q * 100)}" for q in QUANTILES]
+    return [
+        {"date": date, **dict(zip(names, column))}
+        # float64 first: rounded float32 values would reach the JSON as e.g. 94.62000274658203
+        for date, column in zip(dates, np.round(np.asarray(values, dtype=np.float64), 2).T.tolist())
+    ]
+
+
+def bootstrap_quantiles(forecast, actual, predicted, n_paths=INTERVAL_PATHS, seed=0):
+    """Quantiles per horizon of n_paths simulated around forecast, as a (len(QUANTILES), horizons) array.
+
+    The shocks are resampled from the log residuals of the hybrid's forecast_days-ahead
+    test predictions (actual vs predicted prices). Each path adds up one shock per day,
+    scaled so that the sum over the whole horizon has the residuals' spread, plus their
+    mean spread evenly over the days; the bands thus widen with the horizon. Every path
+    is drawn at once, in one (n_paths, horizons) batch.
+    """
+    forecast = np.asarray(forecast, dtype=np.float64)
+    horizons = len(forecast)
+    residuals = np.log(np.asarray(actual, dtype=np.float64) / np.maximum(np.asarray(predicted, dtype=np.float64), 1e-9))
+    drift = residuals.mean()
+    shocks = (residuals - drift) / np.sqrt(horizons)
+
+    # A fixed seed keeps the bands of a cached response reproducible
+    draws = shocks[np.random.default_rng(seed).integers(0, len(shocks), size=(n_paths, horizons))]
+    steps = np.arange(1, horizons + 1)
+    paths = forecast * np.exp(drift * steps / horizons + np.cumsum(draws, axis=1))
+    return np.quantile(paths, QUANTILES, axis=0)
+
+
+def stacked_horizons(X, forecast_days):
+    """Each flattened window once per horizon, with the horizon (1..forecast_days) as an extra last column.
+
+    The quantile loss only fits one target, so the horizons become rows of a single model.
+    """
+    flat = X.reshape(len(X), -1)
+    horizons = np.tile(np.arange(1, forecast_days + 1, dtype=flat.dtype), len(X))
+    return np.column_stack([np.repeat(flat, forecast_days, axis=0), horizons])
+
+
+def build_quantile_model():
+    """XGBoost model fitting the pinball loss of every quantile in QUANTILES at once."""
+    from xgboost import XGBRegressor
+
+    return XGBRegressor(
+        objective="reg:quantileerror",
+        quantile_alpha=np.array(QUANTILES),
+        n_estimators=300,
+        max_depth=4,
+        learning_rate=0.05,
+        subsample=0.8,
+        random_state=42,
+        n_jobs=XGB_N_JOBS or None,
+    )
+
+
+def get_or_train_quantile(symbol, end_date, forecast_days, prepared):
+    """Return the quantile model for symbol, loading it from the registry when a fresh one exists."""
+    from lite_models import stored_model
+    from model_xgboost import save_xgboost_model, load_xgboost_model, fit_xgboost
+
+    kind = f"{model_kind('xgboost', 'direct')}-quantile"
+    if SERVING_MODE == "lite":
+        return stored_model(kind, symbol, forecast_days, end_date, load_xgboost_model)["model"]
+
+    key = ModelRegistry.make_key(kind, symbol, forecast_days, WINDOW_SIZE, end_date)
+    entry = model_registry.get(key, load_xgboost_model)
+    if entry is not None:
+        return entry["model"]
+
+    X, y, _, scaler, _ = prepared
+    # The point models' training windows, with their last 20% held out for early stopping
+    fit_end = validation_split(int(0.8 * len(X)))
+    split = int(0.8 * len(X))
+    model = build_quantile_model()
+    with stage("quantile_fit"):
+        fit_xgboost(
+            model, stacked_horizons(X[:fit_end], forecast_days), y[:fit_end].ravel(),
+            stacked_horizons(X[fit_end:split], forecast_days), y[fit_end:split].ravel(),
+        )
+    model_registry.put(key, model, scaler, save_xgboost_model)
+    return model
+
+
+def quantile_quantiles(model, prepared, forecast):
+    """Quantiles per horizon around forecast (the hybrid's prices), as a (len(QUANTILES), horizons) array.
+
+    The quantile model predicts its own median; its quantiles are kept as ratios to that
+    median and applied to forecast, so the bands are centered on the forecast they
+    describe, as bootstrap_quantiles's are.
+    """
+    _, _, X_forecast, scaler, _ = prepared
+    forecast = np.asarray(forecast, dtype=np.float64)
+    scaled = model.predict(stacked_horizons(X_forecast, len(forecast)))  # (horizons, len(QUANTILES))
+    scaled = np.sort(scaled, axis=1)  # Separately fitted quantiles can cross
+    prices = scaler.inverse_transform(scaled.reshape(-1, 1).astype(np.float64)).reshape(scaled.shape).T
+    median = prices[QUANTILES.index(0.5)]
+    return forecast * prices / np.maximum(median, 1e-9)
+
+
+def prediction_intervals(forecast, actual, predicted, symbol, forecast_days, forecast_mode, df, prepared):
+    """(method, bands) of the hybrid forecast ([{"date", "value"}]).
+
+    With INTERVAL_METHOD=quantile and a direct per-symbol forecast, the bands come from a
+    quantile-loss XGBoost model; otherwise, or when that model is not available, from
+    bootstrap_quantiles on the hybrid's test residuals.
+    """
+    dates = [item["date"] for item in forecast]
+    values = [item["value"] for item in forecast]
+    with stage("intervals"):
+        if INTERVAL_METHOD == "quantile" and symbol and forecast_mode == "direct" and MODEL_SCOPE == "symbol":
+            try:
+                model = get_or_train_quantile(symbol, df.index[-1], forecast_days, prepared)
+                return "quantile", bands(dates, quantile_quantiles(model, prepared, values))
+            except ModelNotAvailableError as e:
+                logger.info("Falling back to bootstrap intervals: %s", e)
+        return "bootstrap", bands(dates, bootstrap_quantiles(values, actual, predicted))
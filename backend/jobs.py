@@ -0,0 +1,196 @@
+import json
+import multiprocessing
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from config import JOB_WORKERS, JOB_QUEUE_SIZE, JOB_DB_PATH, JOB_RESULT_TTL_SECONDS
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue already holds its maximum number of jobs."""
+
+
+def _run_job(symbol, forecast_days, forecast_mode):
+    """Run the prediction pipeline inside a worker process."""
+    from pipeline import run_cached_prediction
+
+    return run_cached_prediction(symbol, forecast_days, forecast_mode)
+
+
+class MemoryJobStore:
+    """Keep job records in a dict (lost on restart, private to one process)."""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, job_id, key):
+        now = time.time()
+        with self._lock:
+            self._jobs[job_id] = {
+                "job_id": job_id, "key": key, "status": "queued",
+                "result": None, "error": None, "created_at": now, "updated_at": now,
+            }
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields, updated_at=time.time())
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def prune(self, older_than):
+        """Remove finished jobs last updated before older_than."""
+        with self._lock:
+            for job_id in [job_id for job_id, job in self._jobs.items()
+                           if job["status"] in ("done", "failed") and job["updated_at"] < older_than]:
+                del self._jobs[job_id]
+
+
+class SQLiteJobStore:
+    """Keep job records in a local SQLite file, so they survive restarts and are shared between processes."""
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "job_id TEXT PRIMARY KEY, key TEXT, status TEXT, result TEXT, error TEXT, "
+                "created_at REAL, updated_at REAL)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def create(self, job_id, key):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, key, status, created_at, updated_at) VALUES (?, ?, 'queued', ?, ?)",
+                (job_id, key, now, now),
+            )
+
+    def update(self, job_id, **fields):
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def prune(self, older_than):
+        """Remove finished jobs last updated before older_than."""
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?", (older_than,)
+            )
+
+
+class JobQueue:
+    """Bounded queue of prediction jobs run on a local process pool.
+
+    Identical requests submitted while a job is still queued or running are merged
+    into that job instead of starting a new one.
+    """
+
+    def __init__(self, store, max_workers=JOB_WORKERS, max_pending=JOB_QUEUE_SIZE, result_ttl_seconds=JOB_RESULT_TTL_SECONDS):
+        self.store = store
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.result_ttl_seconds = result_ttl_seconds
+        self._executor = None
+        self._futures = {}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        if self._executor is None:
+            # Spawn fresh workers rather than forking a process that may already run TensorFlow threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def submit(self, symbol, forecast_days, forecast_mode):
+        """Queue a prediction (or join an identical one in flight) and return its job record."""
+        key = f"{symbol}:{forecast_days}:{forecast_mode}"
+        self.store.prune(time.time() - self.result_ttl_seconds)
+
+        with self._lock:
+            job_id = self._in_flight.get(key)
+            if job_id is not None:
+                return dict(self.get(job_id), merged=True)
+            if len(self._futures) >= self.max_pending:
+                raise QueueFullError("Too many predictions in progress, try again later")
+
+            job_id = uuid.uuid4().hex
+            self.store.create(job_id, key)
+            future = self._get_executor().submit(_run_job, symbol, forecast_days, forecast_mode)
+            self._futures[job_id] = future
+            self._in_flight[key] = job_id
+
+        future.add_done_callback(partial(self._finish, job_id, key))
+        return dict(self.get(job_id), merged=False)
+
+    def _finish(self, job_id, key, future):
+        with self._lock:
+            self._futures.pop(job_id, None)
+            if self._in_flight.get(key) == job_id:
+                del self._in_flight[key]
+
+        if future.cancelled():
+            self.store.update(job_id, status="failed", error="The server shut down before the job started")
+            return
+        error = future.exception()
+        if error is None:
+            self.store.update(job_id, status="done", result=future.result())
+            return
+
+        if isinstance(error, BrokenProcessPool):
+            # A worker died (e.g. out of memory); start a fresh pool for the next job
+            with self._lock:
+                self._executor = None
+        self.store.update(job_id, status="failed", error=str(error) or type(error).__name__)
+
+    def get(self, job_id):
+        """Return the public view of a job record, or None if it is unknown."""
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+
+        status = job["status"]
+        future = self._futures.get(job_id)
+        if status == "queued" and future is not None and future.running():
+            status = "running"
+        return {"job_id": job_id, "status": status, "result": job["result"], "error": job["error"]}
+
+    def shutdown(self, wait=True):
+        """Stop the worker processes, failing the jobs that have not started yet.
+
+        With wait, the running jobs finish (and are recorded) first.
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+job_queue = JobQueue(SQLiteJobStore(JOB_DB_PATH) if JOB_DB_PATH else MemoryJobStore())
@@ -0,0 +1,44 @@
+import json
+import os
+import time
+
+from utils import ensure_directory_exists, write_atomic
+
+
+class JsonStore:
+    """One JSON file per (symbol, forecast_days, variant) under root, fresh for ttl_seconds after it is saved.
+
+    Subclasses name the field that records when a document was saved (stamp_field) and
+    wrap save and get with the shape of what they store.
+    """
+
+    stamp_field = "saved_at"
+
+    def __init__(self, root, ttl_seconds):
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+
+    def _path(self, symbol, forecast_days, variant):
+        return os.path.join(self.root, f"{symbol.upper()}_{variant}_{forecast_days}d.json")
+
+    def save(self, symbol, forecast_days, variant, document):
+        """Store document (a dict) for symbol with the current time, written atomically."""
+        ensure_directory_exists(self.root)
+        document = dict(document, **{self.stamp_field: time.time()})
+
+        def write(tmp_path):
+            with open(tmp_path, "w") as f:
+                json.dump(document, f)
+
+        write_atomic(self._path(symbol, forecast_days, variant), write)
+
+    def get(self, symbol, forecast_days, variant):
+        """Return the stored document for symbol if it is fresh, otherwise None."""
+        path = self._path(symbol, forecast_days, variant)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            document = json.load(f)
+        if time.time() - document[self.stamp_field] >= self.ttl_seconds:
+            return None
+        return document
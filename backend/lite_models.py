@@ -0,0 +1,116 @@
+import logging
+import os
+
+import numpy as np
+
+from config import WINDOW_SIZE
+from registry import ModelRegistry, ModelNotAvailableError, model_registry
+
+LSTM_WEIGHTS_FILE = "lstm_weights.npz"
+
+logger = logging.getLogger(__name__)
+
+
+def export_lstm(model, directory):
+    """Write the weights of a Keras LSTM stack (LSTM layers and a final Dense layer) to lstm_weights.npz."""
+    arrays = {}
+    kinds = []
+    for i, layer in enumerate(model.layers):
+        kind = type(layer).__name__
+        config = layer.get_config()
+        if kind == "LSTM":
+            if config["activation"] != "tanh" or config["recurrent_activation"] != "sigmoid" or not config["use_bias"]:
+                raise ValueError(f"Cannot export LSTM layer {layer.name} with non-default activations or no bias")
+            arrays[f"{i}_kernel"], arrays[f"{i}_recurrent_kernel"], arrays[f"{i}_bias"] = layer.get_weights()
+            arrays[f"{i}_return_sequences"] = np.array(config["return_sequences"])
+        elif kind == "Dense" and config["activation"] == "linear":
+            arrays[f"{i}_kernel"], arrays[f"{i}_bias"] = layer.get_weights()
+        else:
+            raise ValueError(f"Cannot export layer {layer.name} of type {kind}")
+        kinds.append(kind)
+    np.savez(os.path.join(directory, LSTM_WEIGHTS_FILE), layers=np.array(kinds), **arrays)
+
+
+def _sigmoid(x):
+    return 0.5 * (np.tanh(0.5 * x) + 1)
+
+
+class NumpyLSTM:
+    """Forward pass of an exported LSTM stack in NumPy: the same math as Keras, without TensorFlow.
+
+    Offers the predict/predict_on_batch calls the forecasting code makes on a Keras model.
+    """
+
+    def __init__(self, layers):
+        self.layers = layers
+
+    @staticmethod
+    def _lstm(x, kernel, recurrent_kernel, bias, return_sequences):
+        units = recurrent_kernel.shape[0]
+        batch, steps, _ = x.shape
+        projected = x @ kernel + bias  # Input projections for every time step at once
+        h = np.zeros((batch, units), dtype=np.float32)
+        c = np.zeros((batch, units), dtype=np.float32)
+        outputs = np.empty((batch, steps, units), dtype=np.float32) if return_sequences else None
+        for t in range(steps):
+            # Gates in Keras order: input, forget, cell candidate, output
+            z = projected[:, t] + h @ recurrent_kernel
+            i = _sigmoid(z[:, :units])
+            f = _sigmoid(z[:, units:2 * units])
+            g = np.tanh(z[:, 2 * units:3 * units])
+            o = _sigmoid(z[:, 3 * units:])
+            c = f * c + i * g
+            h = o * np.tanh(c)
+            if outputs is not None:
+                outputs[:, t] = h
+        return outputs if return_sequences else h
+
+    def predict_on_batch(self, X):
+        x = np.asarray(X, dtype=np.float32)
+        for kind, weights in self.layers:
+            if kind == "LSTM":
+                x = self._lstm(x, *weights)
+            else:
+                kernel, bias = weights
+                x = x @ kernel + bias
+        return x
+
+    def predict(self, X, verbose=0):
+        return self.predict_on_batch(X)
+
+
+def load_lite_lstm(directory):
+    """Load the exported weights in a registry directory as a NumpyLSTM."""
+    with np.load(os.path.join(directory, LSTM_WEIGHTS_FILE)) as data:
+        layers = []
+        for i, kind in enumerate(data["layers"]):
+            if kind == "LSTM":
+                weights = (
+                    data[f"{i}_kernel"], data[f"{i}_recurrent_kernel"], data[f"{i}_bias"],
+                    bool(data[f"{i}_return_sequences"]),
+                )
+            else:
+                weights = (data[f"{i}_kernel"], data[f"{i}_bias"])
+            layers.append((str(kind), weights))
+    return NumpyLSTM(layers)
+
+
+def stored_model(kind, symbol, forecast_days, end_date, load_model):
+    """Return the registry entry to serve in lite mode, where nothing is trained.
+
+    That is the model trained on data ending at end_date, or else the newest one trained
+    on older data. Raises ModelNotAvailableError when there is neither.
+    """
+    key = ModelRegistry.make_key(kind, symbol, forecast_days, WINDOW_SIZE, end_date)
+    try:
+        entry = model_registry.get(key, load_model)
+        if entry is None:
+            key, entry = model_registry.latest(kind, symbol, forecast_days, WINDOW_SIZE, end_date, load_model)
+    except FileNotFoundError:
+        entry = None  # Stored before the model was exported
+    if entry is None:
+        raise ModelNotAvailableError(
+            f"No trained {kind} model for {symbol}; train it with scheduler.py or a server in full mode"
+        )
+    logger.debug("Serving exported model from registry: %s", key)
+    return entry
@@ -0,0 +1,127 @@
+import threading
+from collections import defaultdict
+
+# Upper bounds (in seconds) for stage and request durations, from a cache hit to a full retrain
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Upper bounds (in bytes) for stored model sizes
+SIZE_BUCKETS = tuple(2 ** power for power in range(14, 31, 2))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+
+class Counter:
+    """Monotonically increasing count, one value per combination of labels."""
+
+    type = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] += amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, tuple(zip(self.labelnames, key)), value
+
+
+class Histogram:
+    """Distribution of observed values in cumulative buckets, one set per combination of labels."""
+
+    type = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._counts = {}
+        self._sums = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-1] += 1  # +Inf bucket, i.e. the total count
+            self._sums[key] += value
+
+    def samples(self):
+        with self._lock:
+            counts = {key: list(value) for key, value in self._counts.items()}
+            sums = dict(self._sums)
+        for key in sorted(counts):
+            labels = tuple(zip(self.labelnames, key))
+            for bound, count in zip((*self.buckets, "+Inf"), counts[key]):
+                yield f"{self.name}_bucket", labels + (("le", bound),), count
+            yield f"{self.name}_sum", labels, sums[key]
+            yield f"{self.name}_count", labels, counts[key][-1]
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, help_text, labelnames=()):
+        metric = Counter(name, help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DURATION_BUCKETS):
+        metric = Histogram(name, help_text, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {float(value)!r}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+STAGE_SECONDS = metrics.histogram(
+    "stock_stage_duration_seconds", "Time spent in each stage of a prediction.", ["stage"]
+)
+REQUEST_SECONDS = metrics.histogram(
+    "stock_http_request_duration_seconds", "Time to handle an HTTP request.", ["endpoint", "method", "status"]
+)
+CACHE_REQUESTS = metrics.counter(
+    "stock_cache_requests_total", "Cache lookups by cache and result (hit or miss).", ["cache", "result"]
+)
+MODEL_TRAININGS = metrics.counter(
+    "stock_model_trainings_total",
+    "Models trained, by kind and how: full, incremental, or full after an update drifted (drift_retrain).",
+    ["kind", "result"],
+)
+MODEL_SIZE_BYTES = metrics.histogram(
+    "stock_model_size_bytes", "Size on disk of each trained model saved to the registry.", ["kind"], SIZE_BUCKETS
+)
+
+
+def record_cache(cache, hit):
+    """Count one lookup in cache as a hit or a miss."""
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
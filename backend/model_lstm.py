@@ -2,105 +2,272 @@ import pandas as pd
 import numpy as np
 import sys
 import json
+import logging
 import os
+import threading
 from datetime import datetime
-import matplotlib
-matplotlib.use('Agg') 
-import matplotlib.pyplot as plt
-from utils import delete_existing_file, ensure_directory_exists
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import Dense, LSTM, Input
-from sklearn.preprocessing import MinMaxScaler
-from sklearn.metrics import mean_absolute_error, r2_score
+from charts import line, line_chart, histogram_chart
 from preprocess import download_stock_data, prepare_data
-
-def build_lstm_model(input_shape, forecast_days):
-    """Build and compile the LSTM model."""
-    model = Sequential()
-    model.add(Input(shape=input_shape))  # Explicitly define input layer
-    model.add(LSTM(units=50, return_sequences=True))
-    model.add(LSTM(units=50))
-    model.add(Dense(forecast_days))
-    model.compile(optimizer='adam', loss='mean_squared_error')
+from windowing import multi_step_targets, validation_split
+from registry import ModelRegistry, model_registry
+from incremental import previous_model, first_new_sample, has_drifted, full_train_meta, updated_meta
+from metrics import MODEL_TRAININGS
+from lite_models import export_lstm, load_lite_lstm, stored_model
+from features import feature_set, model_kind
+from global_model import stored_global_model
+from tuning import tuned_params
+from config import (
+    WINDOW_SIZE, FORECAST_MODE, TF_INTRA_OP_THREADS, TF_INTER_OP_THREADS, INCREMENTAL_EPOCHS, SERVING_MODE, MODEL_SCOPE,
+    EARLY_STOPPING_PATIENCE,
+)
+from timing import stage
+
+logger = logging.getLogger(__name__)
+
+_tf = None
+_tf_lock = threading.Lock()
+
+
+def tensorflow():
+    """Import TensorFlow on first use and apply the thread settings (lite serving never calls this)."""
+    global _tf
+    with _tf_lock:
+        if _tf is None:
+            import tensorflow as tf
+
+            # Thread pools must be sized before TensorFlow runs its first operation
+            tf.config.threading.set_intra_op_parallelism_threads(TF_INTRA_OP_THREADS)
+            tf.config.threading.set_inter_op_parallelism_threads(TF_INTER_OP_THREADS)
+            _tf = tf
+    return _tf
+
+
+def build_lstm_model(input_shape, forecast_days, units=50, layers=2, dropout=0.0, learning_rate=0.001):
+    """Build and compile the LSTM model (the defaults are the untuned architecture)."""
+    keras = tensorflow().keras
+    model = keras.Sequential()
+    model.add(keras.Input(shape=input_shape))  # Explicitly define input layer
+    for i in range(layers):
+        model.add(keras.layers.LSTM(units=units, return_sequences=i < layers - 1, dropout=dropout))
+    model.add(keras.layers.Dense(forecast_days))
+    model.compile(optimizer=keras.optimizers.Adam(learning_rate), loss='mean_squared_error')
     return model
 
 
-def train_and_forecast_lstm(df, forecast_days):
-    """Train the LSTM model and generate forecasts."""
-    # Ensure the graphs directory exists
-    graphs_dir = "graphs"
-    ensure_directory_exists(graphs_dir)
-
-    # Prepare data
-    X, y, X_forecast, scaler, y_dates = prepare_data(df, forecast_days)
+def save_lstm_model(model, directory):
+    """Write a trained LSTM model into a registry directory, along with its exported weights for lite serving."""
+    model.save(os.path.join(directory, "model.keras"))
+    export_lstm(model, directory)
 
-    # Ensure y has the correct shape for multi-step forecasting
-    y = np.array([y[i:i + forecast_days] for i in range(len(y) - forecast_days + 1)])
-    y_dates = y_dates[:len(y)]  # Adjust y_dates to match the new length of y
-    X = X[:len(y)]  # Adjust X to match the new y length
 
-    split = int(0.8 * len(X))
-    X_train, X_test, y_train, y_test = X[:split], X[split:], y[:split], y[split:]
-    y_test_dates = y_dates[split:]  # Get the dates corresponding to y_test
+def load_lstm_model(directory):
+    """Load an LSTM model from a registry directory."""
+    return tensorflow().keras.models.load_model(os.path.join(directory, "model.keras"))
 
-    # Debugging shapes
-    print("X_train shape:", X_train.shape)
-    print("y_train shape:", y_train.shape)
-    print("X_test shape:", X_test.shape)
-    print("y_test shape:", y_test.shape)
 
-    # Build and train the model
-    model = build_lstm_model((X.shape[1], 1), forecast_days)
-    history = model.fit(X_train, y_train, validation_data=(X_test, y_test), epochs=20, batch_size=32, verbose=0)
+def aligned_step(forecast_mode):
+    """Column of the LSTM test predictions that lines up with y_test_dates."""
+    return -1 if forecast_mode == "direct" else 0
 
-    # Predictions and metrics
-    predictions = model.predict(X_test)
 
-    forecast = []
+def forecast_lstm_recursive(model, X_forecast, scaler, forecast_days):
+    """Forecast one day per model call, feeding each prediction back into the input."""
+    forecast_values = []
     input_sequence = X_forecast[0]
-    last_date = df.index[-1]  # Get the last date from the dataframe
-    print("Last date in the dataframe:", last_date)
-
     for i in range(forecast_days):
         # Predict the next step
-        forecast_scaled = model.predict(input_sequence.reshape(1, -1, 1))
-        forecast_value = scaler.inverse_transform(forecast_scaled).flatten()[0]
-        forecast_date = last_date + pd.Timedelta(days=i + 1)  # Increment the date
-
-        # Append the forecasted date and value
-        forecast.append((forecast_date, forecast_value))
-        print(f"Iteration {i}: Forecasted date: {forecast_date}, value: {forecast_value}")
+        forecast_scaled = model.predict(input_sequence.reshape(1, -1, 1), verbose=0)
+        forecast_values.append(scaler.inverse_transform(forecast_scaled).flatten()[0])
 
         # Update the input sequence for the next prediction
         input_sequence = np.append(input_sequence[1:], forecast_scaled).reshape(-1, 1)
-    
+    return np.array(forecast_values)
+
+
+def forecast_lstm_direct(model, X_forecast, scaler):
+    """Forecast every horizon at once from the Dense(forecast_days) head in a single forward pass."""
+    # predict_on_batch reuses the compiled predict function without model.predict's data pipeline
+    forecast_scaled = np.asarray(model.predict_on_batch(X_forecast))
+    return scaler.inverse_transform(forecast_scaled.reshape(-1, 1)).flatten()
+
+
+def fit_lstm(model, X_train, y_train, X_test, y_test, epochs, batch_size=32, initial_epoch=0):
+    """Train model and return its loss history as plain lists.
+
+    Training stops before epochs once the validation loss has not improved for
+    EARLY_STOPPING_PATIENCE epochs; the weights of the best epoch are kept.
+    """
+    callbacks = []
+    if EARLY_STOPPING_PATIENCE:
+        callbacks.append(tensorflow().keras.callbacks.EarlyStopping(
+            monitor="val_loss", patience=EARLY_STOPPING_PATIENCE, restore_best_weights=True
+        ))
+    history = model.fit(
+        X_train, y_train, validation_data=(X_test, y_test), epochs=epochs, initial_epoch=initial_epoch,
+        batch_size=batch_size, callbacks=callbacks, verbose=0,
+    )
+    return {name: [float(v) for v in values] for name, values in history.history.items()}
+
+
+def update_lstm(previous, X_fit, y_fit, X_val, y_val, y_fit_dates, learning_rate=0.001, batch_size=32):
+    """Fine-tune a copy of a previously trained model on the training windows it has not seen.
+
+    learning_rate and batch_size should be those of the full training (e.g. tuned ones).
+    Returns (model, history, meta), or None when the updated model's loss on the validation
+    windows drifted too far and a full retrain is needed.
+    """
+    keras = tensorflow().keras
+    meta = previous["meta"]
+    model = keras.models.clone_model(previous["model"])
+    model.set_weights(previous["model"].get_weights())
+    model.compile(optimizer=keras.optimizers.Adam(learning_rate), loss='mean_squared_error')
+
+    start = first_new_sample(y_fit_dates, meta)
+    if start is None:
+        history = {}
+        val_loss = float(model.evaluate(X_val, y_val, verbose=0))
+    else:
+        with stage("lstm_update"):
+            history = fit_lstm(model, X_fit[start:], y_fit[start:], X_val, y_val, INCREMENTAL_EPOCHS, batch_size)
+        val_loss = min(history["val_loss"])  # The restored best epoch
+
+    if has_drifted(meta, val_loss):
+        logger.info("LSTM validation loss drifted from %.6f to %.6f, retraining", meta["base_val_loss"], val_loss)
+        return None
+    history = {name: values + history.get(name, []) for name, values in meta["history"].items()}
+    return model, history, dict(updated_meta(meta, y_fit_dates, val_loss), history=history)
+
+
+def get_or_train_lstm(symbol, end_date, forecast_days, X_train, y_train, scaler, forecast_mode=FORECAST_MODE, y_train_dates=None):
+    """Return (model, history, scaler), loading from the registry when a fresh model exists.
+
+    When only a model trained on older data exists (and y_train_dates is given), that model
+    is fine-tuned on the new windows instead of training a new one from scratch. Early
+    stopping watches the last training windows (see validation_split), not the test windows.
+    """
+    kind = model_kind("lstm", forecast_mode)
+    if MODEL_SCOPE == "global" and forecast_mode == "direct":
+        # Inference only: the model trained on every symbol, fed this symbol's own scaling
+        entry = stored_global_model("lstm", forecast_days, load_lite_lstm if SERVING_MODE == "lite" else load_lstm_model)
+        return entry["model"], entry["meta"]["history"], scaler
+    if SERVING_MODE == "lite":
+        # The stored model may be trained on older data; the windows were scaled with the current scaler
+        entry = stored_model(kind, symbol, forecast_days, end_date, load_lite_lstm)
+        return entry["model"], entry["meta"]["history"], scaler
+
+    # Hyperparameters found by tuning.py for this symbol, if any (direct mode only)
+    tuned = (tuned_params.get(symbol, forecast_days, "lstm") if symbol and forecast_mode == "direct" else None) or {}
+    params = tuned.get("params", {})
+    batch_size = tuned.get("batch_size", 32)
+
+    fit_end = validation_split(len(X_train))
+    X_fit, y_fit, X_val, y_val = X_train[:fit_end], y_train[:fit_end], X_train[fit_end:], y_train[fit_end:]
+    y_fit_dates = y_train_dates[:fit_end] if y_train_dates is not None else None
+
+    key = None
+    result = "full"
+    if symbol:
+        key = ModelRegistry.make_key(kind, symbol, forecast_days, WINDOW_SIZE, end_date)
+        entry = model_registry.get(key, load_lstm_model)
+        if entry is not None:
+            logger.info("Loaded LSTM model from registry: %s", key)
+            return entry["model"], entry["meta"]["history"], entry["scaler"]
+
+        previous = previous_model(kind, symbol, forecast_days, end_date, load_lstm_model) if y_train_dates is not None else None
+        if previous is not None:
+            updated = update_lstm(
+                previous, X_fit, y_fit, X_val, y_val, y_fit_dates, params.get("learning_rate", 0.001), batch_size
+            )
+            if updated is not None:
+                model, history, meta = updated
+                model_registry.put(key, model, scaler, save_lstm_model, meta)
+                MODEL_TRAININGS.inc(kind=kind, result="incremental")
+                return model, history, scaler
+            result = "drift_retrain"
+
+    model = build_lstm_model(X_train.shape[1:], forecast_days, **params)
+    with stage("lstm_fit"):
+        history = fit_lstm(model, X_fit, y_fit, X_val, y_val, epochs=tuned.get("epochs", 20), batch_size=batch_size)
+    MODEL_TRAININGS.inc(kind=kind, result=result)
+
+    if key:
+        meta = {"history": history}
+        if y_fit_dates is not None:
+            meta.update(full_train_meta(y_fit_dates, min(history["val_loss"])))
+        model_registry.put(key, model, scaler, save_lstm_model, meta)
+    return model, history, scaler
+
+
+def train_and_forecast_lstm(df, forecast_days, symbol=None, forecast_mode=FORECAST_MODE, prepared=None):
+    """Train the LSTM model (or reuse a stored one for symbol) and generate forecasts.
+
+    forecast_mode is "direct" (every horizon from one forward pass) or "recursive"
+    (one prediction per day, fed back into the input window). prepared can hold the
+    output of prepare_data when it was already computed for this df. Besides the test
+    predictions, returns the predictions on the validation windows, which the hybrid
+    weights are fitted on.
+    """
+    # Prepare data (direct mode trains on the true 1..forecast_days ahead targets of each window)
+    if prepared is None:
+        prepared = prepare_data(
+            df, forecast_days, window_size=WINDOW_SIZE, dtype=np.float32, multi_step=forecast_mode == "direct",
+            features=feature_set(forecast_mode), symbol=symbol,
+        )
+    X, y, X_forecast, scaler, y_dates = prepared
+
+    if forecast_mode != "direct":
+        # Ensure y has the correct shape for multi-step forecasting
+        y = multi_step_targets(y, forecast_days)
+        y_dates = y_dates[:len(y)]  # Adjust y_dates to match the new length of y
+        X = X[:len(y)]  # Adjust X to match the new y length
+
+    split = int(0.8 * len(X))
+    X_train, X_test, y_train, y_test = X[:split], X[split:], y[:split], y[split:]
+    y_train_dates, y_test_dates = y_dates[:split], y_dates[split:]  # Get the dates corresponding to y_train and y_test
+
+    logger.debug("X_train shape: %s", X_train.shape)
+    logger.debug("y_train shape: %s", y_train.shape)
+    logger.debug("X_test shape: %s", X_test.shape)
+    logger.debug("y_test shape: %s", y_test.shape)
+
+    # Build and train the model, or load it if it was already trained on the same data
+    model, history, scaler = get_or_train_lstm(
+        symbol, df.index[-1], forecast_days, X_train, y_train, scaler, forecast_mode, y_train_dates
+    )
+
+    # Predictions and metrics, on the validation windows (held out of the fit, see validation_split) and the test windows
+    fit_end = validation_split(split)
+    with stage("lstm_predict"):
+        predictions = model.predict(X[fit_end:], verbose=0)
+    validation, predictions = predictions[:split - fit_end], predictions[split - fit_end:]
+
+    last_date = df.index[-1]  # Get the last date from the dataframe
+    logger.debug("Last date in the dataframe: %s", last_date)
+
+    with stage("lstm_forecast"):
+        if forecast_mode == "direct":
+            forecast_values = forecast_lstm_direct(model, X_forecast, scaler)
+        else:
+            forecast_values = forecast_lstm_recursive(model, X_forecast, scaler, forecast_days)
+    forecast = [(last_date + pd.Timedelta(days=i + 1), value) for i, value in enumerate(forecast_values)]
 
     current_price = float(df['Close'].iloc[-1])
 
-    # Generate graphs
-    generate_graphs(y_test_dates, y_test, predictions, forecast, history, scaler, graphs_dir)
+    # Collect the data behind the graphs (rendered only if a PNG is requested)
+    with stage("graph_series"):
+        series = graph_series(y_test_dates, y_test, predictions, forecast, history, scaler, step=aligned_step(forecast_mode))
     forecast = [{"date": str(date), "value": round(float(value), 2)} for date, value in forecast]
 
 
-    # Return forecast, current price, and paths to the generated graphs
-    return current_price, forecast, predictions, y_test_dates, scaler, {
-        "actual_vs_predicted_lstm": "actual_vs_predicted_lstm.png",
-        "forecasted_prices_lstm": "forecasted_prices_lstm.png",
-        "training_vs_validation_loss_lstm": "training_vs_validation_loss_lstm.png",
-        "residuals_histogram_lstm": "residuals_histogram_lstm.png"
-    }
-
+    # Return forecast, current price, the series behind each graph and the validation predictions
+    return current_price, forecast, predictions, y_test_dates, scaler, series, validation
 
-def generate_graphs(y_test_dates, y_test, predictions, forecast, history, scaler, graphs_dir):
-    """Generate and save graphs for analysis."""
-    # Actual vs Predicted
-    actual_vs_predicted_path = os.path.join(graphs_dir, "actual_vs_predicted_lstm.png")
-    delete_existing_file(actual_vs_predicted_path)
-    plt.figure(figsize=(10, 6))
 
-    # Use only the first forecasted step for each sample
-    y_test_flat = scaler.inverse_transform(y_test[:, 0].reshape(-1, 1)).flatten()
-    predictions_flat = scaler.inverse_transform(predictions[:, 0].reshape(-1, 1)).flatten()
+def graph_series(y_test_dates, y_test, predictions, forecast, history, scaler, step=0):
+    """Build the chart specs for analysis (step selects the forecast column to compare)."""
+    # Use only one forecasted step for each sample
+    y_test_flat = scaler.inverse_transform(y_test[:, step].reshape(-1, 1)).flatten()
+    predictions_flat = scaler.inverse_transform(predictions[:, step].reshape(-1, 1)).flatten()
 
     # Use y_test_dates for the x-axis
     dates = y_test_dates
@@ -108,76 +275,42 @@ def generate_graphs(y_test_dates, y_test, predictions, forecast, history, scaler
     if len(dates) != len(y_test_flat):
         raise ValueError(f"Mismatch between dates ({len(dates)}) and y_test_flat ({len(y_test_flat)})")
 
-    plt.plot(dates, y_test_flat, label="Actual", color="blue")
-    plt.plot(dates, predictions_flat, label="Predicted", color="red")
-    plt.title("Actual vs Predicted Stock Prices")
-    plt.xlabel("Date")
-    plt.ylabel("Stock Price")
-    plt.legend()
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    plt.savefig(actual_vs_predicted_path)
-    plt.close()
-
-    # Forecasted Prices
-    forecasted_prices_path = os.path.join(graphs_dir, "forecasted_prices_lstm.png")
-    delete_existing_file(forecasted_prices_path)
-    plt.figure(figsize=(10, 6))
-
-    # Extract dates and values from the forecast tuples
     forecast_dates = [date for date, value in forecast]
     forecast_values = [value for date, value in forecast]
+    epochs = list(range(len(history['loss'])))
+
+    return {
+        "actual_vs_predicted_lstm": line_chart("Actual vs Predicted Stock Prices", dates, [
+            line("Actual", y_test_flat, "blue"),
+            line("Predicted", predictions_flat, "red"),
+        ]),
+        "forecasted_prices_lstm": line_chart("Forecasted Stock Prices", forecast_dates, [
+            line("Forecast", forecast_values, "green"),
+        ]),
+        "training_vs_validation_loss_lstm": line_chart("Training vs Validation Loss", epochs, [
+            line("Training Loss", history['loss'], "orange", decimals=6),
+            line("Validation Loss", history['val_loss'], "purple", decimals=6),
+        ], xlabel="Epochs", ylabel="Loss", dates=False),
+        "residuals_histogram_lstm": histogram_chart("Residuals (Actual - Predicted)", y_test_flat - predictions_flat),
+    }
+
+
+if __name__ == "__main__":
+    # Usage: python model_lstm.py SYMBOL START END FORECAST_DAYS [direct|recursive]
+    # Trains (or updates) the model for SYMBOL, stores it in the registry and prints its forecast
+    symbol = sys.argv[1].upper()
+    start = datetime.strptime(sys.argv[2], "%Y-%m-%d").date()
+    end = datetime.strptime(sys.argv[3], "%Y-%m-%d").date()
+    forecast_days = int(sys.argv[4])
+    forecast_mode = sys.argv[5] if len(sys.argv) > 5 else FORECAST_MODE
+
+    df = download_stock_data(symbol, start, end)
+    current_price, forecast, *_ = train_and_forecast_lstm(df, forecast_days, symbol, forecast_mode)
+
+    output = {
+        "symbol": symbol,
+        "current_price": round(float(current_price), 2),
+        "forecast": forecast,
+    }
 
-    plt.plot(forecast_dates, forecast_values, label="Forecast", color="green")
-    plt.title("Forecasted Stock Prices")
-    plt.xlabel("Date")
-    plt.ylabel("Stock Price")
-    plt.legend()
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    plt.savefig(forecasted_prices_path)
-    plt.close()
-
-    # Training vs Validation Loss
-    training_vs_validation_loss_path = os.path.join(graphs_dir, "training_vs_validation_loss_lstm.png")
-    delete_existing_file(training_vs_validation_loss_path)
-    plt.figure(figsize=(10, 6))
-    plt.plot(history.history['loss'], label="Training Loss", color="orange")
-    plt.plot(history.history['val_loss'], label="Validation Loss", color="purple")
-    plt.title("Training vs Validation Loss")
-    plt.xlabel("Epochs")
-    plt.ylabel("Loss")
-    plt.legend()
-    plt.savefig(training_vs_validation_loss_path)
-    plt.close()
-
-    # Residuals Histogram
-    residuals = scaler.inverse_transform(y_test[:, 0].reshape(-1, 1)) - scaler.inverse_transform(predictions[:, 0].reshape(-1, 1))
-    residuals_histogram_path = os.path.join(graphs_dir, "residuals_histogram_lstm.png")
-    delete_existing_file(residuals_histogram_path)
-    plt.figure(figsize=(10, 6))
-    plt.hist(residuals, bins=20, color="darkorchid", edgecolor="black")
-    plt.title("Residuals (Actual - Predicted)")
-    plt.xlabel("Residual Value")
-    plt.ylabel("Frequency")
-    plt.savefig(residuals_histogram_path)
-    plt.close()
-
-
-# if __name__ == "__main__":
-#     symbol = sys.argv[1]
-#     start = datetime.strptime(sys.argv[2], "%Y-%m-%d").date()
-#     end = datetime.strptime(sys.argv[3], "%Y-%m-%d").date()
-#     forecast_days = int(sys.argv[4])
-
-#     df = download_stock_data(symbol, start, end)
-#     current_price, forecast, graph_paths = train_and_forecast_lstm(df, forecast_days)
-
-#     output = {
-#         "symbol": symbol,
-#         "current_price": round(float(current_price), 2),
-#         "forecast": forecast,
-#         "graphs": graph_paths
-#     }
-
-#     print(json.dumps(output))
\ No newline at end of file
+    print(json.dumps(output))
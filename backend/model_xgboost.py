@@ -2,19 +2,28 @@ import pandas as pd
 import numpy as np
 import sys
 import json
+import logging
 import os
-from datetime import datetime, timedelta
-import matplotlib
-matplotlib.use('Agg')  
-import matplotlib.pyplot as plt
+from datetime import datetime
 from xgboost import XGBRegressor
-from utils import delete_existing_file, ensure_directory_exists
-from sklearn.preprocessing import MinMaxScaler
-from sklearn.metrics import mean_absolute_error, r2_score
+from charts import line, line_chart, histogram_chart
 from preprocess import download_stock_data, prepare_data
+from registry import ModelRegistry, model_registry
+from incremental import previous_model, first_new_sample, has_drifted, full_train_meta, updated_meta
+from metrics import MODEL_TRAININGS
+from lite_models import stored_model
+from features import feature_set, model_kind
+from global_model import stored_global_model
+from tuning import tuned_params
+from windowing import validation_split
+from config import WINDOW_SIZE, FORECAST_MODE, XGB_N_JOBS, INCREMENTAL_XGB_TREES, SERVING_MODE, MODEL_SCOPE, XGB_EARLY_STOPPING_ROUNDS
+from timing import stage
 
-def build_xgboost_model():
-    """Build and compile the XGBoost model."""
+logger = logging.getLogger(__name__)
+
+
+def build_xgboost_model(**params):
+    """Build and compile the XGBoost model; params (e.g. tuned ones) override the defaults."""
     model = XGBRegressor(
         n_estimators=500,
         max_depth=6,
@@ -22,80 +31,224 @@ def build_xgboost_model():
         subsample=0.8,
         colsample_bytree=0.8,
         objective='reg:squarederror',
-        random_state=42
+        random_state=42,
+        n_jobs=XGB_N_JOBS or None
     )
+    return model.set_params(**params) if params else model
+
+
+def fit_xgboost(model, X_fit, y_fit, X_val=None, y_val=None, xgb_model=None):
+    """Fit model, stopping early once XGB_EARLY_STOPPING_ROUNDS trees in a row did not improve on the validation windows.
+
+    Without validation windows all n_estimators trees are built. Predictions use the best number of trees.
+    """
+    if X_val is None or not XGB_EARLY_STOPPING_ROUNDS:
+        return model.fit(X_fit, y_fit, xgb_model=xgb_model)
+    model.set_params(early_stopping_rounds=XGB_EARLY_STOPPING_ROUNDS)
+    return model.fit(X_fit, y_fit, eval_set=[(X_val, y_val)], xgb_model=xgb_model, verbose=False)
+
+
+def save_xgboost_model(model, directory):
+    """Write a trained XGBoost model into a registry directory, in XGBoost's binary UBJSON format."""
+    model.save_model(os.path.join(directory, "model.ubj"))
+
+
+def load_xgboost_model(directory):
+    """Load an XGBoost model from a registry directory."""
+    model = XGBRegressor(n_jobs=XGB_N_JOBS or None)
+    path = os.path.join(directory, "model.ubj")
+    if not os.path.exists(path):
+        path = os.path.join(directory, "model.json")  # Saved before models were stored as UBJSON
+    model.load_model(path)
     return model
 
 
-def train_and_forecast_xgboost(df, forecast_days):
-    """Train the XGBoost model and generate forecasts."""
-    graphs_dir = "graphs"
-    ensure_directory_exists(graphs_dir)
+def forecast_xgboost_recursive(model, X_forecast, scaler, forecast_days):
+    """Forecast one day per model call, feeding each prediction back into the input."""
+    forecast_scaled = []
+    input_sequence = X_forecast[0]  # Use the first forecast input sequence
+    for i in range(forecast_days):
+        # Predict the next value (in the scaled space the model was trained in)
+        forecast_value = model.predict(input_sequence.reshape(1, -1))[0]
+        forecast_scaled.append(forecast_value)
+
+        # Update the input sequence for the next prediction
+        input_sequence = np.append(input_sequence[1:], forecast_value)  # Remove the first value and append the new value
+    # Back to prices only once the whole forecast is done
+    return scaler.inverse_transform(np.array(forecast_scaled).reshape(-1, 1)).flatten()
+
+
+def forecast_xgboost_direct(model, X_forecast, scaler):
+    """Forecast every horizon with a single predict call on the multi-output model."""
+    forecast_scaled = model.predict(X_forecast)
+    return scaler.inverse_transform(forecast_scaled.reshape(-1, 1)).flatten()
+
+
+def validation_loss(model, X_val, y_val):
+    """Mean squared error of model on the validation windows."""
+    return float(np.mean((model.predict(X_val) - y_val) ** 2))
+
+
+def best_booster(model):
+    """A copy of model's booster cut to its best iteration, without the early-stopping attributes.
+
+    A booster that still carries best_iteration would make predict() ignore any trees added to it.
+    """
+    booster = model.get_booster()
+    best_iteration = booster.attr("best_iteration")
+    booster = booster[:int(best_iteration) + 1] if best_iteration is not None else booster.copy()
+    booster.set_attr(best_iteration=None, best_score=None)
+    return booster
+
+
+def update_xgboost(previous, X_fit, y_fit, X_val, y_val, y_fit_dates, params=None):
+    """Add INCREMENTAL_XGB_TREES trees, fitted on the training windows the previous model has not seen.
+
+    params are the hyperparameters the previous model was built with (e.g. tuned ones).
+    Returns (model, meta), or None when the updated model's validation loss drifted too
+    far and a full retrain is needed.
+    """
+    meta = previous["meta"]
+    model = previous["model"]
+    start = first_new_sample(y_fit_dates, meta)
+    if start is not None:
+        model = build_xgboost_model(**dict(params or {}, n_estimators=INCREMENTAL_XGB_TREES))
+        with stage("xgboost_update"):
+            # Continue boosting from the trees the previous model predicts with (it is left untouched)
+            model.fit(X_fit[start:], y_fit[start:], xgb_model=best_booster(previous["model"]))
+
+    val_loss = validation_loss(model, X_val, y_val)
+    if has_drifted(meta, val_loss):
+        logger.info("XGBoost validation loss drifted from %.6f to %.6f, retraining", meta["base_val_loss"], val_loss)
+        return None
+    return model, updated_meta(meta, y_fit_dates, val_loss)
+
 
-    # Prepare data
-    X, y, X_forecast, scaler, y_dates = prepare_data(df, forecast_days)
+def get_or_train_xgboost(symbol, end_date, forecast_days, X_train, y_train, scaler, forecast_mode=FORECAST_MODE, y_train_dates=None):
+    """Return (model, scaler), loading from the registry when a fresh model exists.
+
+    When only a model trained on older data exists (and y_train_dates is given), that model
+    is updated with a few more trees instead of refitting from scratch. Early stopping
+    watches the last training windows (see validation_split), not the test windows.
+    """
+    kind = model_kind("xgboost", forecast_mode)
+    if MODEL_SCOPE == "global" and forecast_mode == "direct":
+        # Inference only: the model trained on every symbol, fed this symbol's own scaling
+        entry = stored_global_model("xgboost", forecast_days, load_xgboost_model)
+        return entry["model"], scaler
+    if SERVING_MODE == "lite":
+        # The stored model may be trained on older data; the windows were scaled with the current scaler
+        entry = stored_model(kind, symbol, forecast_days, end_date, load_xgboost_model)
+        return entry["model"], scaler
+
+    # Hyperparameters found by tuning.py for this symbol, if any (direct mode only)
+    tuned = (tuned_params.get(symbol, forecast_days, "xgboost") if symbol and forecast_mode == "direct" else None) or {}
+    params = tuned.get("params", {})
+
+    fit_end = validation_split(len(X_train))
+    X_fit, y_fit, X_val, y_val = X_train[:fit_end], y_train[:fit_end], X_train[fit_end:], y_train[fit_end:]
+    y_fit_dates = y_train_dates[:fit_end] if y_train_dates is not None else None
+
+    key = None
+    result = "full"
+    if symbol:
+        key = ModelRegistry.make_key(kind, symbol, forecast_days, WINDOW_SIZE, end_date)
+        entry = model_registry.get(key, load_xgboost_model)
+        if entry is not None:
+            logger.info("Loaded XGBoost model from registry: %s", key)
+            return entry["model"], entry["scaler"]
+
+        previous = previous_model(kind, symbol, forecast_days, end_date, load_xgboost_model) if y_fit_dates is not None else None
+        if previous is not None:
+            updated = update_xgboost(previous, X_fit, y_fit, X_val, y_val, y_fit_dates, params)
+            if updated is not None:
+                model, meta = updated
+                model_registry.put(key, model, scaler, save_xgboost_model, meta)
+                MODEL_TRAININGS.inc(kind=kind, result="incremental")
+                return model, scaler
+            result = "drift_retrain"
+
+    model = build_xgboost_model(**params)
+    with stage("xgboost_fit"):
+        fit_xgboost(model, X_fit, y_fit, X_val, y_val)
+    MODEL_TRAININGS.inc(kind=kind, result=result)
+
+    if key:
+        meta = full_train_meta(y_fit_dates, validation_loss(model, X_val, y_val)) if y_fit_dates is not None else None
+        model_registry.put(key, model, scaler, save_xgboost_model, meta)
+    return model, scaler
+
+
+def train_and_forecast_xgboost(df, forecast_days, symbol=None, forecast_mode=FORECAST_MODE, prepared=None):
+    """Train the XGBoost model (or reuse a stored one for symbol) and generate forecasts.
+
+    In "direct" mode one multi-output model predicts every horizon at once; in
+    "recursive" mode each day's prediction is fed back in as the next input.
+    prepared can hold the output of prepare_data when it was already computed for this df.
+    Besides the test predictions, returns the predictions on the validation windows, which
+    the hybrid weights are fitted on.
+    """
+    # Prepare data (direct mode trains on every horizon from 1 to forecast_days)
+    direct = forecast_mode == "direct"
+    if prepared is None:
+        prepared = prepare_data(
+            df, forecast_days, window_size=WINDOW_SIZE, dtype=np.float32, multi_step=direct,
+            features=feature_set(forecast_mode), symbol=symbol,
+        )
+    X, y, X_forecast, scaler, y_dates = prepared
 
     # Reshape X and y into 2-dimensional matrices
     X = X.reshape(X.shape[0], -1)  # Reshape X to (samples, features)
-    y = y.flatten()  # Flatten y to (samples,) for single-step forecasting
+    if not direct:
+        y = y.flatten()  # Flatten y to (samples,) for single-step forecasting
     X_forecast = X_forecast.reshape(X_forecast.shape[0], -1)  # Reshape X_forecast to (samples, features)
 
     # Split data into training and testing sets
     split = int(0.8 * len(X))
     X_train, X_test, y_train, y_test = X[:split], X[split:], y[:split], y[split:]
-    y_test_dates = y_dates[split:]  # Get the dates corresponding to y_test
+    y_train_dates, y_test_dates = y_dates[:split], y_dates[split:]  # Get the dates corresponding to y_train and y_test
 
-    print("X_train shape:", X_train.shape)
-    print("y_train shape:", y_train.shape)
-    print("X_test shape:", X_test.shape)
-    print("y_test shape:", y_test.shape)
+    logger.debug("X_train shape: %s", X_train.shape)
+    logger.debug("y_train shape: %s", y_train.shape)
+    logger.debug("X_test shape: %s", X_test.shape)
+    logger.debug("y_test shape: %s", y_test.shape)
 
-    # Build and train the model
-    model = build_xgboost_model()
-    model.fit(X_train, y_train)
+    # Build and train the model, or load it if it was already trained on the same data
+    model, scaler = get_or_train_xgboost(
+        symbol, df.index[-1], forecast_days, X_train, y_train, scaler, forecast_mode, y_train_dates
+    )
 
-    # Predictions and metrics
-    predictions = model.predict(X_test)
+    # Predictions and metrics, on the validation windows (held out of the fit, see validation_split) and the test windows
+    fit_end = validation_split(split)
+    with stage("xgboost_predict"):
+        predictions = model.predict(X[fit_end:])
+    if direct:
+        # Report the forecast_days-ahead column, which lines up with y_test_dates
+        predictions, y_test = predictions[:, -1], y_test[:, -1]
+    validation, predictions = predictions[:split - fit_end], predictions[split - fit_end:]
 
     # Generate forecasted values with dates
-    forecast = []
-    input_sequence = X_forecast[0]  # Use the first forecast input sequence
     last_date = df.index[-1]  # Get the last date from the dataframe
-    print("Last date in the dataframe:", last_date)
+    logger.debug("Last date in the dataframe: %s", last_date)
 
-    for i in range(forecast_days):
-        # Predict the next value
-        forecast_value = model.predict(input_sequence.reshape(1, -1))[0]
-        forecast_value = scaler.inverse_transform([[forecast_value]])[0, 0]  # Inverse transform the forecasted value
-        forecast_date = last_date + pd.Timedelta(days=i + 1)
-
-        # Append the forecasted value and date
-        forecast.append((forecast_date, forecast_value))
-        print(f"Iteration {i}: Forecasted date: {forecast_date}, value: {forecast_value}")
-
-        # Update the input sequence for the next prediction
-        input_sequence = np.append(input_sequence[1:], forecast_value)  # Remove the first value and append the new value
+    with stage("xgboost_forecast"):
+        if direct:
+            forecast_values = forecast_xgboost_direct(model, X_forecast, scaler)
+        else:
+            forecast_values = forecast_xgboost_recursive(model, X_forecast, scaler, forecast_days)
+    forecast = [(last_date + pd.Timedelta(days=i + 1), value) for i, value in enumerate(forecast_values)]
 
     current_price = float(df['Close'].iloc[-1])
 
-    # Generate graphs
-    generate_graphs(y_test_dates, y_test, predictions, forecast, None, scaler, graphs_dir)
+    # Collect the data behind the graphs (rendered only if a PNG is requested)
+    with stage("graph_series"):
+        series = graph_series(y_test_dates, y_test, predictions, forecast, scaler)
     forecast = [{"date": str(date), "value": round(float(value), 2)} for date, value in forecast]
 
-    return current_price, forecast, predictions, y_test, {
-        "actual_vs_predicted_xgboost": "actual_vs_predicted_xgboost.png",
-        "forecasted_prices_xgboost": "forecasted_prices_xgboost.png",
-        "training_vs_validation_loss_xgboost": "training_vs_validation_loss_xgboost.png",
-        "residuals_histogram_xgboost": "residuals_histogram_xgboost.png"
-    }
-
-def generate_graphs(y_test_dates, y_test, predictions, forecast, history, scaler, graphs_dir):
-    """Generate and save graphs for analysis."""
-    # Actual vs Predicted
-    actual_vs_predicted_path = os.path.join(graphs_dir, "actual_vs_predicted_xgboost.png")
-    delete_existing_file(actual_vs_predicted_path)
-    plt.figure(figsize=(10, 6))
+    return current_price, forecast, predictions, y_test, series, validation
 
+def graph_series(y_test_dates, y_test, predictions, forecast, scaler):
+    """Build the chart specs for analysis."""
     # Inverse transform y_test and predictions (already 1-dimensional)
     y_test_flat = scaler.inverse_transform(y_test.reshape(-1, 1)).flatten()
     predictions_flat = scaler.inverse_transform(predictions.reshape(-1, 1)).flatten()
@@ -106,63 +259,37 @@ def generate_graphs(y_test_dates, y_test, predictions, forecast, history, scaler
     if len(dates) != len(y_test_flat):
         raise ValueError(f"Mismatch between dates ({len(dates)}) and y_test_flat ({len(y_test_flat)})")
 
-    plt.plot(dates, y_test_flat, label="Actual", color="blue")
-    plt.plot(dates, predictions_flat, label="Predicted", color="red")
-    plt.title("Actual vs Predicted Stock Prices")
-    plt.xlabel("Date")
-    plt.ylabel("Stock Price")
-    plt.legend()
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    plt.savefig(actual_vs_predicted_path)
-    plt.close()
-
-    # Forecasted Prices
-    forecasted_prices_path = os.path.join(graphs_dir, "forecasted_prices_xgboost.png")
-    delete_existing_file(forecasted_prices_path)
-    plt.figure(figsize=(10, 6))
-
-    # Extract dates and values from the forecast tuples
     forecast_dates = [date for date, value in forecast]
     forecast_values = [value for date, value in forecast]
 
-    plt.plot(forecast_dates, forecast_values, label="Forecast", color="green")
-    plt.title("Forecasted Stock Prices")
-    plt.xlabel("Date")
-    plt.ylabel("Stock Price")
-    plt.legend()
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    plt.savefig(forecasted_prices_path)
-    plt.close()
-
-    # Residuals Histogram
-    residuals = y_test_flat - predictions_flat
-    residuals_histogram_path = os.path.join(graphs_dir, "residuals_histogram_xgboost.png")
-    delete_existing_file(residuals_histogram_path)
-    plt.figure(figsize=(10, 6))
-    plt.hist(residuals, bins=20, color="darkorchid", edgecolor="black")
-    plt.title("Residuals (Actual - Predicted)")
-    plt.xlabel("Residual Value")
-    plt.ylabel("Frequency")
-    plt.savefig(residuals_histogram_path)
-    plt.close()
-
-
-# if __name__ == "__main__":
-#     symbol = sys.argv[1]
-#     start = datetime.strptime(sys.argv[2], "%Y-%m-%d").date()
-#     end = datetime.strptime(sys.argv[3], "%Y-%m-%d").date()
-#     forecast_days = int(sys.argv[4])
-
-#     df = download_stock_data(symbol, start, end)
-#     current_price, forecast, graph_paths = train_and_forecast_xgboost(df, forecast_days)
-
-#     output = {
-#         "symbol": symbol,
-#         "current_price": round(float(current_price), 2),
-#         "forecast": forecast,
-#         "graphs": graph_paths
-#     }
-
-#     print(json.dumps(output))
\ No newline at end of file
+    return {
+        "actual_vs_predicted_xgboost": line_chart("Actual vs Predicted Stock Prices", dates, [
+            line("Actual", y_test_flat, "blue"),
+            line("Predicted", predictions_flat, "red"),
+        ]),
+        "forecasted_prices_xgboost": line_chart("Forecasted Stock Prices", forecast_dates, [
+            line("Forecast", forecast_values, "green"),
+        ]),
+        "residuals_histogram_xgboost": histogram_chart("Residuals (Actual - Predicted)", y_test_flat - predictions_flat),
+    }
+
+
+if __name__ == "__main__":
+    # Usage: python model_xgboost.py SYMBOL START END FORECAST_DAYS [direct|recursive]
+    # Trains (or updates) the model for SYMBOL, stores it in the registry and prints its forecast
+    symbol = sys.argv[1].upper()
+    start = datetime.strptime(sys.argv[2], "%Y-%m-%d").date()
+    end = datetime.strptime(sys.argv[3], "%Y-%m-%d").date()
+    forecast_days = int(sys.argv[4])
+    forecast_mode = sys.argv[5] if len(sys.argv) > 5 else FORECAST_MODE
+
+    df = download_stock_data(symbol, start, end)
+    current_price, forecast, *_ = train_and_forecast_xgboost(df, forecast_days, symbol, forecast_mode)
+
+    output = {
+        "symbol": symbol,
+        "current_price": round(float(current_price), 2),
+        "forecast": forecast,
+    }
+
+    print(json.dumps(output))
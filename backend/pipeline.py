@@ -0,0 +1,397 @@
+import contextvars
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from model_lstm import train_and_forecast_lstm, aligned_step
+from model_xgboost import train_and_forecast_xgboost
+from preprocess import download_stock_data, download_stock_data_many, prepare_data, prepare_data_batch
+from features import feature_set
+from config import (
+    FORECAST_MODE, WINDOW_SIZE, PARALLEL_BRANCHES, BATCH_WORKERS, GRAPHS_DIR, GRAPHS_MAX_BYTES, SERVING_MODE,
+    GLOBAL_MODEL_TTL_SECONDS,
+)
+import numpy as np
+from charts import line, line_chart, histogram_chart, save_series
+from timing import stage
+from result_cache import result_cache
+from registry import model_registry
+from ensemble import ensemble_weights, fit_weights, combine, mean_squared_errors
+from intervals import prediction_intervals
+from windowing import validation_split
+
+logger = logging.getLogger(__name__)
+
+
+class NoDataError(Exception):
+    """Raised when the data source has no bars for the requested symbol."""
+
+
+def _lstm_branch(df, forecast_days, symbol, forecast_mode, prepared):
+    _, forecast, predictions, _, _, series, validation = train_and_forecast_lstm(df, forecast_days, symbol, forecast_mode, prepared)
+    step = aligned_step(forecast_mode)
+    return forecast, predictions[:, step], series, validation[:, step]
+
+
+def _xgboost_branch(df, forecast_days, symbol, forecast_mode, prepared):
+    _, forecast, predictions, _, series, validation = train_and_forecast_xgboost(df, forecast_days, symbol, forecast_mode, prepared)
+    return forecast, predictions, series, validation
+
+
+# The base models of the hybrid. Each branch returns (forecast, test predictions lined up
+# with test_targets, graph series, validation predictions lined up with validation_targets);
+# adding a model here adds it to the ensemble.
+BRANCHES = {"lstm": _lstm_branch, "xgboost": _xgboost_branch}
+
+# Label and line colors (forecast graph, comparison graph) of each model in the hybrid graphs
+MODEL_STYLES = {"lstm": ("LSTM", "blue", "orange", "--"), "xgboost": ("XGBoost", "red", "green", ":")}
+
+
+def test_targets(prepared, forecast_mode):
+    """The scaled forecast_days-ahead targets of the test windows and their dates (the models' 80/20 split)."""
+    _, y, _, _, y_dates = prepared
+    split = int(0.8 * len(y))
+    y_test = y[split:, -1] if forecast_mode == "direct" else y[split:]
+    return y_test, y_dates[split:]
+
+
+def validation_targets(prepared, forecast_mode):
+    """The scaled forecast_days-ahead targets of the validation windows, the last training windows (see validation_split)."""
+    _, y, _, _, _ = prepared
+    split = int(0.8 * len(y))
+    y_val = y[validation_split(split):split]
+    return y_val[:, -1] if forecast_mode == "direct" else y_val
+
+
+def weighted_graph_series(y_test_dates, actual, predictions, weighted_forecast, forecasts, weights, intervals=None):
+    """Build the chart specs for weighted predictions using test data (prices, one array per model).
+
+    intervals ([{"date", "p10", "p50", "p90"}]) adds the p10 and p90 bands to the forecast graph.
+    """
+    # Calculate weighted predictions for test data
+    weighted_predictions = combine(predictions, weights)
+
+    logger.debug("Actual shape: %s", actual.shape)
+    logger.debug("Weighted predictions shape: %s", weighted_predictions.shape)
+    logger.debug("y_test_dates length: %d", len(y_test_dates))
+
+    # Extract dates and values for each forecast
+    dates = [item['date'] for item in weighted_forecast]
+    weighted_values = [item['value'] for item in weighted_forecast]
+
+    def style(name):
+        return MODEL_STYLES.get(name, (name, "gray", "gray", "-."))
+
+    return {
+        "actual_vs_predicted_weighted": line_chart("Actual vs Predicted Stock Prices (Weighted Test Data)", y_test_dates, [
+            line("Actual", actual, "blue"),
+            line("Weighted Predicted", weighted_predictions, "red"),
+        ]),
+        "forecasted_prices_weighted": line_chart(f"Forecasted Stock Prices (Weighted, {', '.join(style(name)[0] for name in forecasts)})", dates, [
+            line("Weighted Forecast", weighted_values, "green"),
+            *[line(f"{style(name)[0]} Forecast", [item['value'] for item in forecast], style(name)[1], linestyle="--")
+              for name, forecast in forecasts.items()],
+            *[line(band, [item[band] for item in intervals], "gray", linestyle=":")
+              for band in ("p10", "p90") if intervals],
+        ]),
+        "residuals_histogram_weighted": histogram_chart(
+            "Residuals Histogram (Weighted Test Data)", actual - weighted_predictions
+        ),
+        "comparison_predictions": line_chart(f"Comparison of Predictions (Actual, {', '.join(style(name)[0] for name in predictions)}, Hybrid)", y_test_dates, [
+            line("Actual", actual, "blue", linewidth=2),
+            *[line(f"{style(name)[0]} Predicted", values, style(name)[2], linestyle=style(name)[3])
+              for name, values in predictions.items()],
+            line("Hybrid Predicted", weighted_predictions, "red", linestyle="-"),
+        ], figsize=(12, 8)),
+    }
+
+
+def graph_names(series, names):
+    """Pick the file names of series' charts (as served at /graph/<name>) out of names."""
+    return {name: names[name] for name in series}
+
+
+def iter_model_branches(df, forecast_days, symbol, forecast_mode, prepared, parallel=PARALLEL_BRANCHES, models=None):
+    """Run the branches of models (default: all of BRANCHES), concurrently when parallel is True.
+
+    Both libraries release the GIL while training and predicting, so one thread per
+    branch is enough to overlap them. Yields (model, branch result) as each one finishes.
+    """
+    models = list(models or BRANCHES)
+    if not parallel or len(models) == 1:
+        for name in models:
+            yield name, BRANCHES[name](df, forecast_days, symbol, forecast_mode, prepared)
+        return
+
+    with ThreadPoolExecutor(max_workers=len(models)) as pool:
+        # Run each branch in a copy of the caller's context so its stage timings are recorded
+        futures = {
+            pool.submit(contextvars.copy_context().run, BRANCHES[name], df, forecast_days, symbol, forecast_mode, prepared): name
+            for name in models
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def run_model_branches(df, forecast_days, symbol, forecast_mode, prepared, parallel=PARALLEL_BRANCHES, models=None):
+    """Run the branches of models and return {model: branch result} (see iter_model_branches)."""
+    models = list(models or BRANCHES)
+    results = dict(iter_model_branches(df, forecast_days, symbol, forecast_mode, prepared, parallel, models))
+    return {name: results[name] for name in models}
+
+
+def history_range():
+    """Return the (start_date, end_date) of the price history the models are trained on."""
+    end_date = datetime.today().date()
+    start_date = end_date - timedelta(days=365 * 2)  # 2 years data
+    return start_date, end_date
+
+
+def data_event(symbol, df):
+    """The "data" event of a prediction: what history it runs on."""
+    return {"symbol": symbol, "bars": len(df), "last_bar": str(df.index[-1])[:10]}
+
+
+def run_prediction(symbol, forecast_days=7, forecast_mode=FORECAST_MODE, df=None, prepared=None):
+    """Download data, run the models and combine them into the /predict response.
+
+    df and prepared can be passed in when the caller already loaded and windowed the data.
+    """
+    for event, data in iter_prediction(symbol, forecast_days, forecast_mode, df, prepared):
+        if event == "result":
+            return data
+
+
+def iter_prediction(symbol, forecast_days=7, forecast_mode=FORECAST_MODE, df=None, prepared=None):
+    """run_prediction, yielding (event, data) as the parts of the response become ready.
+
+    Events, in order: "data" (history loaded and windowed), "model" once per model as it
+    finishes ({"model", "forecast", "series"}; the fastest first), "hybrid" (weighted
+    forecast and weights) and "result" (the complete /predict response).
+    """
+    if df is None:
+        start_date, end_date = history_range()
+        df = download_stock_data(symbol.upper(), start_date, end_date)
+
+    if df.empty:
+        raise NoDataError('No data found for this symbol')
+
+    # Window the data once; every model reads the same (read-only) arrays
+    if prepared is None:
+        prepared = prepare_data(
+            df, forecast_days, window_size=WINDOW_SIZE, dtype=np.float32, multi_step=forecast_mode == "direct",
+            features=feature_set(forecast_mode), symbol=symbol,
+        )
+    scaler = prepared[3]
+    current_price = float(df['Close'].iloc[-1])
+    yield "data", data_event(symbol, df)
+
+    # Skip the models that barely counted in this symbol's last fitted weights
+    models = ensemble_weights.active_models(symbol, forecast_days, forecast_mode, BRANCHES)
+    results = {}
+    for name, branch_result in iter_model_branches(df, forecast_days, symbol, forecast_mode, prepared, models=models):
+        results[name] = branch_result
+        yield "model", {"model": name, "forecast": branch_result[0], "series": branch_result[2]}
+    results = {name: results[name] for name in models}
+
+    # Align the test predictions of every model with the test targets
+    y_test, y_test_dates = test_targets(prepared, forecast_mode)
+    min_length = min(len(y_test), *(len(result[1]) for result in results.values()))
+    y_test_dates = y_test_dates[:min_length]
+
+    def prices(values, length=min_length):
+        return scaler.inverse_transform(np.asarray(values, dtype=np.float64)[:length].reshape(-1, 1)).flatten()
+
+    actual = prices(y_test)
+    predictions = {name: prices(result[1]) for name, result in results.items()}
+    forecasts = {name: result[0] for name, result in results.items()}  # Already rounded to cents by each model
+
+    # Weight the models by their error on the validation windows, which no model was fitted on, so
+    # the hybrid's test metrics and residuals stay out of sample; then combine every horizon at once
+    y_val = validation_targets(prepared, forecast_mode)
+    val_length = min(len(y_val), *(len(result[3]) for result in results.values()))
+    actual_val = prices(y_val, val_length)
+    validation = {name: prices(result[3], val_length) for name, result in results.items()}
+    weights = fit_weights(validation, actual_val)
+    errors = mean_squared_errors(validation, actual_val)
+    if symbol and len(models) == len(BRANCHES):
+        ensemble_weights.save(symbol, forecast_days, forecast_mode, weights, errors)
+    logger.debug("Ensemble weights: %s", weights)
+
+    weighted_values = combine({name: [item["value"] for item in forecast] for name, forecast in forecasts.items()}, weights)
+    forecast_dates = [item["date"] for item in forecasts[models[0]]]
+    weighted_forecast = [{"date": date, "value": value} for date, value in zip(forecast_dates, weighted_values.round(2).tolist())]
+
+    logger.debug("Final weighted forecast: %s", weighted_forecast)
+
+    # p10/p50/p90 bands around the weighted forecast
+    interval_method, intervals = prediction_intervals(
+        weighted_forecast, actual, combine(predictions, weights), symbol, forecast_days, forecast_mode, df, prepared
+    )
+    yield "hybrid", {
+        "forecast": weighted_forecast,
+        "weights": {name: round(weight, 4) for name, weight in weights.items()},
+        "intervals": intervals,
+        "interval_method": interval_method,
+    }
+
+    # Collect the series behind the weighted test data graphs
+    with stage("graph_series"):
+        series_weighted = weighted_graph_series(
+            y_test_dates, actual, predictions, weighted_forecast, forecasts, weights, intervals
+        )
+
+        # Keep the series on disk so /graph/<name> can render a PNG if one is asked for
+        all_series = dict(series_weighted)
+        for _, _, series, _ in results.values():
+            all_series.update(series)
+        names = save_series(all_series, GRAPHS_DIR, GRAPHS_MAX_BYTES)
+
+    result = {
+        'symbol': symbol,
+        'current_price': round(current_price, 2),  # Return current price only once
+    }
+    for name in BRANCHES:
+        if name in results:
+            result[name] = {
+                "forecast": forecasts[name],
+                'graphs': graph_names(results[name][2], names),  # Include the model's graph paths
+                'series': results[name][2],  # Data behind each of the model's graphs
+            }
+        else:
+            result[name] = {"forecast": [], "graphs": {}, "series": {}, "dropped": True}
+    result['hybrid'] = {
+        "forecast": weighted_forecast,  # Include weighted forecast
+        "weights": {name: round(weight, 4) for name, weight in weights.items()},
+        "intervals": intervals,  # p10/p50/p90 band per forecast date
+        "interval_method": interval_method,  # "bootstrap" or "quantile"
+        "graphs": graph_names(series_weighted, names),  # Include weighted test graph paths
+        "series": series_weighted,  # Data behind each weighted graph
+    }
+
+    yield "result", result
+
+
+def run_cached_prediction(symbol, forecast_days=7, forecast_mode=FORECAST_MODE):
+    """Like run_prediction, but reuse the response computed for the same request and last bar.
+
+    Concurrent identical requests share one computation.
+    """
+    start_date, end_date = history_range()
+    df = download_stock_data(symbol.upper(), start_date, end_date)
+    if df.empty:
+        raise NoDataError('No data found for this symbol')
+
+    key = result_cache.make_key(symbol, forecast_days, forecast_mode, df.index[-1])
+    return result_cache.get_or_compute(key, lambda: run_prediction(symbol, forecast_days, forecast_mode, df=df))
+
+
+def iter_cached_prediction(symbol, forecast_days=7, forecast_mode=FORECAST_MODE, df=None):
+    """iter_prediction in front of the result cache: a cached response is a single "result" event.
+
+    A response computed here is added to the cache.
+    """
+    if df is None:
+        start_date, end_date = history_range()
+        df = download_stock_data(symbol.upper(), start_date, end_date)
+    if df.empty:
+        raise NoDataError('No data found for this symbol')
+
+    key = result_cache.make_key(symbol, forecast_days, forecast_mode, df.index[-1])
+    result = result_cache.get(key)
+    if result is not None:
+        yield "data", data_event(symbol, df)
+        yield "result", result
+        return
+
+    for event, data in iter_prediction(symbol, forecast_days, forecast_mode, df=df):
+        if event == "result":
+            result_cache.put(key, data)
+        yield event, data
+
+
+_batch_executor = None
+
+
+def _get_batch_executor():
+    global _batch_executor
+    if _batch_executor is None:
+        # Spawn fresh workers rather than forking a process that may already run TensorFlow threads
+        _batch_executor = ProcessPoolExecutor(
+            max_workers=BATCH_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _batch_executor
+
+
+def shutdown_batch_executor():
+    """Stop the /predict/batch worker processes, letting the symbols they are running finish."""
+    global _batch_executor
+    executor, _batch_executor = _batch_executor, None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def model_loader(kind):
+    """(load_model, ttl_seconds) that the serving code reads a registry kind with."""
+    from lite_models import load_lite_lstm
+    from model_lstm import load_lstm_model
+    from model_xgboost import load_xgboost_model
+
+    ttl_seconds = GLOBAL_MODEL_TTL_SECONDS if kind.endswith("-global") else None
+    if kind.startswith("lstm"):
+        return (load_lite_lstm if SERVING_MODE == "lite" else load_lstm_model), ttl_seconds
+    return load_xgboost_model, ttl_seconds
+
+
+def preload_models(limit):
+    """Load the limit most recently trained models into this process's registry cache."""
+    return model_registry.warm(limit, model_loader)
+
+
+def run_batch_prediction(symbols, forecast_days=7, forecast_mode=FORECAST_MODE):
+    """Predict several symbols, yielding one result dict per symbol as soon as it is ready.
+
+    All symbols are loaded with one bulk download and windowed in one vectorized pass;
+    the models for each symbol are then trained/run in parallel worker processes.
+    Failed symbols yield {"symbol": ..., "error": ...}.
+    """
+    start_date, end_date = history_range()
+    frames = download_stock_data_many(symbols, start_date, end_date)
+
+    for symbol in [symbol for symbol, df in frames.items() if df.empty]:
+        del frames[symbol]
+        yield {"symbol": symbol, "error": "No data found for this symbol"}
+
+    features = feature_set(forecast_mode)
+    prepared = {}
+    if features == "close":
+        try:
+            prepared = prepare_data_batch(
+                frames, forecast_days, window_size=WINDOW_SIZE, dtype=np.float32, multi_step=forecast_mode == "direct"
+            )
+        except ValueError:
+            pass  # Some symbol has too little history; window them one by one below
+
+    # Window one by one what could not be windowed together (indicators are cached per symbol)
+    for symbol, df in list(frames.items()):
+        if symbol in prepared:
+            continue
+        try:
+            prepared[symbol] = prepare_data(
+                df, forecast_days, window_size=WINDOW_SIZE, dtype=np.float32, multi_step=forecast_mode == "direct",
+                features=features, symbol=symbol,
+            )
+        except ValueError as e:
+            del frames[symbol]
+            yield {"symbol": symbol, "error": str(e)}
+
+    executor = _get_batch_executor()
+    futures = {
+        executor.submit(run_prediction, symbol, forecast_days, forecast_mode, frames[symbol], prepared[symbol]): symbol
+        for symbol in frames
+    }
+    for future in as_completed(futures):
+        try:
+            yield future.result()
+        except Exception as e:
+            yield {"symbol": futures[future], "error": str(e)}
@@ -0,0 +1,26 @@
+from config import PRECOMPUTED_DIR, PRECOMPUTED_TTL_SECONDS
+from json_store import JsonStore
+
+
+class PrecomputedResults(JsonStore):
+    """/predict responses computed ahead of time (e.g. by the nightly scheduler), one JSON file each."""
+
+    stamp_field = "computed_at"
+
+    def __init__(self, root=PRECOMPUTED_DIR, ttl_seconds=PRECOMPUTED_TTL_SECONDS):
+        super().__init__(root, ttl_seconds)
+
+    def save(self, symbol, forecast_days, forecast_mode, result):
+        """Store the /predict response for symbol, written atomically."""
+        super().save(symbol, forecast_days, forecast_mode, {"result": result})
+
+    def get(self, symbol, forecast_days, forecast_mode):
+        """Return the stored /predict response for symbol if it is fresh, otherwise None."""
+        stored = super().get(symbol, forecast_days, forecast_mode)
+        return stored["result"] if stored is not None else None
+
+    def is_fresh(self, symbol, forecast_days, forecast_mode):
+        return self.get(symbol, forecast_days, forecast_mode) is not None
+
+
+precomputed_results = PrecomputedResults()
@@ -1,38 +1,121 @@
+import logging
+from collections import defaultdict
 import numpy as np
-import yfinance as yf
 import pandas as pd
-from sklearn.preprocessing import MinMaxScaler, StandardScaler
+from numpy.lib.stride_tricks import sliding_window_view
+from sklearn.preprocessing import MinMaxScaler
+from data_store import ohlcv_store
+from features import feature_matrix
+from windowing import sliding_windows
+from timing import stage
+
+logger = logging.getLogger(__name__)
 
 def download_stock_data(symbol: str, start_date, end_date):
-    # Download historical stock data from Yahoo Finance
+    # Load historical stock data from the local store, fetching only missing days
     symbol = symbol.upper()
-    df = yf.download(symbol, start=start_date, end=end_date, progress=False)
+    with stage("load"):
+        df = ohlcv_store.load(symbol, start_date, end_date)
     return df
 
-def prepare_data(df: pd.DataFrame, forecast_days: int = 7, window_size=60):
-    # Scale the 'Close' price and prepare the data for LSTM
-    df = df[['Close']].copy()
+def download_stock_data_many(symbols, start_date, end_date):
+    # Load several symbols at once; missing days for all of them come from one bulk download
+    with stage("load"):
+        return ohlcv_store.load_many(symbols, start_date, end_date)
+
+def _select_samples(X, Y, series, index, forecast_days, window_size, multi_step):
+    """Turn the raw windows of one symbol into prepare_data's (X, y, X_forecast, y_dates)."""
+    # Keep the sample count of the original loop, which stopped one window short of the end
+    n_samples = len(X) - 1
+    X = X[:n_samples, :, np.newaxis]
+    # y holds the price forecast_days ahead; with multi_step=True it holds every
+    # horizon from 1 to forecast_days (the last column is the single-step y)
+    y = Y[:n_samples] if multi_step else Y[:n_samples, -1]
+    y_dates = index[window_size + forecast_days - 1:window_size + forecast_days - 1 + n_samples]
+
+    X_forecast = series[-window_size:].reshape(1, window_size, 1)
+    return X, y, X_forecast, y_dates
+
+def prepare_data(df: pd.DataFrame, forecast_days: int = 7, window_size=60, dtype=np.float64, multi_step=False, features="close", symbol=None):
+    # Scale the 'Close' price and prepare the data for LSTM.
+    # features="technical" adds the indicators of features.py as further input columns
+    # (cached per symbol when one is given); the targets stay the scaled close.
+    with stage("prepare_data"):
+        if features == "technical":
+            return _prepare_features(df, forecast_days, window_size, dtype, multi_step, symbol)
+        return _prepare_data(df, forecast_days, window_size, dtype, multi_step)
+
+def _prepare_features(df, forecast_days, window_size, dtype, multi_step, symbol):
+    series, scaler = scale_close(df, dtype)
+    _, y, _, y_dates = window_series(series, df.index, forecast_days, window_size, multi_step)
+
+    # Standardize the indicators with the bars the training windows (the models' 80/20 split) take as inputs
+    train_rows = int(0.8 * len(y)) + window_size - 1
+
+    # One (bars, 1 + indicators) matrix; its windows are read-only (samples, window_size, columns)
+    # views, which XGBoost can also flatten to (samples, window_size * columns) without a copy
+    inputs = np.ascontiguousarray(
+        np.column_stack([series, feature_matrix(df, symbol, dtype, train_rows)]), dtype=dtype
+    )
+    X = sliding_window_view(inputs, window_size, axis=0).transpose(0, 2, 1)[:len(y)]
+    X_forecast = inputs[-window_size:][np.newaxis]
+    return X, y, X_forecast, scaler, y_dates
+
+def scale_close(df, dtype=np.float64):
+    # Scale the 'Close' price to [0, 1]; returns (series, scaler)
     scaler = MinMaxScaler()
-    scaled_data = scaler.fit_transform(df)
+    scaled_data = scaler.fit_transform(df[['Close']])
+    return scaled_data[:, 0].astype(dtype, copy=False), scaler
+
+def window_series(series, index, forecast_days, window_size, multi_step):
+    # prepare_data's (X, y, X_forecast, y_dates) for an already scaled series.
+    # Windows are read-only views over series (pass a float32 series to hand Keras and
+    # XGBoost their native dtype without a further copy)
+    X, Y = sliding_windows(series, window_size, horizon=forecast_days)
+    return _select_samples(X, Y, series, index, forecast_days, window_size, multi_step)
+
+def _prepare_data(df, forecast_days, window_size, dtype, multi_step):
+    df = df[['Close']].copy()
+    series, scaler = scale_close(df, dtype)
+    X, y, X_forecast, y_dates = window_series(series, df.index, forecast_days, window_size, multi_step)
+
+    # Debugging: log X, y, y_dates, and df (formatting the frame is slow, so only at DEBUG level)
+    logger.debug("Dataframe (df):\n%s", df)
+    logger.debug("Length of df: %d", len(df))
+    logger.debug("X shape: %s", X.shape)
+    logger.debug("y shape: %s", y.shape)
+    logger.debug("y_dates length: %d", len(y_dates))
+    logger.debug("y_dates: %s", y_dates)
+
+    return X, y, X_forecast, scaler, y_dates
 
-    X, y, y_dates = [], [], []
-    for i in range(window_size, len(scaled_data) - forecast_days):
-        X.append(scaled_data[i - window_size:i, 0])
-        y.append(scaled_data[i + forecast_days - 1, 0])
-        y_dates.append(df.index[i + forecast_days - 1])  # Capture the corresponding date for y
+def prepare_data_batch(frames, forecast_days: int = 7, window_size=60, dtype=np.float64, multi_step=False):
+    # prepare_data for several symbols at once: {symbol: df} -> {symbol: prepare_data output}.
+    # Symbols with the same number of bars are scaled and windowed together in one vectorized pass.
+    with stage("prepare_data"):
+        return _prepare_data_batch(frames, forecast_days, window_size, dtype, multi_step)
 
-    X, y = np.array(X), np.array(y)
-    X = X.reshape((X.shape[0], X.shape[1], 1))
+def _prepare_data_batch(frames, forecast_days, window_size, dtype, multi_step):
+    groups = defaultdict(list)
+    for symbol, df in frames.items():
+        groups[len(df)].append(symbol)
 
-    X_forecast = scaled_data[-window_size:].reshape(1, window_size, 1)
+    prepared = {}
+    for symbols in groups.values():
+        closes = np.stack([frames[symbol]['Close'].to_numpy(dtype=np.float64) for symbol in symbols])
 
-    # Debugging: Print X, y, y_dates, and df
-    print("Dataframe (df):")
-    print(df)
-    print("Length of df:", len(df))
-    print("\nX shape:", X.shape)
-    print("y shape:", y.shape)
-    print("y_dates length:", len(y_dates))
-    print("y_dates:", y_dates)
+        # Same arithmetic as MinMaxScaler.fit_transform, one row per symbol
+        data_min = closes.min(axis=1, keepdims=True)
+        data_max = closes.max(axis=1, keepdims=True)
+        data_range = np.where(data_max > data_min, data_max - data_min, 1.0)
+        scale = 1.0 / data_range
+        scaled = (closes * scale - data_min * scale).astype(dtype, copy=False)
 
-    return X, y, X_forecast, scaler, y_dates
\ No newline at end of file
+        X, Y = sliding_windows(scaled, window_size, horizon=forecast_days)
+        for i, symbol in enumerate(symbols):
+            scaler = MinMaxScaler().fit(np.array([data_min[i], data_max[i]]))
+            X_i, y_i, X_forecast, y_dates = _select_samples(
+                X[i], Y[i], scaled[i], frames[symbol].index, forecast_days, window_size, multi_step
+            )
+            prepared[symbol] = (X_i, y_i, X_forecast, scaler, y_dates)
+    return prepared
\ No newline at end of file
@@ -0,0 +1,187 @@
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+import joblib
+
+from config import MODEL_DIR, MODEL_TTL_SECONDS, MODEL_CACHE_SIZE, MODEL_KEEP_VERSIONS
+from metrics import MODEL_SIZE_BYTES, record_cache
+from utils import ensure_directory_exists, write_atomic
+
+
+def directory_size(directory):
+    """Total size in bytes of the files under directory."""
+    return sum(
+        os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(directory) for name in names
+    )
+
+
+class ModelNotAvailableError(Exception):
+    """Raised when serving needs a stored model that does not exist (and cannot be trained)."""
+
+
+class ModelRegistry:
+    """Persist trained models and their scalers on disk, with an LRU cache of loaded copies."""
+
+    def __init__(self, root=MODEL_DIR, ttl_seconds=MODEL_TTL_SECONDS, max_in_memory=MODEL_CACHE_SIZE,
+                 keep_versions=MODEL_KEEP_VERSIONS):
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+        self.max_in_memory = max_in_memory
+        self.keep_versions = keep_versions
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(kind, symbol, forecast_days, window_size, end_date):
+        """Build the registry key for a model trained on data ending at end_date."""
+        end_date = str(end_date)[:10]
+        return f"{symbol.upper()}_{kind}_{forecast_days}d_w{window_size}_{end_date}"
+
+    def _entry_dir(self, key):
+        return os.path.join(self.root, key)
+
+    def _dates(self, prefix):
+        """End dates of the stored entries whose keys are prefix (a key without its date) plus a date."""
+        if not os.path.isdir(self.root):
+            return []
+        # Entry directories end in a YYYY-MM-DD date (temporary directories are longer)
+        return [
+            name[len(prefix):] for name in os.listdir(self.root)
+            if name.startswith(prefix) and len(name) == len(prefix) + 10
+        ]
+
+    def _is_stale(self, meta, ttl_seconds=None):
+        ttl_seconds = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        return time.time() - meta.get("created_at", 0) > ttl_seconds
+
+    def get(self, key, load_model, ttl_seconds=None):
+        """Return {"model", "scaler", "meta"} for key, or None if it is missing or stale.
+
+        load_model(directory) is called to read the model back from disk on a memory miss.
+        ttl_seconds overrides the registry's TTL for this lookup.
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._is_stale(entry["meta"], ttl_seconds):
+                    self._memory.move_to_end(key)
+                    record_cache("model_memory", hit=True)
+                    record_cache("model", hit=True)
+                    return entry
+                del self._memory[key]
+        record_cache("model_memory", hit=False)
+
+        entry_dir = self._entry_dir(key)
+        meta_path = os.path.join(entry_dir, "meta.json")
+        if not os.path.exists(meta_path):
+            record_cache("model", hit=False)
+            return None
+
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if self._is_stale(meta, ttl_seconds):
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            record_cache("model", hit=False)
+            return None
+        record_cache("model", hit=True)
+
+        entry = {
+            "model": load_model(entry_dir),
+            "scaler": joblib.load(os.path.join(entry_dir, "scaler.joblib")),
+            "meta": meta,
+        }
+        self._remember(key, entry)
+        return entry
+
+    def latest(self, kind, symbol, forecast_days, window_size, before, load_model, ttl_seconds=None):
+        """Return (key, entry) of the newest model of the same setup trained on data ending before `before`.
+
+        Returns (None, None) when there is no such model or the newest one is stale.
+        """
+        prefix = self.make_key(kind, symbol, forecast_days, window_size, "")
+        before = str(before)[:10]
+        dates = [date for date in self._dates(prefix) if date < before]
+        if not dates:
+            return None, None
+        key = prefix + max(dates)
+        entry = self.get(key, load_model, ttl_seconds)
+        return (key, entry) if entry is not None else (None, None)
+
+    def put(self, key, model, scaler, save_model, meta=None):
+        """Save model, scaler and metadata under key.
+
+        save_model(model, directory) writes the model files. The entry is written to a
+        temporary directory first and then moved into place, so readers never see a
+        half-written model. Keys end in the last bar's date, so every new bar adds an
+        entry; only the keep_versions newest of the same setup are kept.
+        """
+        meta = dict(meta or {})
+        meta["created_at"] = time.time()
+
+        def write(tmp_dir):
+            save_model(model, tmp_dir)
+            joblib.dump(scaler, os.path.join(tmp_dir, "scaler.joblib"))
+            with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+                json.dump(meta, f)
+            MODEL_SIZE_BYTES.observe(directory_size(tmp_dir), kind=key.rsplit("_", 4)[1])
+
+        ensure_directory_exists(self.root)
+        write_atomic(self._entry_dir(key), write, directory=True)
+        self._prune(key)
+
+        entry = {"model": model, "scaler": scaler, "meta": meta}
+        self._remember(key, entry)
+        return entry
+
+    def _prune(self, key):
+        """Delete all but the keep_versions newest entries of key's setup (latest() updates from the one before)."""
+        if self.keep_versions <= 0:
+            return
+        prefix = key[:-10]
+        for date in sorted(self._dates(prefix))[:-self.keep_versions]:
+            shutil.rmtree(self._entry_dir(prefix + date), ignore_errors=True)
+            with self._lock:
+                self._memory.pop(prefix + date, None)
+
+    def warm(self, limit, loader):
+        """Load the limit most recently stored fresh models into memory; returns their keys.
+
+        loader(kind) gives the (load_model, ttl_seconds) to read a model of that kind with;
+        stale entries are skipped (and left on disk).
+        """
+        if limit <= 0 or not os.path.isdir(self.root):
+            return []
+        entries = []
+        for name in os.listdir(self.root):
+            meta_path = os.path.join(self._entry_dir(name), "meta.json")
+            if ".tmp-" not in name and os.path.exists(meta_path):
+                with open(meta_path) as f:
+                    entries.append((json.load(f), name))
+
+        keys = []
+        for meta, key in sorted(entries, key=lambda item: item[0].get("created_at", 0), reverse=True):
+            if len(keys) >= min(limit, self.max_in_memory):
+                break
+            load_model, ttl_seconds = loader(key.rsplit("_", 4)[1])
+            if self._is_stale(meta, ttl_seconds):
+                continue
+            try:
+                if self.get(key, load_model, ttl_seconds) is not None:
+                    keys.append(key)
+            except FileNotFoundError:
+                pass  # Stored before the lite LSTM weights were exported
+        return keys
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_in_memory:
+                self._memory.popitem(last=False)
+
+
+model_registry = ModelRegistry()
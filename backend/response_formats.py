@@ -0,0 +1,130 @@
+import io
+import json
+
+import numpy as np
+
+# Media types the prediction endpoints can answer with (see negotiate)
+JSON = "application/json"
+COLUMNAR_JSON = "application/vnd.forecast.columnar+json"
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+FORMATS = [JSON, COLUMNAR_JSON, ARROW_STREAM]
+
+# Model sections of a /predict response, and the forecast columns of the columnar formats
+MODELS = ["lstm", "xgboost", "hybrid"]
+BANDS = ["p10", "p50", "p90"]
+
+
+def negotiate(accept_mimetypes):
+    """The format to answer a request with, from its Accept header (JSON unless another one is asked for)."""
+    return accept_mimetypes.best_match(FORMATS, default=JSON)
+
+
+def values(items, key="value"):
+    """The key of every item in a list of dicts as a float64 array, without a list in between."""
+    return np.fromiter((item[key] for item in items), np.float64, len(items))
+
+
+def columns(result):
+    """The forecasts of a /predict response as ({"date", model..., band...}, response-level fields).
+
+    The columns are NumPy arrays, except for the date strings; dropped models have no column.
+    """
+    hybrid = result["hybrid"]
+    forecast = hybrid["forecast"]
+    data = {"date": [item["date"] for item in forecast]}
+    for name in MODELS:
+        if result[name]["forecast"]:
+            data[name] = values(result[name]["forecast"])
+    for band in BANDS:
+        data[band] = values(hybrid["intervals"], band)
+
+    fields = {
+        "symbol": result["symbol"],
+        "current_price": result["current_price"],
+        "weights": hybrid["weights"],
+        "interval_method": hybrid["interval_method"],
+        "graphs": {name: result[name]["graphs"] for name in MODELS},
+    }
+    if "timings_ms" in result:
+        fields["timings_ms"] = result["timings_ms"]
+    return data, fields
+
+
+def columnar_json(result):
+    """A /predict response in the columnar JSON layout: one dates array and one array per model and band.
+
+    The graph series are left out; the graphs themselves stay available through /graph/<name>.
+    Error results ({"symbol", "error"}) are returned unchanged.
+    """
+    if "error" in result:
+        return result
+    data, fields = columns(result)
+    dates = data.pop("date")
+    return {
+        **fields,
+        "dates": dates,
+        "forecast": {name: data[name].tolist() for name in MODELS if name in data},
+        "intervals": {band: data[band].tolist() for band in BANDS},
+    }
+
+
+def arrow_schema():
+    import pyarrow as pa
+
+    return pa.schema([("date", pa.date32())] + [(name, pa.float64()) for name in MODELS + BANDS])
+
+
+def arrow_batch(result):
+    """One Arrow record batch of a /predict response (one row per forecast date) and its metadata.
+
+    The response-level fields (or the error of a failed symbol, with no rows) travel as the
+    batch's custom metadata, JSON-encoded under the "response" key.
+    """
+    import pyarrow as pa
+
+    schema = arrow_schema()
+    if "error" in result:
+        return pa.RecordBatch.from_pylist([], schema), {"response": json.dumps(result)}
+
+    data, fields = columns(result)
+    rows = len(data["date"])
+    arrays = [pa.array([date[:10] for date in data["date"]]).cast(pa.date32())]
+    # Float columns are handed to Arrow as they are; a dropped model is an all-null column
+    arrays += [pa.array(data[name]) if name in data else pa.nulls(rows, pa.float64()) for name in MODELS + BANDS]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema), {"response": json.dumps(fields)}
+
+
+class ArrowStream:
+    """Writes /predict responses as an Arrow IPC stream, one record batch per response.
+
+    Each write returns the bytes to send; the first one also carries the schema.
+    """
+
+    def __init__(self):
+        import pyarrow as pa
+
+        self._sink = io.BytesIO()
+        self._writer = pa.ipc.new_stream(self._sink, arrow_schema())
+
+    def _flush(self):
+        chunk = self._sink.getvalue()
+        self._sink.seek(0)
+        self._sink.truncate()
+        return chunk
+
+    def write(self, result):
+        batch, metadata = arrow_batch(result)
+        self._writer.write_batch(batch, custom_metadata=metadata)
+        return self._flush()
+
+    def close(self):
+        self._writer.close()
+        return self._flush()
+
+
+def encode(result, media_type):
+    """The body of a /predict response in media_type (one of FORMATS)."""
+    if media_type == ARROW_STREAM:
+        stream = ArrowStream()
+        return stream.write(result) + stream.close()
+    return json.dumps(columnar_json(result) if media_type == COLUMNAR_JSON else result)
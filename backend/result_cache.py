@@ -0,0 +1,127 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from config import RESULT_CACHE_SIZE, RESULT_CACHE_DIR
+from metrics import record_cache
+from utils import ensure_directory_exists, write_atomic
+
+
+class ResultCache:
+    """/predict responses keyed by (symbol, forecast_days, forecast_mode, last bar date).
+
+    A new bar changes the key, so cached responses never outlive the data they were
+    computed from. Responses are kept in a bounded in-memory LRU and, when a directory
+    is given, on disk (shared between processes and kept across restarts). Concurrent
+    requests for the same key wait for a single computation.
+    """
+
+    def __init__(self, max_in_memory=RESULT_CACHE_SIZE, directory=RESULT_CACHE_DIR):
+        self.max_in_memory = max_in_memory
+        self.directory = directory
+        self._memory = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(symbol, forecast_days, forecast_mode, last_bar_date):
+        return f"{symbol.upper()}_{forecast_mode}_{forecast_days}d_{str(last_bar_date)[:10]}"
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _read_disk(self, key):
+        if not self.directory:
+            return None
+        path = self._path(key)
+        hit = os.path.exists(path)
+        record_cache("result_disk", hit)
+        if not hit:
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def _write_disk(self, key, result):
+        ensure_directory_exists(self.directory)
+
+        def write(tmp_path):
+            with open(tmp_path, "w") as f:
+                json.dump(result, f)
+
+        write_atomic(self._path(key), write)
+
+        # Drop the responses for earlier bars of the same request, they can no longer be hit
+        prefix = key.rsplit("_", 1)[0] + "_"
+        for name in os.listdir(self.directory):
+            if name.startswith(prefix) and name.endswith(".json") and name != f"{key}.json":
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass  # Already removed by another process
+
+    def _remember(self, key, result):
+        with self._lock:
+            self._memory[key] = result
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_in_memory:
+                self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Return the cached response for key (from memory or disk), or None."""
+        with self._lock:
+            result = self._memory.get(key)
+            if result is not None:
+                self._memory.move_to_end(key)
+        if result is None:
+            result = self._read_disk(key)
+            if result is not None:
+                self._remember(key, result)
+        record_cache("result", result is not None)
+        return result
+
+    def put(self, key, result):
+        """Cache a response computed outside get_or_compute."""
+        if self.directory:
+            self._write_disk(key, result)
+        self._remember(key, result)
+
+    def get_or_compute(self, key, compute):
+        """Return the cached response for key, or compute() it once for all concurrent callers."""
+        with self._lock:
+            result = self._memory.get(key)
+            if result is not None:
+                self._memory.move_to_end(key)
+                record_cache("result", True)
+                return result
+
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+
+        if not leader:
+            # An identical request is already computing this response; share its outcome
+            record_cache("result", True)
+            return future.result()
+
+        try:
+            result = self._read_disk(key)
+            record_cache("result", result is not None)
+            if result is None:
+                result = compute()
+                if self.directory:
+                    self._write_disk(key, result)
+            self._remember(key, result)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+
+result_cache = ResultCache()
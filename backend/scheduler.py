@@ -0,0 +1,149 @@
+"""Pre-train models and precompute /predict responses for a universe of symbols.
+
+Meant to run off-peak (e.g. nightly from cron, from the backend directory so it shares
+the server's models, data and graphs):
+
+    python scheduler.py --universe universe.txt --forecast-days 7 14 30
+
+The universe file lists one symbol per line (blank lines and # comments are ignored).
+Work is spread over a process pool; results still fresh from an earlier run are skipped,
+so an interrupted run can simply be started again. A JSON report with per-symbol
+timings is rewritten after every finished symbol.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from config import FORECAST_MODE, UNIVERSE_FILE, PRETRAIN_FORECAST_DAYS, PRETRAIN_WORKERS
+from precomputed import precomputed_results
+from preprocess import download_stock_data_many
+from utils import write_atomic
+
+
+def read_universe(path):
+    """Return the symbols listed in path, upper-cased and without duplicates."""
+    symbols = []
+    with open(path) as f:
+        for line in f:
+            symbol = line.split("#", 1)[0].strip().upper()
+            if symbol and symbol not in symbols:
+                symbols.append(symbol)
+    return symbols
+
+
+def _pretrain(symbol, forecast_days, forecast_mode, df):
+    """Run one prediction in a worker process and store it; returns its stage timings in ms."""
+    from pipeline import run_prediction
+    from timing import record_timings
+
+    with record_timings() as timings:
+        result = run_prediction(symbol, forecast_days, forecast_mode, df=df)
+    precomputed_results.save(symbol, forecast_days, forecast_mode, result)
+    return {name: round(seconds * 1000, 1) for name, seconds in timings.items()}
+
+
+def write_report(path, report):
+    def write(tmp_path):
+        with open(tmp_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+    write_atomic(path, write)
+
+
+def run(symbols, forecast_days_list, forecast_mode, workers, report_path, force=False):
+    """Precompute every (symbol, forecast_days) pair and return the report."""
+    from pipeline import history_range
+
+    report = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "finished_at": None,
+        "forecast_mode": forecast_mode,
+        "workers": workers,
+        "items": [],
+    }
+
+    def add_item(symbol, forecast_days, status, seconds=None, timings_ms=None, error=None):
+        report["items"].append({
+            "symbol": symbol, "forecast_days": forecast_days, "status": status,
+            "seconds": round(seconds, 2) if seconds is not None else None,
+            "timings_ms": timings_ms, "error": error,
+        })
+        write_report(report_path, report)
+
+    # Resume: skip whatever an earlier (possibly interrupted) run already stored
+    work = []
+    for symbol in symbols:
+        for forecast_days in forecast_days_list:
+            if not force and precomputed_results.is_fresh(symbol, forecast_days, forecast_mode):
+                add_item(symbol, forecast_days, "skipped")
+            else:
+                work.append((symbol, forecast_days))
+
+    # One bulk download for every symbol that still has work
+    start_date, end_date = history_range()
+    frames = download_stock_data_many(sorted({symbol for symbol, _ in work}), start_date, end_date) if work else {}
+
+    # Spawn fresh workers rather than forking a process that may already run TensorFlow threads
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        futures = {}
+        for symbol, forecast_days in work:
+            if frames[symbol].empty:
+                add_item(symbol, forecast_days, "failed", error="No data found for this symbol")
+                continue
+            future = executor.submit(_pretrain, symbol, forecast_days, forecast_mode, frames[symbol])
+            futures[future] = (symbol, forecast_days, time.perf_counter())
+
+        for future in as_completed(futures):
+            symbol, forecast_days, submitted_at = futures[future]
+            seconds = time.perf_counter() - submitted_at
+            try:
+                add_item(symbol, forecast_days, "done", seconds, future.result())
+                print(f"{symbol} {forecast_days}d done in {seconds:.1f} s")
+            except Exception as e:
+                add_item(symbol, forecast_days, "failed", seconds, error=str(e) or type(e).__name__)
+                print(f"{symbol} {forecast_days}d failed: {e}")
+    finally:
+        # On Ctrl-C, drop the queued work; the next run picks it up again
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    report["finished_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    write_report(report_path, report)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--universe", default=UNIVERSE_FILE, help="file with one symbol per line")
+    parser.add_argument("--forecast-days", type=int, nargs="+", default=PRETRAIN_FORECAST_DAYS)
+    parser.add_argument("--mode", default=FORECAST_MODE, choices=["direct", "recursive"])
+    parser.add_argument("--workers", type=int, default=PRETRAIN_WORKERS)
+    parser.add_argument("--report", default="pretrain-report.json", help="where to write the JSON report")
+    parser.add_argument("--force", action="store_true", help="recompute results that are still fresh")
+    args = parser.parse_args()
+
+    # Split the cores between the workers (each runs both model branches); set before the
+    # pool is created so the spawned workers pick it up, unless configured explicitly
+    threads = str(max(1, (os.cpu_count() or 1) // args.workers // 2))
+    for name in ("TF_INTRA_OP_THREADS", "XGB_N_JOBS"):
+        os.environ.setdefault(name, threads)
+    os.environ.setdefault("TF_INTER_OP_THREADS", "1")
+
+    symbols = read_universe(args.universe)
+    print(f"Precomputing {len(symbols)} symbols x {len(args.forecast_days)} forecast lengths with {args.workers} workers")
+    report = run(symbols, args.forecast_days, args.mode, args.workers, args.report, args.force)
+
+    counts = {}
+    for item in report["items"]:
+        counts[item["status"]] = counts.get(item["status"], 0) + 1
+    print("Finished:", ", ".join(f"{count} {status}" for status, count in sorted(counts.items())))
+    print("Report written to", args.report)
+    sys.exit(1 if counts.get("failed") else 0)
+
+
+if __name__ == "__main__":
+    main()
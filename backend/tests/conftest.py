@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+
+# Run against the backend modules, with every directory they write to in a scratch location
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+_scratch = tempfile.mkdtemp(prefix="backend-tests-")
+for name in ("MODEL_DIR", "GRAPHS_DIR", "DATA_DIR", "PRECOMPUTED_DIR"):
+    os.environ.setdefault(name, os.path.join(_scratch, name.lower()))
+os.environ.setdefault("PARALLEL_BRANCHES", "0")
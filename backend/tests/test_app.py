@@ -0,0 +1,45 @@
+import os
+
+import pytest
+
+from app import app
+from charts import line, line_chart, save_series, split_graph_name
+from config import GRAPHS_DIR
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+@pytest.fixture
+def graph_name():
+    spec = line_chart("Forecast", ["2024-03-01", "2024-03-04"], [line("Hybrid", [101.5, 102.0], "green")])
+    return save_series({"forecast_test": spec}, os.path.join(os.getcwd(), GRAPHS_DIR))["forecast_test"]
+
+
+def test_graph_is_rendered_with_a_strong_etag(client, graph_name):
+    response = client.get(f"/graph/{graph_name}")
+
+    assert response.status_code == 200
+    assert response.mimetype == "image/png"
+    assert response.get_data().startswith(b"\x89PNG")
+    assert response.get_etag() == (split_graph_name(graph_name)[1], False)
+    assert response.cache_control.immutable
+
+
+def test_matching_etag_gets_304(client, graph_name):
+    etag = split_graph_name(graph_name)[1]
+    response = client.get(f"/graph/{graph_name}", headers={"If-None-Match": f'"{etag}"'})
+
+    assert response.status_code == 304
+    assert response.get_data() == b""
+    assert response.get_etag() == (etag, False)
+
+    response = client.get(f"/graph/{graph_name}", headers={"If-None-Match": '"0000000000000000"'})
+    assert response.status_code == 200
+
+
+def test_unknown_graphs_are_404(client):
+    assert client.get("/graph/forecast_test-0123456789abcdef.png").status_code == 404
+    assert client.get("/graph/forecast_test.png").status_code == 404
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+
+from data_store import OHLCVStore, OHLCV_COLUMNS
+
+
+class FakeSource:
+    """Serves the bars of one frame and records every fetch."""
+
+    def __init__(self, bars):
+        self.bars = bars
+        self.fetches = []
+
+    def fetch(self, symbol, start_date, end_date):
+        self.fetches.append((pd.Timestamp(start_date), pd.Timestamp(end_date)))
+        return self.bars[(self.bars.index >= start_date) & (self.bars.index < end_date)]
+
+    def fetch_many(self, symbols, start_date, end_date):
+        return {symbol: self.fetch(symbol, start_date, end_date) for symbol in symbols}
+
+
+def bars(start="2024-01-01", end="2024-06-28"):
+    index = pd.bdate_range(start, end, name="Date")
+    values = np.arange(len(index), dtype=float)
+    return pd.DataFrame({column: values for column in OHLCV_COLUMNS}, index=index)
+
+
+def store(tmp_path, source, refresh_seconds=3600):
+    return OHLCVStore(root=str(tmp_path), source=source, refresh_seconds=refresh_seconds)
+
+
+def test_plan_fetches_everything_for_a_new_symbol(tmp_path):
+    start, end = pd.Timestamp("2024-02-01"), pd.Timestamp("2024-03-01")
+    state, ranges = store(tmp_path, FakeSource(bars()))._plan("AAPL", start, end)
+
+    assert ranges == [(start, end)]
+    assert state["cached"].empty
+    assert (state["covered_from"], state["covered_to"]) == (start, end)
+
+
+def test_merge_records_coverage_and_the_next_plan_needs_nothing(tmp_path):
+    source = FakeSource(bars())
+    ohlcv = store(tmp_path, source)
+    start, end = pd.Timestamp("2024-02-01"), pd.Timestamp("2024-03-01")
+
+    state, ranges = ohlcv._plan("AAPL", start, end)
+    merged = ohlcv._merge("AAPL", state, [source.fetch("AAPL", *ranges[0])])
+    assert merged.index[0] == pd.Timestamp("2024-02-01") and merged.index[-1] == pd.Timestamp("2024-02-29")
+
+    # Within the covered range (and refresh_seconds) nothing is fetched again
+    state, ranges = ohlcv._plan("AAPL", start, end)
+    assert ranges == []
+    pd.testing.assert_frame_equal(state["cached"], merged, check_freq=False)
+
+
+def test_plan_only_fetches_the_missing_ends(tmp_path):
+    source = FakeSource(bars())
+    ohlcv = store(tmp_path, source, refresh_seconds=0)
+    ohlcv.load("AAPL", "2024-02-01", "2024-03-01")
+
+    state, ranges = ohlcv._plan("AAPL", pd.Timestamp("2024-01-15"), pd.Timestamp("2024-04-01"))
+    # History before the first stored bar, and the days after the last one
+    assert ranges == [
+        (pd.Timestamp("2024-01-15"), pd.Timestamp("2024-02-01")),
+        (pd.Timestamp("2024-03-01"), pd.Timestamp("2024-04-01")),
+    ]
+
+    merged = ohlcv._merge("AAPL", state, [source.fetch("AAPL", *r) for r in ranges])
+    assert merged.index.is_monotonic_increasing and not merged.index.has_duplicates
+    pd.testing.assert_frame_equal(merged, source.bars["2024-01-15":"2024-03-31"], check_freq=False)
+
+
+def test_empty_first_download_is_retried(tmp_path):
+    source = FakeSource(bars().iloc[:0])
+    ohlcv = store(tmp_path, source)
+
+    assert ohlcv.load("AAPL", "2024-02-01", "2024-03-01").empty
+    assert ohlcv.load("AAPL", "2024-02-01", "2024-03-01").empty
+    assert len(source.fetches) == 2
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from ensemble import EnsembleWeights, combine, fit_weights, mean_squared_errors
+
+
+def predictions(n=200, seed=0):
+    rng = np.random.default_rng(seed)
+    actual = rng.normal(100, 5, n)
+    return {"lstm": actual + rng.normal(0, 1, n), "xgboost": actual + rng.normal(0, 2, n)}, actual
+
+
+def test_combine_is_the_weighted_sum():
+    values = {"lstm": np.arange(6.0).reshape(2, 3), "xgboost": np.ones((2, 3))}
+    weights = {"lstm": 0.25, "xgboost": 0.75}
+
+    np.testing.assert_allclose(combine(values, weights), 0.25 * values["lstm"] + 0.75 * values["xgboost"])
+    # Models without a weight are left out
+    np.testing.assert_allclose(combine(values, {"xgboost": 1.0}), values["xgboost"])
+
+
+def test_inverse_error_weights():
+    predicted, actual = predictions()
+    errors = mean_squared_errors(predicted, actual)
+    weights = fit_weights(predicted, actual, "inverse_error")
+
+    assert sum(weights.values()) == pytest.approx(1.0)
+    assert weights["lstm"] / weights["xgboost"] == pytest.approx(errors["xgboost"] / errors["lstm"])
+
+
+def test_stacked_weights_recover_the_mixture():
+    rng = np.random.default_rng(1)
+    predicted = {"lstm": rng.normal(100, 5, 300), "xgboost": rng.normal(100, 5, 300)}
+    actual = 0.7 * predicted["lstm"] + 0.3 * predicted["xgboost"]
+    weights = fit_weights(predicted, actual, "stacked")
+
+    assert weights["lstm"] == pytest.approx(0.7, abs=1e-6)
+    assert weights["xgboost"] == pytest.approx(0.3, abs=1e-6)
+
+
+def test_equal_and_single_model_weights():
+    predicted, actual = predictions()
+    assert fit_weights(predicted, actual, "equal") == {"lstm": 0.5, "xgboost": 0.5}
+    assert fit_weights({"xgboost": predicted["xgboost"]}, actual) == {"xgboost": 1.0}
+
+
+def test_stored_weights_drop_models_until_they_expire(tmp_path):
+    store = EnsembleWeights(root=str(tmp_path), ttl_seconds=3600)
+    store.save("aapl", 7, "direct", {"lstm": 0.95, "xgboost": 0.05}, {"lstm": 1.0, "xgboost": 19.0})
+
+    assert store.get("AAPL", 7, "direct")["weights"] == {"lstm": 0.95, "xgboost": 0.05}
+    assert store.active_models("AAPL", 7, "direct", ["lstm", "xgboost"], drop_below=0.1) == ["lstm"]
+
+    store.ttl_seconds = 0
+    assert store.get("AAPL", 7, "direct") is None
+    assert store.active_models("AAPL", 7, "direct", ["lstm", "xgboost"], drop_below=0.1) == ["lstm", "xgboost"]
@@ -0,0 +1,25 @@
+import numpy as np
+import pandas as pd
+
+from features import FEATURE_COLUMNS, feature_matrix
+
+
+def ohlcv(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    volume = rng.integers(1_000_000, 5_000_000, n).astype(float)
+    frame = {"Open": close, "High": close * 1.01, "Low": close * 0.99, "Close": close, "Volume": volume}
+    return pd.DataFrame(frame, index=pd.bdate_range("2023-01-02", periods=n, name="Date"))
+
+
+def test_feature_matrix_is_standardized_on_the_training_rows():
+    df = ohlcv()
+    values = feature_matrix(df, dtype=np.float64, train_rows=200)
+    assert values.shape == (300, len(FEATURE_COLUMNS))
+    # Past the warm-up rows, the training rows have mean 0 and unit variance
+    np.testing.assert_allclose(values[30:200].mean(axis=0), 0, atol=0.3)
+
+    # The later bars do not change the training rows
+    shocked = df.copy()
+    shocked.iloc[200:] *= 3
+    np.testing.assert_allclose(feature_matrix(shocked, dtype=np.float64, train_rows=200)[:200], values[:200])
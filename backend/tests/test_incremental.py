@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+import incremental
+from incremental import full_train_meta
+from model_xgboost import build_xgboost_model, fit_xgboost, load_xgboost_model, save_xgboost_model, update_xgboost
+
+
+def regression_data(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, 20)).astype(np.float32)
+    y = X[:, :3].sum(axis=1) + rng.normal(0, 0.5, n).astype(np.float32)
+    return X, y
+
+
+def test_xgboost_update_changes_predictions(tmp_path, monkeypatch):
+    monkeypatch.setattr(incremental, "RETRAIN_DRIFT_TOLERANCE", 1e9)
+    X, y = regression_data()
+    dates = pd.bdate_range("2024-01-01", periods=len(X))
+
+    # An early-stopped base model, stored and read back as the registry does
+    base = build_xgboost_model()
+    fit_xgboost(base, X[:300], y[:300], X[300:400], y[300:400])
+    assert base.best_iteration < base.get_booster().num_boosted_rounds() - 1
+    save_xgboost_model(base, str(tmp_path))
+    previous = {"model": load_xgboost_model(str(tmp_path)), "meta": full_train_meta(dates[:300], 1.0)}
+    before = previous["model"].predict(X[450:])
+
+    model, meta = update_xgboost(previous, X[:400], y[:400], X[400:450], y[400:450], dates[:400])
+
+    assert meta["increments"] == 1
+    assert model.get_booster().num_boosted_rounds() == base.best_iteration + 1 + model.n_estimators
+    assert not np.allclose(model.predict(X[450:]), before)
+    # The previous model is left untouched
+    np.testing.assert_array_equal(previous["model"].predict(X[450:]), before)
@@ -0,0 +1,84 @@
+import json
+import os
+import time
+
+import numpy as np
+from sklearn.preprocessing import MinMaxScaler
+
+from registry import ModelRegistry
+
+
+def save_model(model, directory):
+    with open(os.path.join(directory, "model.json"), "w") as f:
+        json.dump(model, f)
+
+
+def load_model(directory):
+    with open(os.path.join(directory, "model.json")) as f:
+        return json.load(f)
+
+
+def put(registry, end_date, model=None):
+    key = ModelRegistry.make_key("xgboost-direct", "aapl", 7, 60, end_date)
+    scaler = MinMaxScaler().fit(np.array([[10.0], [20.0]]))
+    registry.put(key, model or {"trees": 3}, scaler, save_model, meta={"val_loss": 0.5})
+    return key
+
+
+def test_round_trip_from_disk(tmp_path):
+    key = put(ModelRegistry(root=str(tmp_path)), "2024-03-01")
+    assert key == "AAPL_xgboost-direct_7d_w60_2024-03-01"
+
+    # A new registry has nothing in memory and reads the entry back from disk
+    entry = ModelRegistry(root=str(tmp_path)).get(key, load_model)
+    assert entry["model"] == {"trees": 3}
+    assert entry["scaler"].transform([[15.0]])[0, 0] == 0.5
+    assert entry["meta"]["val_loss"] == 0.5
+    assert time.time() - entry["meta"]["created_at"] < 60
+    # No temporary directory is left behind
+    assert os.listdir(tmp_path) == [key]
+
+
+def test_stale_entries_are_removed(tmp_path):
+    key = put(ModelRegistry(root=str(tmp_path)), "2024-03-01")
+
+    assert ModelRegistry(root=str(tmp_path), ttl_seconds=60).get(key, load_model, ttl_seconds=0) is None
+    assert not os.path.exists(tmp_path / key)
+    assert ModelRegistry(root=str(tmp_path)).get(key, load_model) is None
+
+
+def test_stale_entries_in_memory_are_dropped(tmp_path):
+    registry = ModelRegistry(root=str(tmp_path), ttl_seconds=60)
+    key = put(registry, "2024-03-01")
+    assert registry.get(key, load_model) is not None
+
+    registry.ttl_seconds = 0
+    assert registry.get(key, load_model) is None
+
+
+def test_latest_returns_the_newest_older_model(tmp_path):
+    registry = ModelRegistry(root=str(tmp_path))
+    put(registry, "2024-03-01", {"trees": 1})
+    newest = put(registry, "2024-03-04", {"trees": 2})
+    put(registry, "2024-03-08", {"trees": 3})
+
+    key, entry = registry.latest("xgboost-direct", "AAPL", 7, 60, "2024-03-08", load_model)
+    assert key == newest
+    assert entry["model"] == {"trees": 2}
+    assert registry.latest("xgboost-direct", "AAPL", 7, 60, "2024-03-01", load_model) == (None, None)
+
+
+def test_put_keeps_only_the_newest_versions(tmp_path):
+    registry = ModelRegistry(root=str(tmp_path), keep_versions=2)
+    oldest = put(registry, "2024-03-01")
+    put(registry, "2024-03-04")
+    put(registry, "2024-03-05")
+    # Other setups of the same symbol are counted separately
+    registry.put(ModelRegistry.make_key("lstm-direct", "aapl", 7, 60, "2024-03-01"), {}, None, save_model)
+
+    assert sorted(os.listdir(tmp_path)) == [
+        "AAPL_lstm-direct_7d_w60_2024-03-01",
+        "AAPL_xgboost-direct_7d_w60_2024-03-04",
+        "AAPL_xgboost-direct_7d_w60_2024-03-05",
+    ]
+    assert registry.get(oldest, load_model) is None
@@ -0,0 +1,70 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from result_cache import ResultCache
+
+
+def wait_for_in_flight(cache, key, waiters):
+    """Give the waiting threads time to find key in flight."""
+    deadline = time.time() + 5
+    while key not in cache._in_flight and time.time() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.1 * waiters)
+
+
+def test_concurrent_requests_compute_once():
+    cache = ResultCache(max_in_memory=4, directory=None)
+    key = ResultCache.make_key("aapl", 7, "direct", "2024-03-01")
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return {"symbol": "AAPL"}
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(cache.get_or_compute, key, compute) for _ in range(4)]
+        wait_for_in_flight(cache, key, 4)
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert cache.get(key) == {"symbol": "AAPL"}
+    assert cache._in_flight == {}
+
+
+def test_a_failed_computation_fails_every_waiter_and_is_retried():
+    cache = ResultCache(max_in_memory=4, directory=None)
+    key = ResultCache.make_key("aapl", 7, "direct", "2024-03-01")
+    release = threading.Event()
+
+    def fail():
+        release.wait(5)
+        raise RuntimeError("no data")
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        futures = [pool.submit(cache.get_or_compute, key, fail) for _ in range(3)]
+        wait_for_in_flight(cache, key, 3)
+        release.set()
+        for future in futures:
+            with pytest.raises(RuntimeError):
+                future.result()
+
+    assert cache.get_or_compute(key, lambda: {"symbol": "AAPL"}) == {"symbol": "AAPL"}
+
+
+def test_disk_entries_are_shared_and_replaced_by_newer_bars(tmp_path):
+    old_key = ResultCache.make_key("aapl", 7, "direct", "2024-03-01")
+    new_key = ResultCache.make_key("aapl", 7, "direct", "2024-03-04")
+    ResultCache(directory=str(tmp_path)).get_or_compute(old_key, lambda: {"bar": 1})
+    ResultCache(directory=str(tmp_path)).get_or_compute(new_key, lambda: {"bar": 2})
+
+    # Another process finds the newest response on disk; the older one was dropped
+    other = ResultCache(directory=str(tmp_path))
+    assert other.get_or_compute(new_key, lambda: pytest.fail("computed again")) == {"bar": 2}
+    assert other.get(old_key) is None
@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+from utils import write_atomic
+
+
+def write_text(text):
+    def write(tmp_path):
+        with open(tmp_path, "w") as f:
+            f.write(text)
+
+    return write
+
+
+def test_write_atomic_replaces_the_file(tmp_path):
+    path = str(tmp_path / "report.json")
+    write_atomic(path, write_text("old"))
+    write_atomic(path, write_text("new"))
+
+    with open(path) as f:
+        assert f.read() == "new"
+    assert os.listdir(tmp_path) == ["report.json"]
+
+
+def test_failed_write_keeps_the_old_file_and_no_temporary_one(tmp_path):
+    path = str(tmp_path / "report.json")
+    write_atomic(path, write_text("old"))
+
+    def fail(tmp_path):
+        write_text("partial")(tmp_path)
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        write_atomic(path, fail)
+    with open(path) as f:
+        assert f.read() == "old"
+    assert os.listdir(tmp_path) == ["report.json"]
+
+
+def test_write_atomic_directory(tmp_path):
+    path = str(tmp_path / "entry")
+
+    def write_files(*names):
+        def write(tmp_dir):
+            for name in names:
+                open(os.path.join(tmp_dir, name), "w").close()
+
+        return write
+
+    write_atomic(path, write_files("model.ubj", "meta.json"), directory=True)
+    write_atomic(path, write_files("meta.json"), directory=True)
+    assert os.listdir(path) == ["meta.json"]
+
+    def fail(tmp_dir):
+        write_files("model.ubj")(tmp_dir)
+        raise RuntimeError("save failed")
+
+    with pytest.raises(RuntimeError):
+        write_atomic(path, fail, directory=True)
+    assert os.listdir(tmp_path) == ["entry"]
+    assert os.listdir(path) == ["meta.json"]
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.preprocessing import MinMaxScaler
+
+from preprocess import prepare_data, prepare_data_batch
+from windowing import sliding_windows
+
+
+def closes(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    return pd.DataFrame({"Close": close}, index=pd.bdate_range("2023-01-02", periods=n))
+
+
+def loop_prepare_data(df, forecast_days, window_size):
+    """prepare_data as it was first written, one window at a time."""
+    scaled_data = MinMaxScaler().fit_transform(df[["Close"]])
+    X, y, y_dates = [], [], []
+    for i in range(window_size, len(scaled_data) - forecast_days):
+        X.append(scaled_data[i - window_size:i, 0])
+        y.append(scaled_data[i + forecast_days - 1, 0])
+        y_dates.append(df.index[i + forecast_days - 1])
+    X = np.array(X).reshape(len(X), window_size, 1)
+    return X, np.array(y), scaled_data[-window_size:].reshape(1, window_size, 1), y_dates
+
+
+@pytest.mark.parametrize("forecast_days", [1, 7, 30])
+def test_prepare_data_matches_the_loop(forecast_days):
+    df = closes()
+    X, y, X_forecast, _, y_dates = prepare_data(df, forecast_days, window_size=60)
+    X_loop, y_loop, X_forecast_loop, y_dates_loop = loop_prepare_data(df, forecast_days, 60)
+
+    np.testing.assert_array_equal(X, X_loop)
+    np.testing.assert_array_equal(y, y_loop)
+    np.testing.assert_array_equal(X_forecast, X_forecast_loop)
+    assert list(y_dates) == y_dates_loop
+
+
+def test_multi_step_targets_end_with_the_single_step_target():
+    df = closes()
+    _, y, _, _, _ = prepare_data(df, 7, window_size=60)
+    _, y_multi, _, _, _ = prepare_data(df, 7, window_size=60, multi_step=True)
+
+    assert y_multi.shape == (len(y), 7)
+    np.testing.assert_array_equal(y_multi[:, -1], y)
+    # Column h is the close h + 1 days after the window
+    np.testing.assert_array_equal(y_multi[1:, 0], y_multi[:-1, 1])
+
+
+def test_prepare_data_batch_matches_prepare_data():
+    frames = {"A": closes(seed=1), "B": closes(seed=2), "C": closes(250, seed=3)}
+    batch = prepare_data_batch(frames, 7, window_size=60, multi_step=True)
+
+    for symbol, df in frames.items():
+        X, y, X_forecast, scaler, y_dates = prepare_data(df, 7, window_size=60, multi_step=True)
+        X_batch, y_batch, X_forecast_batch, scaler_batch, y_dates_batch = batch[symbol]
+        np.testing.assert_allclose(X_batch, X)
+        np.testing.assert_allclose(y_batch, y)
+        np.testing.assert_allclose(X_forecast_batch, X_forecast)
+        np.testing.assert_allclose(scaler_batch.data_min_, scaler.data_min_)
+        assert y_dates_batch.equals(y_dates)
+
+
+def test_sliding_windows_are_views():
+    series = np.arange(10.0)
+    X, Y = sliding_windows(series, 3, horizon=2)
+
+    assert X.shape == (6, 3) and Y.shape == (6, 2)
+    np.testing.assert_array_equal(X[2], [2, 3, 4])
+    np.testing.assert_array_equal(Y[2], [5, 6])
+    assert np.shares_memory(X, series) and np.shares_memory(Y, series)
+    with pytest.raises(ValueError):
+        sliding_windows(series, 8, horizon=3)
@@ -0,0 +1,37 @@
+import contextvars
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from metrics import STAGE_SECONDS
+
+_timings = contextvars.ContextVar("timings", default=None)
+
+
+@contextmanager
+def record_timings():
+    """Collect the stage timings of everything run inside the block.
+
+    Yields a {stage: seconds} dict that fills up as stages finish. Stages run in
+    other threads are included when the thread was started with copy_context().
+    """
+    timings = defaultdict(float)
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+@contextmanager
+def stage(name):
+    """Time the block, observe it in the stage duration metric and add it to the timings being recorded."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.observe(seconds, stage=name)
+        timings = _timings.get()
+        if timings is not None:
+            timings[name] += seconds
@@ -0,0 +1,289 @@
+"""Tune the LSTM and XGBoost hyperparameters per symbol with asynchronous successive halving (ASHA).
+
+Every symbol and model gets its own search. A trial is one sampled configuration,
+trained on a small budget (LSTM epochs or XGBoost trees) first; whenever it ranks in
+the top 1/--eta of the trials finished on its rung it is promoted and trained on,
+from its checkpoint, up to the next rung's budget. Trials from all searches run in a
+process pool as soon as a worker is free, without waiting for a rung to fill up:
+
+    python tuning.py AAPL MSFT --forecast-days 7 --trials 27 --workers 4
+    python tuning.py --universe universe.txt --models xgboost
+
+Both models stop early once their validation loss stops improving, so converged trials
+are not promoted further. The winner is the cheapest configuration (training seconds)
+whose validation loss is within --tolerance of the best, and the untuned defaults are
+always one of the trials. It is stored per symbol and forecast length next to the
+models, and used for the symbol's direct-mode trainings from then on.
+
+Trials fit on the first 80% of the windows that training uses and are scored on the
+rest of them, so the test windows behind the reported metrics are never looked at.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+
+from config import MODEL_DIR, WINDOW_SIZE, UNIVERSE_FILE, PRETRAIN_WORKERS, TUNED_PARAMS_TTL_SECONDS
+from json_store import JsonStore
+from windowing import validation_split
+
+MODELS = ["lstm", "xgboost"]
+# Budgets of the successive rungs: LSTM epochs and XGBoost trees
+RUNGS = {"lstm": [3, 9, 27], "xgboost": [50, 150, 450]}
+# The untuned configuration, always tried first
+DEFAULTS = {
+    "lstm": {"params": {"units": 50, "layers": 2, "dropout": 0.0, "learning_rate": 0.001}, "batch_size": 32},
+    "xgboost": {"params": {"max_depth": 6, "learning_rate": 0.05, "subsample": 0.8, "colsample_bytree": 0.8, "min_child_weight": 1.0}},
+}
+
+
+class TunedParams(JsonStore):
+    """Best hyperparameters per (symbol, forecast_days, model), one JSON file each next to the models.
+
+    save stores a config ({"params", ...}) for symbol's model; get returns it while it is fresh.
+    """
+
+    stamp_field = "tuned_at"
+
+    def __init__(self, root=os.path.join(MODEL_DIR, "tuning"), ttl_seconds=TUNED_PARAMS_TTL_SECONDS):
+        super().__init__(root, ttl_seconds)
+
+
+tuned_params = TunedParams()
+
+
+def sample_config(model, rng):
+    """Draw a random configuration for model."""
+    if model == "lstm":
+        return {
+            "params": {
+                "units": int(rng.choice([16, 32, 50, 64, 128])),
+                "layers": int(rng.choice([1, 2])),
+                "dropout": float(rng.choice([0.0, 0.1, 0.2])),
+                "learning_rate": float(10 ** rng.uniform(-3.7, -2.3)),
+            },
+            "batch_size": int(rng.choice([16, 32, 64])),
+        }
+    return {
+        "params": {
+            "max_depth": int(rng.integers(2, 9)),
+            "learning_rate": float(10 ** rng.uniform(-2, -0.7)),
+            "subsample": float(rng.uniform(0.5, 1.0)),
+            "colsample_bytree": float(rng.uniform(0.5, 1.0)),
+            "min_child_weight": float(10 ** rng.uniform(0, 1)),
+        },
+    }
+
+
+def tuning_windows(df, symbol, forecast_days):
+    """(X_fit, y_fit, X_val, y_val): the direct-mode training windows, split 80/20 in time."""
+    from features import feature_set
+    from preprocess import prepare_data
+
+    X, y, *_ = prepare_data(
+        df, forecast_days, window_size=WINDOW_SIZE, dtype=np.float32, multi_step=True,
+        features=feature_set("direct"), symbol=symbol,
+    )
+    train_end = int(0.8 * len(X))  # The windows before it are what training fits on
+    fit_end = validation_split(train_end)  # The same hold-out that early stopping watches in training
+    return X[:fit_end], y[:fit_end], X[fit_end:train_end], y[fit_end:train_end]
+
+
+def _run_trial(model_name, df, symbol, forecast_days, config, start, budget, checkpoint):
+    """Train a trial in a worker process from budget start (its checkpoint) up to budget.
+
+    Returns {"loss" (best validation MSE), "seconds", "stopped" (stopped early)}.
+    """
+    X_fit, y_fit, X_val, y_val = tuning_windows(df, symbol, forecast_days)
+    began = time.perf_counter()
+    if model_name == "lstm":
+        from model_lstm import build_lstm_model, fit_lstm, tensorflow
+
+        if start:
+            model = tensorflow().keras.models.load_model(checkpoint)
+        else:
+            model = build_lstm_model(X_fit.shape[1:], forecast_days, **config["params"])
+        history = fit_lstm(model, X_fit, y_fit, X_val, y_val, budget, config["batch_size"], initial_epoch=start)
+        model.save(checkpoint)
+        loss = min(history["val_loss"])
+        stopped = len(history["val_loss"]) < budget - start
+    else:
+        from model_xgboost import best_booster, build_xgboost_model, fit_xgboost
+
+        X_fit, X_val = X_fit.reshape(len(X_fit), -1), X_val.reshape(len(X_val), -1)
+        previous = None
+        if start:
+            # Continue from the previous rung's best iteration, without the trees early stopping cut off
+            previous = build_xgboost_model()
+            previous.load_model(checkpoint)
+            previous = best_booster(previous)
+        trees = previous.num_boosted_rounds() if previous is not None else 0
+        model = build_xgboost_model(**dict(config["params"], n_estimators=budget - trees))
+        fit_xgboost(model, X_fit, y_fit, X_val, y_val, xgb_model=previous)
+        model.save_model(checkpoint)
+        loss = float(np.mean((model.predict(X_val) - y_val) ** 2))
+        stopped = model.get_booster().num_boosted_rounds() < budget
+    return {"loss": loss, "seconds": time.perf_counter() - began, "stopped": stopped}
+
+
+class Study:
+    """The ASHA search of one model for one symbol."""
+
+    def __init__(self, symbol, model, n_trials, eta, seed=0):
+        self.symbol = symbol
+        self.model = model
+        self.n_trials = n_trials
+        self.eta = eta
+        self.rng = np.random.default_rng(seed)
+        self.rungs = RUNGS[model]
+        self.trials = []  # {"config", "rung" (where its loss was lowest), "loss", "seconds", "stopped"}
+        self.finished = [[] for _ in self.rungs]  # (loss, trial) per rung
+        self.promoted = [set() for _ in self.rungs]
+
+    def next_job(self):
+        """Return (trial, rung) to train next, or None when nothing can start now."""
+        # Promote from the highest rung first: a trial in the top 1/eta of its rung so far
+        for rung in reversed(range(len(self.rungs) - 1)):
+            finished = sorted(self.finished[rung])
+            for _, trial in finished[:len(finished) // self.eta]:
+                if trial not in self.promoted[rung] and not self.trials[trial]["stopped"]:
+                    self.promoted[rung].add(trial)
+                    return trial, rung + 1
+        if len(self.trials) < self.n_trials:
+            config = DEFAULTS[self.model] if not self.trials else sample_config(self.model, self.rng)
+            self.trials.append({"config": config, "rung": None, "loss": None, "seconds": 0.0, "stopped": False})
+            return len(self.trials) - 1, 0
+        return None
+
+    def report(self, trial, rung, result):
+        """Record the result of training trial up to rung."""
+        state = self.trials[trial]
+        if state["loss"] is None or result["loss"] < state["loss"]:
+            state["rung"], state["loss"] = rung, result["loss"]
+        state["seconds"] += result["seconds"]
+        state["stopped"] = result["stopped"]
+        self.finished[rung].append((state["loss"], trial))
+
+    def best(self, tolerance):
+        """The cheapest trial whose loss is within tolerance (a fraction) of the lowest loss."""
+        done = [state for state in self.trials if state["loss"] is not None]
+        lowest = min(state["loss"] for state in done)
+        candidates = [state for state in done if state["loss"] <= lowest * (1 + tolerance)]
+        return min(candidates, key=lambda state: state["seconds"])
+
+    def best_config(self, tolerance):
+        """The stored form of the best trial: its config and the budget it was trained to."""
+        state = self.best(tolerance)
+        budget = self.rungs[state["rung"]]
+        config = dict(state["config"])
+        if self.model == "lstm":
+            config["epochs"] = budget
+        else:
+            config["params"] = dict(config["params"], n_estimators=budget)
+        return dict(config, val_loss=state["loss"], seconds=round(state["seconds"], 2))
+
+
+def run(frames, forecast_days, models=MODELS, n_trials=27, eta=3, tolerance=0.02, workers=PRETRAIN_WORKERS):
+    """Tune models for every symbol in frames ({symbol: DataFrame}); returns the finished studies."""
+    studies = [Study(symbol, model, n_trials, eta, seed=i) for i, (symbol, model) in enumerate(
+        (symbol, model) for symbol in frames for model in models
+    )]
+    scratch = tempfile.mkdtemp(prefix="tuning-")
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    running = {}
+    turn = 0
+    try:
+        while True:
+            # Fill the free workers, asking the searches for a job in turn
+            while len(running) < workers:
+                for study in studies[turn:] + studies[:turn]:
+                    turn = (turn + 1) % len(studies)
+                    job = study.next_job()
+                    if job is not None:
+                        break
+                else:
+                    break
+                trial, rung = job
+                start = study.rungs[rung - 1] if rung else 0
+                extension = "keras" if study.model == "lstm" else "ubj"
+                checkpoint = os.path.join(scratch, f"{study.symbol}_{study.model}_{trial}.{extension}")
+                future = executor.submit(
+                    _run_trial, study.model, frames[study.symbol], study.symbol, forecast_days,
+                    study.trials[trial]["config"], start, study.rungs[rung], checkpoint,
+                )
+                running[future] = (study, trial, rung)
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                study, trial, rung = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"{study.symbol} {study.model} trial {trial} failed: {e}")
+                    result = {"loss": float("inf"), "seconds": 0.0, "stopped": True}
+                study.report(trial, rung, result)
+                print(f"{study.symbol} {study.model} trial {trial} rung {rung}: "
+                      f"val_loss {result['loss']:.6f} in {result['seconds']:.1f} s{' (stopped early)' if result['stopped'] else ''}")
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        shutil.rmtree(scratch, ignore_errors=True)
+    return studies
+
+
+def main():
+    from pipeline import history_range
+    from preprocess import download_stock_data_many
+    from scheduler import read_universe
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("symbols", nargs="*", help="symbols to tune (default: the universe file)")
+    parser.add_argument("--universe", default=UNIVERSE_FILE, help="file with one symbol per line")
+    parser.add_argument("--forecast-days", type=int, default=7)
+    parser.add_argument("--models", nargs="+", default=MODELS, choices=MODELS)
+    parser.add_argument("--trials", type=int, default=27, help="configurations tried per symbol and model")
+    parser.add_argument("--eta", type=int, default=3, help="1/eta of each rung's trials are promoted")
+    parser.add_argument("--tolerance", type=float, default=0.02,
+                        help="pick the cheapest trial within this fraction of the lowest validation loss")
+    parser.add_argument("--workers", type=int, default=PRETRAIN_WORKERS)
+    parser.add_argument("--dry-run", action="store_true", help="print the results without storing them")
+    args = parser.parse_args()
+
+    # Split the cores between the workers; set before the pool is created so the spawned
+    # workers pick it up, unless configured explicitly
+    threads = str(max(1, (os.cpu_count() or 1) // args.workers))
+    for name in ("TF_INTRA_OP_THREADS", "XGB_N_JOBS"):
+        os.environ.setdefault(name, threads)
+    os.environ.setdefault("TF_INTER_OP_THREADS", "1")
+
+    symbols = [symbol.upper() for symbol in args.symbols] or read_universe(args.universe)
+    start_date, end_date = history_range()
+    frames = {symbol: df for symbol, df in download_stock_data_many(symbols, start_date, end_date).items() if not df.empty}
+    for symbol in sorted(set(symbols) - set(frames)):
+        print(f"{symbol} skipped: no data found")
+    if not frames:
+        sys.exit(1)
+
+    print(f"Tuning {len(frames)} symbols x {len(args.models)} models, {args.trials} trials each, with {args.workers} workers")
+    studies = run(frames, args.forecast_days, args.models, args.trials, args.eta, args.tolerance, args.workers)
+
+    print(f"\n{'symbol':<8} {'model':<8} {'default loss':>13} {'default s':>10} {'tuned loss':>11} {'tuned s':>8}  config")
+    for study in studies:
+        default, best = study.trials[0], study.best(args.tolerance)
+        config = study.best_config(args.tolerance)
+        print(f"{study.symbol:<8} {study.model:<8} {default['loss']:>13.6f} {default['seconds']:>10.1f} "
+              f"{best['loss']:>11.6f} {best['seconds']:>8.1f}  {json.dumps({k: config[k] for k in config if k not in ('val_loss', 'seconds')})}")
+        if not args.dry_run:
+            tuned_params.save(study.symbol, args.forecast_days, study.model, config)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
 import os
+import shutil
+import threading
 
 def delete_existing_file(file_path):
     """Delete the file if it already exists."""
@@ -8,5 +10,31 @@ def delete_existing_file(file_path):
 
 def ensure_directory_exists(directory):
     """Ensure that the specified directory exists. Create it if it doesn't."""
-    if not os.path.exists(directory):
-        os.makedirs(directory)
\ No newline at end of file
+    # exist_ok: another worker or thread may create it between a check and makedirs
+    os.makedirs(directory, exist_ok=True)
+
+
+def write_atomic(path, write, directory=False):
+    """Write path by calling write(tmp_path) and then moving the temporary path into place.
+
+    Readers see either the previous file or the complete new one, never a partial write.
+    The temporary path is unique per process and thread, and is removed when write fails.
+    With directory=True, tmp_path is an empty directory for write to fill, and it replaces
+    any existing directory at path.
+    """
+    tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    if directory:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+    try:
+        write(tmp_path)
+        if directory:
+            # os.replace cannot move a directory onto a non-empty one
+            shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if directory:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        elif os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,40 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def sliding_windows(series, window_size, horizon=1, dtype=None):
+    """Build input windows and multi-step targets as read-only views over series.
+
+    X[i] = series[i:i + window_size]
+    Y[i] = series[i + window_size:i + window_size + horizon]
+
+    series may also be 2-D (one row per symbol, all of the same length), in which case
+    X and Y get a leading symbol axis. The only copy made is the cast of series to
+    dtype (skipped if it already matches); X and Y share memory with it.
+    """
+    series = np.ascontiguousarray(series, dtype=dtype)
+    length = series.shape[-1]
+    n_samples = length - window_size - horizon + 1
+    if n_samples <= 0:
+        raise ValueError(
+            f"Need more than {window_size + horizon - 1} data points for window_size={window_size} "
+            f"and horizon={horizon}, got {length}"
+        )
+
+    X = sliding_window_view(series, window_size, axis=-1)[..., :n_samples, :]
+    Y = sliding_window_view(series[..., window_size:], horizon, axis=-1)[..., :n_samples, :]
+    return X, Y
+
+
+def multi_step_targets(y, steps):
+    """Stack y[i:i + steps] for every valid i as a read-only (len(y) - steps + 1, steps) view."""
+    return sliding_window_view(y, steps)
+
+
+def validation_split(n_train):
+    """Index splitting n_train training windows into the ones fitted on and the last 20%, held out for early stopping.
+
+    Early stopping then never looks at the test windows after them, which stay unseen for
+    the metrics, ensemble weights and intervals computed from them.
+    """
+    return int(0.8 * n_train)
@@ -1,5 +1,100 @@
 import React, { useState } from 'react';
 
+const LINE_DASH = { '-': undefined, '--': '6 4', ':': '2 3' };
+
+// Draw a chart spec returned by /predict (see backend/charts.py) as an SVG
+function SeriesChart({ graph }) {
+  const { spec, url } = graph;
+  const width = 800;
+  const height = 420;
+  const pad = { top: 40, right: 20, bottom: 70, left: 70 };
+  const plotWidth = width - pad.left - pad.right;
+  const plotHeight = height - pad.top - pad.bottom;
+
+  const isHistogram = spec.type === 'histogram';
+  const values = isHistogram ? spec.counts : spec.lines.flatMap((line) => line.values);
+  const yMin = isHistogram ? 0 : Math.min(...values);
+  const yMax = Math.max(...values);
+  const yRange = yMax - yMin || 1;
+  const yPos = (value) => pad.top + plotHeight - ((value - yMin) / yRange) * plotHeight;
+
+  const xCount = isHistogram ? spec.counts.length : spec.x.length;
+  const xPos = (index) => pad.left + (xCount > 1 ? (index / (xCount - 1)) * plotWidth : plotWidth / 2);
+  const xTicks = isHistogram
+    ? [0, Math.floor(spec.counts.length / 2), spec.counts.length]
+    : [...new Set([0, 1, 2, 3, 4, 5].map((i) => Math.round((i * (xCount - 1)) / 5)))];
+  const yTicks = [0, 1, 2, 3, 4].map((i) => yMin + (i * yRange) / 4);
+
+  return (
+    <div>
+      <svg viewBox={`0 0 ${width} ${height}`} className="w-full">
+        <text x={width / 2} y={20} textAnchor="middle" fontSize="16">{spec.title}</text>
+        <line x1={pad.left} y1={pad.top + plotHeight} x2={pad.left + plotWidth} y2={pad.top + plotHeight} stroke="black" />
+        <line x1={pad.left} y1={pad.top} x2={pad.left} y2={pad.top + plotHeight} stroke="black" />
+        {yTicks.map((tick) => (
+          <text key={tick} x={pad.left - 6} y={yPos(tick) + 4} textAnchor="end" fontSize="11">
+            {Number(tick.toFixed(isHistogram ? 0 : 4))}
+          </text>
+        ))}
+        {isHistogram
+          ? xTicks.map((i) => (
+              <text key={i} x={pad.left + (i / spec.counts.length) * plotWidth} y={pad.top + plotHeight + 16} textAnchor="middle" fontSize="11">
+                {spec.edges[i].toFixed(2)}
+              </text>
+            ))
+          : xTicks.map((i) => (
+              <text key={i} x={xPos(i)} y={pad.top + plotHeight + 16} textAnchor="middle" fontSize="11">
+                {spec.x[i]}
+              </text>
+            ))}
+        <text x={width / 2} y={height - 20} textAnchor="middle" fontSize="13">{spec.xlabel}</text>
+        <text x={16} y={pad.top + plotHeight / 2} textAnchor="middle" fontSize="13" transform={`rotate(-90 16 ${pad.top + plotHeight / 2})`}>
+          {spec.ylabel}
+        </text>
+        {isHistogram
+          ? spec.counts.map((count, i) => (
+              <rect
+                key={i}
+                x={pad.left + (i / spec.counts.length) * plotWidth}
+                y={yPos(count)}
+                width={plotWidth / spec.counts.length}
+                height={pad.top + plotHeight - yPos(count)}
+                fill={spec.color}
+                stroke="black"
+              />
+            ))
+          : spec.lines.map((line) => (
+              <polyline
+                key={line.label}
+                points={line.values.map((value, i) => `${xPos(i)},${yPos(value)}`).join(' ')}
+                fill="none"
+                stroke={line.color}
+                strokeWidth={line.linewidth || 1.5}
+                strokeDasharray={LINE_DASH[line.linestyle]}
+              />
+            ))}
+        {!isHistogram &&
+          spec.lines.map((line, i) => (
+            <g key={line.label} transform={`translate(${pad.left + plotWidth - 170}, ${pad.top + 10 + i * 18})`}>
+              <line x1={0} y1={0} x2={24} y2={0} stroke={line.color} strokeWidth={2} strokeDasharray={LINE_DASH[line.linestyle]} />
+              <text x={30} y={4} fontSize="12">{line.label}</text>
+            </g>
+          ))}
+      </svg>
+      <a href={url} target="_blank" rel="noreferrer" className="text-blue-500 text-sm">
+        Download PNG
+      </a>
+    </div>
+  );
+}
+
+// Share of a model in the final forecast, as fitted from its validation error
+// (nothing while the weights are still being streamed)
+function weightLabel(weights, model) {
+  if (Object.keys(weights).length === 0) return '';
+  return weights[model] === undefined ? ' (dropped)' : ` (weight ${Math.round(weights[model] * 100)}%)`;
+}
+
 function App() {
   const [symbol, setSymbol] = useState('');
   const [stockInfo, setStockInfo] = useState(null);
@@ -8,14 +103,20 @@ function App() {
   const [forecastLSTM, setForecastLSTM] = useState([]); // Forecast by LSTM
   const [forecastXGBoost, setForecastXGBoost] = useState([]); // Forecast by XGBoost
   const [forecastCombined, setForecastCombined] = useState([]);
+  const [weights, setWeights] = useState({}); // Weight of each model in the final forecast
+  const [intervals, setIntervals] = useState([]); // p10/p50/p90 band of the final forecast per date
   const [graphsLSTM, setGraphsLSTM] = useState({}); // Graphs for LSTM
   const [graphsXGBoost, setGraphsXGBoost] = useState({}); // Graphs for XGBoost
   const [graphsCombined, setGraphsCombined] = useState({}); // Graphs for Combined
   const [loading, setLoading] = useState(false);
+  const [progress, setProgress] = useState(''); // What the streamed prediction is doing
   const [error, setError] = useState(''); // State to store error messages
 
   document.title = 'Stock Price Prediction';
 
+  // Forecast dates come from whichever forecast streamed in first
+  const forecastRows = [forecastCombined, forecastXGBoost, forecastLSTM].find((rows) => rows.length > 0) || [];
+
   const fetchStockInfo = async () => {
     try {
       const response = await fetch('http://localhost:5000/stock-info', {
@@ -56,64 +157,93 @@ function App() {
     );
   }
   
+  const clearResults = () => {
+    setCurrentPrice(''); // Clear current price
+    setForecastLSTM([]); // Clear LSTM forecast
+    setForecastXGBoost([]); // Clear XGBoost forecast
+    setForecastCombined([]); // Clear final forecast
+    setWeights({}); // Clear model weights
+    setIntervals([]); // Clear forecast bands
+    setGraphsLSTM({}); // Clear LSTM graphs
+    setGraphsXGBoost({}); // Clear XGBoost graphs
+    setGraphsCombined({}); // Clear Combined graphs
+  };
+
+  const showResult = (data) => {
+    setCurrentPrice(data.current_price);
+    setForecastLSTM(data.lstm.forecast); // Set LSTM forecast
+    setForecastXGBoost(data.xgboost.forecast); // Set XGBoost forecast
+    setForecastCombined(data.hybrid.forecast);
+    setWeights(data.hybrid.weights);
+    setIntervals(data.hybrid.intervals || []);
+    // Charts are drawn from the returned series; the PNG is only rendered if downloaded.
+    // Graph file names change whenever their data does, so they can be cached as is.
+    // A model dropped for its low weight comes back without series
+    const graph = (section, name) => section.series[name] && ({
+      spec: section.series[name],
+      url: `http://localhost:5000/graph/${section.graphs[name]}`,
+    });
+    setGraphsLSTM({
+      actual_vs_predicted: graph(data.lstm, 'actual_vs_predicted_lstm'),
+      forecasted_prices: graph(data.lstm, 'forecasted_prices_lstm'),
+      training_vs_validation_loss: graph(data.lstm, 'training_vs_validation_loss_lstm'),
+      residuals_histogram: graph(data.lstm, 'residuals_histogram_lstm'),
+    });
+    setGraphsXGBoost({
+      actual_vs_predicted: graph(data.xgboost, 'actual_vs_predicted_xgboost'),
+      forecasted_prices: graph(data.xgboost, 'forecasted_prices_xgboost'),
+      residuals_histogram: graph(data.xgboost, 'residuals_histogram_xgboost'),
+    });
+    setGraphsCombined({
+      actual_vs_predicted: graph(data.hybrid, 'actual_vs_predicted_weighted'),
+      forecasted_prices: graph(data.hybrid, 'forecasted_prices_weighted'),
+      residuals_histogram: graph(data.hybrid, 'residuals_histogram_weighted'),
+      comparison_predictions: graph(data.hybrid, 'comparison_predictions'),
+    });
+  };
+
   const handlePredict = async () => {
     setLoading(true);
     setStockInfo(null); 
     setError('');
+    clearResults();
     await fetchStockInfo(); 
     setError(''); // Clear any previous error
-    try {
-      const response = await fetch('http://localhost:5000/predict', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ symbol, forecast_days: forecastDays }), // Send forecastDays to the server
-      });
-      const data = await response.json();
 
-      if (data.error) {
-        setError(data.error); // Set the error message
-        setCurrentPrice(''); // Clear current price
-        setForecastLSTM([]); // Clear LSTM forecast
-        setForecastXGBoost([]); // Clear XGBoost forecast
-        setGraphsLSTM({}); // Clear LSTM graphs
-        setGraphsXGBoost({}); // Clear XGBoost graphs
-        setGraphsCombined({}); // Clear Combined graphs
+    // Each model's forecast is shown as soon as it is ready, the charts with the full result
+    const params = new URLSearchParams({ symbol, forecast_days: forecastDays });
+    const events = new EventSource(`http://localhost:5000/predict/stream?${params}`);
+    const parse = (handler) => (event) => handler(JSON.parse(event.data));
+    setProgress('Loading price history...');
 
-      } else {
-        setCurrentPrice(data.current_price);
-        setForecastLSTM(data.lstm.forecast); // Set LSTM forecast
-        setForecastXGBoost(data.xgboost.forecast); // Set XGBoost forecast
-        setForecastCombined(data.hybrid.forecast);
-        // Append a timestamp to graph URLs to prevent caching
-        const timestamp = new Date().getTime();
-        setGraphsLSTM({
-          actual_vs_predicted: `${data.lstm.graphs.actual_vs_predicted_lstm}?t=${timestamp}`,
-          forecasted_prices: `${data.lstm.graphs.forecasted_prices_lstm}?t=${timestamp}`,
-          training_vs_validation_loss: `${data.lstm.graphs.training_vs_validation_loss_lstm}?t=${timestamp}`,
-          residuals_histogram: `${data.lstm.graphs.residuals_histogram_lstm}?t=${timestamp}`,
-        });
-        setGraphsXGBoost({
-          actual_vs_predicted: `${data.xgboost.graphs.actual_vs_predicted_xgboost}?t=${timestamp}`,
-          forecasted_prices: `${data.xgboost.graphs.forecasted_prices_xgboost}?t=${timestamp}`,
-          residuals_histogram: `${data.xgboost.graphs.residuals_histogram_xgboost}?t=${timestamp}`,
-        });
-        setGraphsCombined({
-          actual_vs_predicted: `${data.hybrid.graphs.actual_vs_predicted_weighted}?t=${timestamp}`,
-          forecasted_prices: `${data.hybrid.graphs.forecasted_prices_weighted}?t=${timestamp}`,
-          residuals_histogram: `${data.hybrid.graphs.residuals_histogram_weighted}?t=${timestamp}`,
-          comparison_predictions: `${data.hybrid.graphs.comparison_predictions}?t=${timestamp}`,
-        });
-      }
-    } catch (error) {
-      setError(`Error fetching data: ${error.message}`); // Set detailed error message
-      setCurrentPrice(''); // Clear current price
-      setForecastLSTM([]); // Clear LSTM forecast
-      setForecastXGBoost([]); // Clear XGBoost forecast
-      setGraphsLSTM({}); // Clear LSTM graphs
-      setGraphsXGBoost({}); // Clear XGBoost graphs
-      setGraphsCombined({}); // Clear Combined graphs
-    }
-    setLoading(false);
+    events.addEventListener('data', parse(() => setProgress('Training the models...')));
+    events.addEventListener('model', parse((data) => {
+      if (data.model === 'lstm') setForecastLSTM(data.forecast);
+      if (data.model === 'xgboost') setForecastXGBoost(data.forecast);
+    }));
+    events.addEventListener('hybrid', parse((data) => {
+      setForecastCombined(data.forecast);
+      setWeights(data.weights);
+      setIntervals(data.intervals || []);
+      setProgress('Drawing the charts...');
+    }));
+    events.addEventListener('result', parse((data) => {
+      events.close();
+      showResult(data);
+      setProgress('');
+      setLoading(false);
+    }));
+    const fail = (message) => {
+      events.close();
+      setError(message); // Set the error message
+      clearResults();
+      setProgress('');
+      setLoading(false);
+    };
+    // A server-sent "error" event carries data; a dropped connection does not
+    events.addEventListener('error', (event) => fail(
+      event.data ? JSON.parse(event.data).error : 'Error fetching data: the connection to the server was lost'
+    ));
   };
 
   return (
@@ -153,6 +283,7 @@ function App() {
           >
             {loading ? 'Predicting...' : 'Predict'}
           </button>
+          {progress && <p className="mt-2 text-sm text-gray-600">{progress}</p>}
         </div>
 
         {/* Display error message */}
@@ -178,7 +309,7 @@ function App() {
         )}
 
         {/* Display forecasted prices in a table */}
-        {forecastLSTM.length > 0 && forecastXGBoost.length > 0 && forecastCombined.length > 0  && !error && (
+        {forecastRows.length > 0  && !error && (
           <div className="mt-6 w-full max-w-4xl">
             <h3 className="text-xl font-bold text-white mb-4 text-left uppercase">FORECASTED STOCK PRICE OF {stockInfo.name} FOR NEXT {forecastDays} DAYS</h3>
 
@@ -186,18 +317,24 @@ function App() {
               <thead className="bg-white text-blue-500 border-b border-gray-600">
                 <tr>
                   <th className="px-4 py-2 text-left border-r border-gray-600">Date</th>
-                  <th className="px-4 py-2 text-left border-r border-gray-600">Forecast by LSTM</th>
-                  <th className="px-4 py-2 text-left border-r border-gray-600">Forecast by XGBoost</th>
+                  <th className="px-4 py-2 text-left border-r border-gray-600">Forecast by LSTM{weightLabel(weights, 'lstm')}</th>
+                  <th className="px-4 py-2 text-left border-r border-gray-600">Forecast by XGBoost{weightLabel(weights, 'xgboost')}</th>
                   <th className="px-4 py-2 text-left">Final Forecast</th>
+                  {intervals.length > 0 && <th className="px-4 py-2 text-left border-l border-gray-600">80% Range (p10 - p90)</th>}
                 </tr>
               </thead>
               <tbody>
-                {forecastLSTM.map((item, index) => (
+                {forecastRows.map((item, index) => (
                   <tr key={index} className="border-b">
                     <td className="px-4 py-2 border-r border-gray-600">{item.date.split(' ')[0]}</td>
-                    <td className="px-4 py-2 border-r border-gray-600">{item.value}</td>
-                    <td className="px-4 py-2 border-r border-gray-600">{forecastXGBoost[index]?.value}</td>
-                    <td className="px-4 py-2">{forecastCombined[index]?.value}</td>
+                    <td className="px-4 py-2 border-r border-gray-600">{forecastLSTM[index]?.value ?? '-'}</td>
+                    <td className="px-4 py-2 border-r border-gray-600">{forecastXGBoost[index]?.value ?? '-'}</td>
+                    <td className="px-4 py-2">{forecastCombined[index]?.value ?? '-'}</td>
+                    {intervals.length > 0 && (
+                      <td className="px-4 py-2 border-l border-gray-600">
+                        {intervals[index] ? `${intervals[index].p10} - ${intervals[index].p90}` : '-'}
+                      </td>
+                    )}
                   </tr>
                 ))}
               </tbody>
@@ -231,21 +368,21 @@ function App() {
         )}
         {/* LSTM Section */}
   
-    {forecastLSTM.length > 0 && forecastXGBoost.length > 0 && forecastCombined.length > 0  && !error && (
+    {forecastCombined.length > 0  && !error && (
         
         <div className="mt-10 w-full  border-t border-b border-gray-100 rounded-lg" style={{ backgroundColor: '#f1f1f8' }}>
           
         <div className="w-full max-w-4xl mx-auto">
+      {graphsLSTM.actual_vs_predicted && (
+        <>
           <h3 className="text-xl font-bold text-Black-500 mb-4 text-left uppercase mt-6">
             LSTM: Actual vs Predicted Stock Prices
           </h3>
           <div className="bg-white p-4 rounded-lg shadow-md mb-6">
-            <img
-              src={`http://localhost:5000/graph/${graphsLSTM.actual_vs_predicted}`}
-              alt="LSTM Actual vs Predicted"
-              className="w-full rounded-lg"
-            />
-      </div>
+            <SeriesChart graph={graphsLSTM.actual_vs_predicted} />
+          </div>
+        </>
+      )}
 
       {graphsLSTM.forecasted_prices && (
         <>
@@ -253,11 +390,7 @@ function App() {
             LSTM: Forecasted Stock Prices
           </h3>
           <div className="bg-white p-4 rounded-lg shadow-md mb-6">
-            <img
-              src={`http://localhost:5000/graph/${graphsLSTM.forecasted_prices}`}
-              alt="LSTM Forecasted Prices"
-              className="w-full rounded-lg"
-            />
+            <SeriesChart graph={graphsLSTM.forecasted_prices} />
           </div>
         </>
       )}
@@ -268,11 +401,7 @@ function App() {
             LSTM: Training vs Validation Loss
           </h3>
           <div className="bg-white p-4 rounded-lg shadow-md mb-6">
-            <img
-              src={`http://localhost:5000/graph/${graphsLSTM.training_vs_validation_loss}`}
-              alt="LSTM Training vs Validation Loss"
-              className="w-full rounded-lg"
-            />
+            <SeriesChart graph={graphsLSTM.training_vs_validation_loss} />
           </div>
         </>
       )}
@@ -283,11 +412,7 @@ function App() {
             LSTM: Residuals Histogram
           </h3>
           <div className="bg-white p-4 rounded-lg shadow-md mb-6">
-            <img
-              src={`http://localhost:5000/graph/${graphsLSTM.residuals_histogram}`}
-              alt="LSTM Residuals Histogram"
-              className="w-full rounded-lg"
-            />
+            <SeriesChart graph={graphsLSTM.residuals_histogram} />
           </div>
         </>
       )}
@@ -298,11 +423,7 @@ function App() {
             XGBoost: ACTUAL VS PREDICTED STOCK PRICES
           </h3>
           <div className="bg-white p-4 rounded-lg shadow-md mb-6">
-            <img
-              src={`http://localhost:5000/graph/${graphsXGBoost.actual_vs_predicted}`}
-              alt="LSTM Forecasted Prices"
-              className="w-full rounded-lg"
-            />
+            <SeriesChart graph={graphsXGBoost.actual_vs_predicted} />
           </div>
         </>
       )}
@@ -314,11 +435,7 @@ function App() {
           XGBoost: FORECASTED STOCK PRICES
           </h3>
           <div className="bg-white p-4 rounded-lg shadow-md mb-6">
-            <img
-              src={`http://localhost:5000/graph/${graphsXGBoost.forecasted_prices}`}
-              alt="LSTM Forecasted Prices"
-              className="w-full rounded-lg"
-            />
+            <SeriesChart graph={graphsXGBoost.forecasted_prices} />
           </div>
         </>
       )}
@@ -329,11 +446,7 @@ function App() {
           XGBoost: RESIDUALS HISTOGRAM
           </h3>
           <div className="bg-white p-4 rounded-lg shadow-md mb-6">
-            <img
-              src={`http://localhost:5000/graph/${graphsXGBoost.residuals_histogram}`}
-              alt="LSTM Residuals Histogram"
-              className="w-full rounded-lg"
-            />
+            <SeriesChart graph={graphsXGBoost.residuals_histogram} />
           </div>
         </>
       )}
@@ -344,11 +457,7 @@ function App() {
             LSTM + XGBoost Hybrid: Actual vs Predicted Stock Prices
           </h3>
           <div className="bg-white p-4 rounded-lg shadow-md mb-6">
-            <img
-              src={`http://localhost:5000/graph/${graphsCombined.actual_vs_predicted}`}
-              alt="LSTM Residuals Histogram"
-              className="w-full rounded-lg"
-            />
+            <SeriesChart graph={graphsCombined.actual_vs_predicted} />
           </div>
         </>
       )}
@@ -359,11 +468,7 @@ function App() {
           LSTM + XGBoost Hybrid: Forecasted Stock Prices
           </h3>
           <div className="bg-white p-4 rounded-lg shadow-md mb-6">
-            <img
-              src={`http://localhost:5000/graph/${graphsCombined.forecasted_prices}`}
-              alt="LSTM Residuals Histogram"
-              className="w-full rounded-lg"
-            />
+            <SeriesChart graph={graphsCombined.forecasted_prices} />
           </div>
         </>
       )}
@@ -374,11 +479,7 @@ function App() {
           LSTM + XGBoost Hybrid: Residuals Histogram
           </h3>
           <div className="bg-white p-4 rounded-lg shadow-md mb-6">
-            <img
-              src={`http://localhost:5000/graph/${graphsCombined.residuals_histogram}`}
-              alt="LSTM Residuals Histogram"
-              className="w-full rounded-lg"
-            />
+            <SeriesChart graph={graphsCombined.residuals_histogram} />
           </div>
         </>
       )}
@@ -389,11 +490,7 @@ function App() {
             Final Comparison: LSTM vs XGBoost vs Hybrid
           </h3>
           <div className="bg-white p-4 rounded-lg shadow-md mb-6">
-            <img
-              src={`http://localhost:5000/graph/${graphsCombined.comparison_predictions}`}
-              alt="LSTM Residuals Histogram"
-              className="w-full rounded-lg"
-            />
+            <SeriesChart graph={graphsCombined.comparison_predictions} />
           </div>
         </>
       )}